@@ -140,7 +140,8 @@ def main_parser(arg, alignment_list):
     print_col("Parsing %s alignments" % len(alignment_list), GREEN,
               quiet=arg.quiet)
     alignments = seqset.AlignmentList(alignment_list, sql_db=sql_db,
-                                      pbar=pbar)
+                                      pbar=pbar,
+                                      compact_storage=arg.compact_db)
 
     # If a partitions file was provided, and there is only a single input file,
     # try to associate the partitions.
@@ -201,6 +202,20 @@ def main_parser(arg, alignment_list):
             if er:
                 print_col("Invalid partitions file.", RED)
 
+        # When the reverse concatenated alignments are only converted into
+        # sequential fasta/phylip files, they are streamed directly to the
+        # output files, skipping the database
+        if not outfile and not interleave and \
+                set(output_format) <= set(["fasta", "phylip"]) and \
+                not any([arg.min_taxa, arg.contain_filter,
+                         arg.exclude_filter, arg.codon_filter, arg.m_filter,
+                         arg.var_filter, arg.inf_filter, arg.collapse,
+                         arg.gcoder, arg.consensus]):
+            print_col("Writing output", GREEN, quiet=arg.quiet)
+            alignments.write_reverse_concatenation(
+                output_format, output_suffix=arg.output_suffix, pbar=pbar)
+            return
+
         alignments.reverse_concatenate(pbar=pbar)
 
     # Filtering
@@ -263,7 +278,8 @@ def main_parser(arg, alignment_list):
     if arg.collapse:
         print_col("Collapsing", GREEN, quiet=arg.quiet)
         alignments.collapse(use_main_table=True, pbar=pbar,
-                            haplotypes_file=outfile)
+                            haplotypes_file=outfile,
+                            ignore_missing=arg.collapse_ignore_missing)
 
     # Gcoder
     if arg.gcoder:
@@ -349,6 +365,12 @@ def get_args(arg_list=None, unittest=False):
         default=False,
         help="Use this flag if you would like to collapse the input "
              "alignment(s) into unique haplotypes")
+    alternative.add_argument(
+        "--collapse-ignore-missing", dest="collapse_ignore_missing",
+        action="store_const", const=True, default=False,
+        help="Use with --collapse to ignore missing data and gaps when "
+             "comparing sequences, so that sequences that differ only in "
+             "those positions are collapsed into the same haplotype")
     alternative.add_argument(
         "--code-gaps", dest="gcoder", action="store_const", const=True,
         default=False,
@@ -478,6 +500,11 @@ def get_args(arg_list=None, unittest=False):
     miscellaneous.add_argument("-quiet", dest="quiet", action="store_const",
                                const=True, default=False, help="Removes all "
                                "terminal output")
+    miscellaneous.add_argument("--compact-db", dest="compact_db",
+                               action="store_const", const=True,
+                               default=False, help="Stores the sequence data "
+                               "in a compact encoding, reducing the size of "
+                               "the temporary database for large data sets")
 
     args = parser.parse_args(arg_list)
 
@@ -45,6 +45,70 @@ class HandledException(Exception):
     pass
 
 
+def write_plot(plot_func, plot_data, plot_file):
+    """Generates a plot from plot data and saves it to a file.
+
+    Parameters
+    ----------
+    plot_func : function
+        Plotting function from the `plotter` module.
+    plot_data : dict
+        Plot data returned by the `AlignmentList` statistics methods.
+    plot_file : str
+        Path to the output file.
+    """
+
+    # Generate plot object
+    plot_obj, _, lgd = plot_func(**plot_data)
+    plot_obj.tight_layout()
+
+    # Save plot to file, including the legend object, if available
+    if lgd:
+        plot_obj.savefig(plot_file, bbox_extra_artists=(lgd,), dpi=200)
+    else:
+        plot_obj.savefig(plot_file, dpi=200)
+
+
+class CheckpointWriter(object):
+    """Writes the partial results of the statistics methods to a file.
+
+    Instances are used as the `stream_queue` of the Namespace provided
+    to the `AlignmentList` statistics methods, which call the `put` method
+    with their partial results every few alignments
+    (see `AlignmentList._stream_partial`).
+
+    Parameters
+    ----------
+    plot_func : function
+        Plotting function from the `plotter` module.
+    plot_file : str
+        Path to the output file.
+    """
+
+    def __init__(self, plot_func, plot_file):
+        self.plot_func = plot_func
+        self.plot_file = plot_file
+
+    def put(self, partial_data):
+        """Writes the partial plot.
+
+        Parameters
+        ----------
+        partial_data : tuple
+            Number of processed alignments, total number of alignments and
+            partial plot data.
+        """
+
+        value, total, plot_data = partial_data
+
+        if not len(plot_data.get("data", [])):
+            return
+
+        write_plot(self.plot_func, plot_data, self.plot_file)
+        print_col("Checkpoint plot saved after %s of %s alignments" %
+                  (value, total), GREEN, 2)
+
+
 def generate_cfg_template():
 
     template_fh = open("stats_template.ini", "w")
@@ -128,6 +192,32 @@ def main():
     main_exec.add_argument("-quiet", dest="quiet", action="store_const",
                            const=True, default=False, help="Removes all"
                            " terminal output")
+    main_exec.add_argument("--cache-dir", dest="cache_dir",
+                           help="Directory where the plot data is cached, "
+                                "so that it can be reused by subsequent "
+                                "runs with the same input data. By default, "
+                                "the '.stats_cache' directory inside the "
+                                "output directory is used")
+    main_exec.add_argument("--no-cache", dest="no_cache",
+                           action="store_const", const=True, default=False,
+                           help="Disables the plot data cache")
+    main_exec.add_argument("--preview", dest="preview", type=int,
+                           help="Generates preview plots from random samples "
+                                "of the provided number of alignments, which "
+                                "are progressively refined until the complete "
+                                "data set is used. Only available for "
+                                "sequence_similarity, segregating_sites, "
+                                "allele_frequency_spectrum and "
+                                "distribution_missing_data options")
+    main_exec.add_argument("--checkpoint", dest="checkpoint", type=int,
+                           help="Writes the partial plot every provided "
+                                "number of alignments while the statistics "
+                                "are being calculated")
+    main_exec.add_argument("--compact-db", dest="compact_db",
+                           action="store_const", const=True, default=False,
+                           help="Stores the sequence data in a compact "
+                                "encoding, reducing the size of the "
+                                "temporary database for large data sets")
 
     arg = parser.parse_args()
 
@@ -177,12 +267,24 @@ def stats_main(args):
         input_files = fl
 
     print_col("Parsing %s alignments" % len(input_files), GREEN, 2)
-    alignments = AlignmentList(input_files, sql_db=sql_db)
+    alignments = AlignmentList(input_files, sql_db=sql_db,
+                               compact_storage=args.compact_db)
 
     # Create output dir
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    # Set the plot data cache outside the temporary directory, so that it
+    # can be reused across runs
+    if args.no_cache:
+        alignments.plot_cache_dir = None
+    else:
+        cache_dir = args.cache_dir if args.cache_dir else \
+            join(output_dir, ".stats_cache")
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        alignments.plot_cache_dir = cache_dir
+
     # Variable mapping each available option with the appropriate statistics
     # and plotting methods
     func_map = {
@@ -291,6 +393,10 @@ def stats_main(args):
              (outlier_densisty_dist, "Sequence_size_outliers.png")]
     }
 
+    # Statistics methods that support the preview mode
+    preview_methods = ["sequence_similarity", "sequence_segregation",
+                       "allele_frequency_spectrum", "missing_data_distribution"]
+
     print_col("Parsing configuation file options", GREEN, 2)
 
     # Iterate over each individual option
@@ -305,34 +411,55 @@ def stats_main(args):
                               (section, option, i), GREEN, 2)
                     # Get appropriate method list
                     funcs = func_map[(section, option, i)]
-                    # Retrieve plot data using statistics method
-                    plot_data = funcs[0]()
-
-                    # Check for exceptions in plot data
-                    if "exception" in plot_data:
-                        if plot_data["exception"] is EmptyData:
-                            print_col("Option %s - %s - %s has no data for "
-                                      "plotting" % (section, option, i),
-                                      YELLOW, 2)
-                        if plot_data["exception"] is InvalidSequenceType:
-                            print_col("Invalid sequence type for option %s - "
-                                      "%s - %s (%s)" %
-                                      (section, option, i,
-                                       alignments.sequence_code[0]), YELLOW, 2)
-                        continue
-
-                    # Generate plot object
-                    plot_obj, _, lgd = funcs[1][0](**plot_data)
-                    plot_obj.tight_layout()
-
-                    # Save plot to file, including the legend object, if
-                    # available
-                    if lgd:
-                        plot_obj.savefig(join(output_dir, funcs[1][1]),
-                                         bbox_extra_artists=(lgd,), dpi=200)
+                    plot_file = join(output_dir, funcs[1][1])
+
+                    # Set the Namespace object that receives the partial
+                    # results of the statistics method
+                    if args.checkpoint:
+                        ns = argparse.Namespace(
+                            stop=False, stream_every=args.checkpoint,
+                            stream_queue=CheckpointWriter(funcs[1][0],
+                                                          plot_file))
+                    else:
+                        ns = None
+
+                    # Retrieve plot data using statistics method. In
+                    # preview mode, the plot is re-written with each
+                    # refinement of the estimate
+                    if args.preview and \
+                            funcs[0].__name__ in preview_methods:
+                        plot_iter = alignments.iter_preview(
+                            funcs[0].__name__, ns=ns,
+                            sample_size=args.preview)
                     else:
-                        plot_obj.savefig(join(output_dir, funcs[1][1]),
-                                         dpi=200)
+                        plot_iter = [funcs[0](ns=ns)]
+
+                    for plot_data in plot_iter:
+
+                        # Check for exceptions in plot data. A sample
+                        # may have no data for the plot, in which case the
+                        # estimate is refined with the next sample
+                        if "exception" in plot_data:
+                            if plot_data.get("sampled"):
+                                continue
+                            if plot_data["exception"] is EmptyData:
+                                print_col("Option %s - %s - %s has no data "
+                                          "for plotting" % (section, option,
+                                                            i), YELLOW, 2)
+                            if plot_data["exception"] is InvalidSequenceType:
+                                print_col("Invalid sequence type for option "
+                                          "%s - %s - %s (%s)" %
+                                          (section, option, i,
+                                           alignments.sequence_code[0]),
+                                          YELLOW, 2)
+                            break
+
+                        write_plot(funcs[1][0], plot_data, plot_file)
+
+                        if plot_data.get("sampled"):
+                            print_col("Preview plot saved from %s of %s "
+                                      "alignments" % plot_data["sample_size"],
+                                      GREEN, 2)
                 else:
                     print_col("Invalid option: %s - %s - %s. Skipping." %
                               (section, option, i), YELLOW, 2)
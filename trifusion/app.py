@@ -556,6 +556,14 @@ class TriFusionApp(App):
     """List with table data associated with the current plot."""
     single_gene_idx = None
     """Index of active alignment for single gene plots"""
+    stats_preview = BooleanProperty(False)
+    """
+    bool attribute that determines whether the plots that support it are
+    first estimated from random samples of the active alignments, which
+    are refined until the complete data set is used.
+    """
+    stats_preview_size = NumericProperty(100)
+    """Integer with the number of alignments in the first preview sample."""
 
     # Patch attribute
     plt_patch = None
@@ -2983,7 +2991,7 @@ class TriFusionApp(App):
 
     def run_in_background(self, func, second_func, args1, args2=None,
                           no_arg2=False, msg="Crunching data...",
-                          cancel=True):
+                          cancel=True, partial_func=None, stream_every=None):
         """
         This method is intended to run time/resource consuming operations in
         the background, without freezing the app, and return the final
@@ -3007,6 +3015,11 @@ class TriFusionApp(App):
         :param msg: string, message to appear in waiting dialog.
         :param cancel: Boolean, Shows a functional cancel button that
         interrupts the background process, if True.
+        :param partial_func: Bound method that receives the partial results
+        published by func (see AlignmentList._stream_partial) while it is
+        still running, followed by the arguments in args2.
+        :param stream_every: integer, number of alignments between the
+        publication of partial results. Only used with partial_func.
         """
 
         def check_process_status(p, second_function, args, man, dt):
@@ -3060,6 +3073,21 @@ class TriFusionApp(App):
                 except AttributeError:
                     pass
 
+            # Show partial results, if new ones were published since the
+            # last check
+            if partial_func and p.is_alive():
+                try:
+                    partial_data = shared_ns.partial_data
+                except AttributeError:
+                    partial_data = None
+
+                if partial_data and partial_data[0] != last_partial[0]:
+                    last_partial[0] = partial_data[0]
+                    try:
+                        partial_func(partial_data, *(args if args else []))
+                    except Exception as e:
+                        Logger.exception(e.message)
+
             if not p.is_alive():
 
                 try:
@@ -3106,6 +3134,12 @@ class TriFusionApp(App):
         # Set kill switch flag
         shared_ns.stop = False
 
+        # Set publication of partial results
+        if partial_func:
+            shared_ns.stream_every = stream_every if stream_every else 1
+            shared_ns.partial_data = None
+        last_partial = [None]
+
         # Remove lock from background process
         self.terminate_background = False
 
@@ -7353,6 +7387,8 @@ class TriFusionApp(App):
         self.orto_min_sp = 3
 
         self.screen.ids.usearch_threads.text = "1"
+        self.screen.ids.inflation_jobs.text = "2"
+        self.screen.ids.orto_resume.text = "No"
 
         self.ortho_search_options.ids.inflation_bt.text = "['3']"
 
@@ -10450,6 +10486,37 @@ class TriFusionApp(App):
         if footer:
             self.populate_stats_footer(footer)
 
+    def stats_write_partial_plot(self, partial_data, plt_idx):
+        """
+        Creates and loads a plot from the partial results of a running
+        statistics method, so that the user can follow its progress. The
+        plot is saved in a separate file so that it is never mistaken by
+        the final plot (see stats_show_plot).
+
+        :param partial_data: tuple, with the number of processed alignments,
+        the total number of alignments and the partial plot data.
+        :param plt_idx: string, identification string of the plot. Usually
+        is the text property of the issuing button.
+        """
+
+        _, _, plot_data = partial_data
+
+        if not plot_data or "data" not in plot_data:
+            return
+
+        plot_obj, lgd, _ = self.stats_plt_method[plt_idx][0](**plot_data)
+
+        plt_file = join(self.temp_dir, "partial_{}".format(
+            self.stats_plt_method[plt_idx][1]))
+
+        if lgd:
+            plot_obj.savefig(plt_file, bbox_extra_artists=(lgd,),
+                             bbox_inches="tight", dpi=100)
+        else:
+            plot_obj.savefig(plt_file, bbox_inches="tight", dpi=100)
+
+        self.load_plot(plt_file, self.screen.ids.plot_content)
+
     def stats_sethline(self, val, plt_file, inverted=False):
         """
         Sets an horizontal threshold bar to the current plot object
@@ -10703,13 +10770,20 @@ class TriFusionApp(App):
                 except OSError:
                     pass
 
+        # Partial plots are updated about 20 times during the calculations
+        stream_every = max(1, len(file_set if file_set else
+                                  self.active_file_list) / 20)
+
         self.run_in_background(
             func=get_stats_data,
             second_func=self.stats_write_plot,
             args1=[self.alignment_list, plt_idx, file_set,
                    list(taxa_set), additional_args,
+                   self.stats_preview_size if self.stats_preview else None,
                    "use_ns"],
-            args2=[plt_idx])
+            args2=[plt_idx],
+            partial_func=self.stats_write_partial_plot,
+            stream_every=stream_every)
 
         self.toggle_stats_panel(force_close=True)
 
@@ -11524,7 +11598,11 @@ class TriFusionApp(App):
                 # If a subprocess has been issued, kill it
                 try:
                     if shared_ns.subp:
-                        os.kill(shared_ns.subp, signal.SIGINT)
+                        # Concurrent jobs store a list of pids
+                        subp = shared_ns.subp
+                        for pid in subp if isinstance(subp, list) \
+                                else [subp]:
+                            os.kill(pid, signal.SIGINT)
                         shared_ns.subp = None
                 except AttributeError:
                     pass
@@ -11669,6 +11747,10 @@ class TriFusionApp(App):
         # Remove lock from background process
         self.terminate_orto_search = False
 
+        # "Yes" skips the unchanged stages of a previous search, while a
+        # stage name also executes that stage and all subsequent ones
+        resume = self.screen.ids.orto_resume.text
+
         # Create Process instance
         p = threading.Thread(
             target=orto_execution,
@@ -11690,7 +11772,11 @@ class TriFusionApp(App):
                 self.orto_min_sp,
                 self.ortho_sqldb,
                 self.ortho_dir,
-                self.usearch_db))
+                self.usearch_db),
+            kwargs={"inflation_jobs": self.screen.ids.inflation_jobs.text,
+                    "resume": resume != "No",
+                    "force_from": None if resume in ["No", "Yes"]
+                    else resume})
 
         p.daemon = True
         p.start()
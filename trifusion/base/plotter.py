@@ -96,6 +96,26 @@ def set_props(func):
     return wrapper
 
 
+def _add_sample_label(fig, sample_size):
+    """Labels a figure created from a sample of the data set.
+
+    Parameters
+    ----------
+    fig : matplotlib.pyplot.Figure
+        Figure object of the plot.
+    sample_size : tuple
+        Number of sampled alignments and total number of alignments.
+    """
+
+    if sample_size:
+        label = "Preview from {} of {} alignments".format(*sample_size)
+    else:
+        label = "Preview from a sample of the data"
+
+    fig.text(0.99, 0.01, label, ha="right", va="bottom", color="grey",
+             fontsize=10, style="italic")
+
+
 @set_props
 def scatter_plot(data, correlation=False, ax_names=None, table_header=None,
                  title=None):
@@ -616,7 +636,7 @@ def box_plot(data, labels=None, title=None, ax_names=None):
 
 
 def histogram_smooth(data, ax_names=None, table_header=None, title=None,
-                     legend=None):
+                     legend=None, sampled=False, ci=None, sample_size=None):
     """Creates a smooth histogram-like plot.
 
     Creates a smooth line plot with colored areas with the same distribution
@@ -638,6 +658,14 @@ def histogram_smooth(data, ax_names=None, table_header=None, title=None,
     legend : list
         If using a multi-dimensional array, provide the name of each
         subplot.
+    sampled : bool
+        If True, the data is a preview estimate from a sample of the data
+        set and is labeled as such.
+    ci : list
+        List with the confidence interval of the mean of each array in
+        `data`, shown as a shaded area when `sampled` is True.
+    sample_size : tuple
+        Number of sampled alignments and total number of alignments.
 
     Returns
     -------
@@ -678,6 +706,12 @@ def histogram_smooth(data, ax_names=None, table_header=None, title=None,
         axn.plot(x, f(x), color=clr_list[p])
         # Color area below line lot
         axn.fill_between(x, f(x), alpha=0.5, color=clr_list[p])
+        # Show the confidence interval of the mean for sampled data
+        if sampled and ci:
+            axn.axvspan(ci[p][0], ci[p][1], color="grey", alpha=.3)
+
+    if sampled:
+        _add_sample_label(fig, sample_size)
 
     # If axis names are provided, add them to figure
     if ax_names:
@@ -701,7 +735,8 @@ def histogram_smooth(data, ax_names=None, table_header=None, title=None,
 
 @set_props
 def histogram_plot(data, title=None, ax_names=None, table_header=None,
-                   real_bin_num=False):
+                   real_bin_num=False, sampled=False, ci=None,
+                   sample_size=None):
     """Creates an histogram from data.
 
     Parameters
@@ -718,6 +753,14 @@ def histogram_plot(data, title=None, ax_names=None, table_header=None,
         a column.
     real_bin_num : bool
         If True, then the table data will be forced to be in real numbers.
+    sampled : bool
+        If True, the data is a preview estimate from a sample of the data
+        set and is labeled as such.
+    ci : tuple
+        Confidence interval of the mean, shown as a shaded area when
+        `sampled` is True.
+    sample_size : tuple
+        Number of sampled alignments and total number of alignments.
 
     Returns
     -------
@@ -752,8 +795,18 @@ def histogram_plot(data, title=None, ax_names=None, table_header=None,
 
     # Add cutom artist for legend
     mean_artist = plt.Line2D((0, 1), (0, 1), color="r", linestyle="--")
+    artists, labels = [mean_artist], ["Mean"]
+
+    # Show the confidence interval of the mean for sampled data
+    if sampled and ci:
+        plt.axvspan(ci[0], ci[1], color="r", alpha=.2)
+        artists.append(plt.Rectangle((0, 0), 1, 1, color="r", alpha=.2))
+        labels.append("Mean 95% CI")
+
+    if sampled:
+        _add_sample_label(fig, sample_size)
 
-    lgd = ax.legend([mean_artist], ["Mean"], loc=0, frameon=True, fancybox=True,
+    lgd = ax.legend(artists, labels, loc=0, frameon=True, fancybox=True,
                     shadow=True, framealpha=.8, fontsize="large")
     lgd.get_frame().set_facecolor("white")
 
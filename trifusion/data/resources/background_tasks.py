@@ -358,12 +358,15 @@ def orto_execution(nm, temp_dir, proteome_files, protein_min_len,
                    protein_max_stop, usearch_file, usearch_evalue,
                    usearch_threads, usearch_output, mcl_file, mcl_inflation,
                    ortholog_prefix, group_prefix, orto_max_gene,
-                   orto_min_sp, sqldb, ortho_dir, usearch_db):
+                   orto_min_sp, sqldb, ortho_dir, usearch_db, resume=False,
+                   force_from=None, inflation_jobs=None):
     """Execution of the orthology search pipeline.
 
 
     Executes all pipeline subprocesses sequentially and updates the
-    Progess dialog label.
+    Progess dialog label. The completed stages are recorded in the
+    pipeline manifest of `ortho_dir` (see
+    `orthomcl_pipeline.PipelineManifest`).
 
     Parameters
     ----------
@@ -408,86 +411,60 @@ def orto_execution(nm, temp_dir, proteome_files, protein_min_len,
         Path to the directory where the results will be generated.
     usearch_db : str
         Name of the file used as database for usearch.
+    resume : bool
+        If True, the stages completed in a previous search into `ortho_dir`
+        whose parameters and inputs are unchanged are skipped.
+    force_from : str
+        Name of the stage from which the search is executed when resuming.
+    inflation_jobs : int
+        Maximum number of inflation values that are processed at the same
+        time. If None, `orthomcl_pipeline.INFLATION_JOBS` is used.
     """
 
     try:
         nm.finished_tasks = []
 
-        nm.task = "schema"
-        ortho_pipe.install_schema(temp_dir)
-        nm.finished_tasks = ["schema"]
+        manifest = ortho_pipe.PipelineManifest(ortho_dir, resume=resume,
+                                               force_from=force_from)
 
-        if nm.stop:
-            raise KillByUser("")
+        # The schema, adjust, filter, usearch, parse and pairs tasks
+        stages = ortho_pipe.search_stages(
+            proteome_files, protein_min_len, protein_max_stop, usearch_db,
+            usearch_evalue, usearch_threads, usearch_output, usearch_file,
+            temp_dir, ortho_dir, nm=nm)
+        inflation_stages = ortho_pipe.inflation_stages(
+            mcl_inflation, ortholog_prefix, "1000", group_prefix,
+            orto_max_gene, orto_min_sp,
+            join(ortho_dir, "backstage_files", usearch_db), ortho_dir,
+            mcl_file=mcl_file)
+        manifest.plan(stages + [x for val in mcl_inflation
+                                for x in inflation_stages[val]])
 
-        nm.task = "adjust"
-        ortho_pipe.adjust_fasta(proteome_files, ortho_dir, nm)
-        nm.finished_tasks = ["schema", "adjust"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "filter"
-        ortho_pipe.filter_fasta(protein_min_len, protein_max_stop,
-                                usearch_db, ortho_dir, nm)
-        nm.finished_tasks = ["schema", "adjust", "filter"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "usearch"
-        ortho_pipe.allvsall_usearch(usearch_db, usearch_evalue, ortho_dir,
-                                    usearch_threads, usearch_output,
-                                    usearch_bin=usearch_file, nm=nm)
-        nm.finished_tasks = ["schema", "adjust", "filter", "usearch"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "parse"
-        ortho_pipe.blast_parser(usearch_output, ortho_dir,
-                                db_dir=temp_dir, nm=nm)
-        nm.finished_tasks = ["schema", "adjust", "filter", "usearch", "parse"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "pairs"
-        ortho_pipe.pairs(temp_dir, nm=nm)
-        ortho_pipe.dump_pairs(temp_dir, ortho_dir, nm=nm)
-        nm.finished_tasks = ["schema", "adjust", "filter", "usearch", "parse",
-                             "pairs"]
+        ortho_pipe.run_stages(stages, manifest, nm)
 
         if nm.stop:
             raise KillByUser("")
 
+        # The mcl, dump and filter_groups tasks run concurrently for each
+        # inflation value. Each task is set as finished once it is completed
+        # for all inflation values
         nm.task = "mcl"
-        ortho_pipe.mcl(mcl_inflation, ortho_dir, mcl_file=mcl_file, nm=nm)
-        nm.finished_tasks = ["schema", "adjust", "filter", "usearch", "parse",
-                             "pairs", "mcl"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "dump"
-        ortho_pipe.mcl_groups(mcl_inflation, ortholog_prefix, "1000",
-                              group_prefix, ortho_dir, nm=nm)
-        nm.finished_tasks = ["schema", "adjust", "filter", "usearch", "parse",
-                             "pairs", "mcl", "dump"]
-
-        if nm.stop:
-            raise KillByUser("")
-
-        nm.task = "filter_groups"
-        stats, groups_obj = ortho_pipe.export_filtered_groups(
+        stats, groups_obj = ortho_pipe.inflation_search(
             mcl_inflation,
+            ortholog_prefix,
+            "1000",
             group_prefix,
             orto_max_gene,
             orto_min_sp,
             sqldb + "_out",
             join(ortho_dir, "backstage_files", usearch_db),
             temp_dir,
-            ortho_dir, nm=nm)
+            ortho_dir,
+            mcl_file=mcl_file,
+            nm=nm,
+            jobs=inflation_jobs,
+            tasks=["mcl", "dump", "filter_groups"],
+            manifest=manifest)
         nm.finished_tasks = ["schema", "adjust", "filter", "usearch", "parse",
                              "pairs", "mcl", "dump", "filter_groups"]
 
@@ -1324,11 +1301,14 @@ def get_orto_data(active_group, plt_idx, filt, exclude_taxa):
 
 
 def get_stats_data(aln_obj, stats_idx, active_file_set, active_taxa_set,
-                     additional_args, ns=None):
+                     additional_args, preview=None, ns=None):
     """Task that retrieves the plot data from `AlignmentList` plot methods
 
     Given an aln_obj, this function will execute the according method to
-    generate plot data.
+    generate plot data. The plot methods keep their results in the
+    `PlotCache` of `aln_obj`, which is shared with the deep copy created
+    here, so that re-opening a plot for unchanged active file and taxa sets
+    does not repeat the calculations.
 
     Parameters
     ----------
@@ -1344,6 +1324,12 @@ def get_stats_data(aln_obj, stats_idx, active_file_set, active_taxa_set,
     additional_args : dict
         Dictionary with keyword arguments that can be provided when the
         plot data method is called.
+    preview : int
+        If provided, the plots that support the preview mode are first
+        estimated from random samples of this number of alignments (see
+        `AlignmentList.iter_preview`). The estimate of each sample is
+        published as a partial result, and the exact plot data is
+        returned at the end.
     ns : multiprocessing.Namespace
         Namespace object that allows communication between main and worker
         threads.
@@ -1413,7 +1399,25 @@ def get_stats_data(aln_obj, stats_idx, active_file_set, active_taxa_set,
                "Sequence size outliers sp": main_aln.outlier_sequence_size_sp,
                "Sequence size outliers": main_aln.outlier_sequence_size}
 
-    if additional_args:
+    # Methods that support the preview mode
+    preview_methods = ["sequence_similarity", "sequence_segregation",
+                       "allele_frequency_spectrum",
+                       "missing_data_distribution"]
+
+    if preview and methods[stats_idx].__name__ in preview_methods:
+
+        # The estimates of each sample replace the partial results that
+        # the statistics method publishes during its execution
+        if ns:
+            ns.stream_every = None
+
+        for plot_data in main_aln.iter_preview(
+                methods[stats_idx].__name__, ns=ns, sample_size=preview,
+                **(additional_args or {})):
+            if ns and plot_data["sampled"] and "data" in plot_data:
+                ns.partial_data = plot_data["sample_size"] + (plot_data,)
+
+    elif additional_args:
         plot_data = methods[stats_idx](ns=ns, **additional_args)
     else:
         plot_data = methods[stats_idx](ns)
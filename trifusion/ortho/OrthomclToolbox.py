@@ -28,13 +28,15 @@ except ImportError:
     from trifusion.process.error_handling import KillByUser
 
 from collections import OrderedDict, Counter
+from array import array
 import pickle
 import os
 import sqlite3
 from os.path import join
 import random
 import string
-import copy
+import numpy as np
+from scipy import sparse
 
 
 class Cluster(object):
@@ -142,7 +144,14 @@ class GroupLight(object):
         self.species_list = []
         # Attribute that will contain taxa to be excluded from analyses
         self.excluded_taxa = []
-        self.species_frequency = []
+        # Sparse matrix with the number of gene copies of each taxon (columns)
+        # in each cluster (rows). The taxon of each column is stored in
+        # species_index, which is not changed by the exclusion of taxa
+        self.species_frequency = None
+        self.species_index = []
+        # Number of taxa and maximum gene copies of each cluster for the
+        # current excluded taxa. Set by the _cluster_stats method
+        self._stats = None
 
         # Attributes that will store the number (int) of cluster after gene and
         # species filter
@@ -185,21 +194,6 @@ class GroupLight(object):
             if line.strip() != "":
                 yield line.strip()
 
-    def iter_species_frequency(self):
-        """
-        In order to prevent permanent changes to the species_frequency
-        attribute due to the filtering of taxa, this iterable should be used
-        instead of the said variable. This creates a temporary deepcopy of
-        species_frequency which will be iterated over and eventually modified.
-        """
-
-        # Since the items of species_frequency are mutable, this ensures
-        # that even those objects are correctly cloned
-        sp_freq = copy.deepcopy(self.species_frequency)
-
-        for cl in sp_freq:
-            yield cl
-
     def _remove_tx(self, line):
         """
         Given a group line, remove all references to the excluded taxa
@@ -213,92 +207,124 @@ class GroupLight(object):
 
         return new_line + tx_str
 
-    def _apply_filter(self, cl):
+    def _included_frequency(self):
         """
-        Sets or updates the basic group statistics, such as the number of
-        orthologs compliant with the gene copy and minimum taxa filters.
-
-        :param cl: dictionary. Contains the number of occurrences for each
-         taxon present in the ortholog cluster
-         (e.g. {"taxonA": 2, "taxonB": 1).
+        Returns the species_frequency matrix without the columns of the
+        excluded taxa.
         """
 
-        # First, remove excluded taxa from the cl object since this will
-        # impact all other filters
-        for tx in self.excluded_taxa:
-            cl.pop(tx, None)
+        if not self.excluded_taxa:
+            return self.species_frequency
 
-        if cl:
+        cols = [p for p, tx in enumerate(self.species_index) if tx not in
+                self.excluded_taxa]
 
-            self.all_clusters += 1
+        return self.species_frequency[:, cols]
 
-            extra_copies = max(cl.values())
-            if extra_copies > self.max_extra_copy:
-                self.max_extra_copy = extra_copies
+    @staticmethod
+    def _row_max(mtx):
+        """
+        Returns the maximum value of each row of a sparse matrix, or 0 for
+        empty rows.
+        """
 
-            if extra_copies <= self.gene_threshold and self.gene_threshold and\
-                len(cl) >= self.species_threshold and  \
-                    self.species_threshold:
-                self.num_gene_compliant += 1
-                self.num_species_compliant += 1
-                self.all_compliant += 1
+        if not mtx.nnz:
+            return np.zeros(mtx.shape[0], dtype=np.int32)
 
-            elif (extra_copies <= self.gene_threshold and
-                      self.gene_threshold) or self.gene_threshold == 0:
-                self.num_gene_compliant += 1
+        return mtx.max(axis=1).toarray().ravel()
 
-            elif len(cl) >= self.species_threshold and \
-                    self.species_threshold:
-                self.num_species_compliant += 1
+    def _cluster_stats(self):
+        """
+        Returns two arrays with the number of taxa and the maximum number of
+        gene copies of each ortholog cluster, without the excluded taxa.
+        These only depend on the excluded taxa, so they are kept until
+        those change.
+        """
+
+        key = sorted(self.excluded_taxa)
 
-    def _get_compliance(self, cl):
+        if self._stats is None or self._stats[0] != key:
+            mtx = self._included_frequency()
+            self._stats = (key, np.diff(mtx.indptr), self._row_max(mtx))
+
+        return self._stats[1:]
+
+    def _filter_masks(self, n_taxa, max_copies):
         """
-        Determines whether an ortholog cluster is compliant with the specified
-        ortholog filters.
-        :param ccl: dictionary. Contains the number of occurrences for each
-         taxon present in the ortholog cluster
-         (e.g. {"taxonA": 2, "taxonB": 1).
+        Returns two boolean arrays indicating which ortholog clusters pass
+        the gene copy and the minimum taxa filters, respectively. A filter
+        that is not set is not passed by any cluster.
+        :param n_taxa: array. Number of taxa of each cluster
+        :param max_copies: array. Maximum gene copies of each cluster
+        """
+
+        if self.gene_threshold:
+            gene_ok = max_copies <= self.gene_threshold
+        else:
+            gene_ok = np.zeros(len(max_copies), dtype=bool)
+
+        if self.species_threshold:
+            sp_ok = n_taxa >= self.species_threshold
+        else:
+            sp_ok = np.zeros(len(n_taxa), dtype=bool)
 
-        :return: tuple. The first element refers to the gene copy filter
-        while the second refers to the minimum taxa filter. Values of 1
-        indicate that the ortholg cluster is compliant.
+        return gene_ok, sp_ok
+
+    def _apply_filter(self):
+        """
+        Sets or updates the basic group statistics, such as the number of
+        orthologs compliant with the gene copy and minimum taxa filters.
+        Clusters left without taxa after the exclusion of taxa are ignored.
         """
 
-        for tx in self.excluded_taxa:
-            cl.pop(tx, None)
+        n_taxa, max_copies = self._cluster_stats()
 
-        if cl:
+        present = n_taxa > 0
+        n_taxa, max_copies = n_taxa[present], max_copies[present]
 
-            cp = max(cl.values())
+        gene_ok, sp_ok = self._filter_masks(n_taxa, max_copies)
 
-            if not self.gene_threshold and not self.species_threshold:
-                return 1, 1
+        both = gene_ok & sp_ok
+        # When the gene copy filter is 0, all clusters count as compliant
+        gene_only = ~both & (gene_ok | (self.gene_threshold == 0))
+        sp_only = ~both & ~gene_only & sp_ok
 
-            if cp <= self.gene_threshold and self.gene_threshold and\
-                len(cl) >= self.species_threshold and  \
-                    self.species_threshold:
-                return 1, 1
+        self.all_clusters = int(present.sum())
+        self.num_gene_compliant = int(both.sum() + gene_only.sum())
+        self.num_species_compliant = int(both.sum() + sp_only.sum())
+        self.all_compliant = int(both.sum())
 
-            elif (cp <= self.gene_threshold and self.gene_threshold) or \
-                    not self.gene_threshold:
-                return 1, 0
+        if len(max_copies):
+            self.max_extra_copy = max(self.max_extra_copy,
+                                      int(max_copies.max()))
 
-            elif (len(cl) >= self.species_threshold and
-                    self.species_threshold) or not self.species_threshold:
-                return 0, 1
+    def compliant_clusters(self):
+        """
+        Determines which ortholog clusters are compliant with the specified
+        ortholog filters.
 
-            else:
-                return 0, 0
+        :return: numpy.array. Boolean array with one value per ortholog
+        cluster, in the order of the group file. When no filter is set,
+        all clusters with taxa are compliant.
+        """
 
-    def _reset_counter(self):
+        n_taxa, max_copies = self._cluster_stats()
 
-        self.all_clusters = 0
-        self.num_gene_compliant = 0
-        self.num_species_compliant = 0
-        self.all_compliant = 0
+        if not self.gene_threshold and not self.species_threshold:
+            return n_taxa > 0
+
+        gene_ok, sp_ok = self._filter_masks(n_taxa, max_copies)
+
+        return (n_taxa > 0) & gene_ok & sp_ok
 
     def _parse_groups(self, ns=None):
 
+        # Column of each taxon in the species_frequency matrix
+        taxa_idx = {}
+        indices = array("i")
+        data = array("i")
+        indptr = array("i", [0])
+
         for cl in self.groups():
 
             if ns:
@@ -308,27 +334,38 @@ class GroupLight(object):
             # Retrieve the field containing the ortholog sequences
             sequence_field = cl.split(":")[1]
 
-            # Update species frequency list
+            # Update species frequency
             sp_freq = Counter((x.split("|")[0] for x in
                               sequence_field.split()))
 
-            self.species_frequency.append(sp_freq)
+            for tx, cp in sp_freq.items():
+                if tx not in taxa_idx:
+                    taxa_idx[tx] = len(self.species_index)
+                    self.species_index.append(tx)
+                indices.append(taxa_idx[tx])
+                data.append(cp)
+
+            indptr.append(len(indices))
 
             # Update number of sequences
             self.total_seqs += len(sequence_field)
 
-            # Update max number of extra copies
-            extra_copies = max(sp_freq.values())
-            if extra_copies > self.max_extra_copy:
-                self.max_extra_copy = max(sp_freq.values())
+        self.species_frequency = sparse.csr_matrix(
+            (np.frombuffer(data, dtype=np.intc),
+             np.frombuffer(indices, dtype=np.intc),
+             np.frombuffer(indptr, dtype=np.intc)),
+            shape=(len(indptr) - 1, len(self.species_index)))
 
-            self.species_list.extend([x for x in sp_freq if x not in
-                                      self.species_list])
+        self.species_list = list(self.species_index)
 
-            # Apply filters, if any
-            # gene filter
-            if self.species_threshold and self.gene_threshold:
-                self._apply_filter(sp_freq)
+        # Update max number of extra copies
+        max_copies = self._cluster_stats()[1]
+        if len(max_copies):
+            self.max_extra_copy = int(max_copies.max())
+
+        # Apply filters, if any
+        if self.species_threshold and self.gene_threshold:
+            self._apply_filter()
 
     def exclude_taxa(self, taxa_list, update_stats=False):
         """
@@ -353,18 +390,14 @@ class GroupLight(object):
         self.excluded_taxa = taxa_list
 
         if update_stats:
-            self._reset_counter()
-            for cl in self.iter_species_frequency():
-                self._apply_filter(cl)
+            self._apply_filter()
 
     def basic_group_statistics(self, update_stats=True):
 
         if update_stats:
-            self._reset_counter()
-            for cl in self.iter_species_frequency():
-                self._apply_filter(cl)
+            self._apply_filter()
 
-        return len(self.species_frequency), self.total_seqs, \
+        return self.species_frequency.shape[0], self.total_seqs, \
             self.num_gene_compliant, self.num_species_compliant, \
             self.all_compliant
 
@@ -405,9 +438,7 @@ class GroupLight(object):
             self._get_sp_proportion()
 
         if update_stats:
-            self._reset_counter()
-            for cl in self.iter_species_frequency():
-                self._apply_filter(cl)
+            self._apply_filter()
 
     def retrieve_sequences(self, sqldb, protein_db, dest="./",
                              shared_namespace=None, outfile=None):
@@ -489,7 +520,7 @@ class GroupLight(object):
             output_handle = open(join(dest, outfile), "w")
 
         # Fetching sequences
-        for line, cl in zip(self.groups(), self.iter_species_frequency()):
+        for line, compliant in zip(self.groups(), self.compliant_clusters()):
 
             # Kill switch
             if shared_namespace:
@@ -498,7 +529,7 @@ class GroupLight(object):
                     raise KillByUser("")
 
             # Filter sequences
-            if self._get_compliance(cl) == (1, 1):
+            if compliant:
 
                 if shared_namespace:
                     shared_namespace.good += 1
@@ -559,8 +590,8 @@ class GroupLight(object):
 
         output_handle = open(os.path.join(dest, output_file_name), "w")
 
-        for p, (line, cl) in enumerate(zip(self.groups(),
-                                           self.iter_species_frequency())):
+        for p, (line, compliant) in enumerate(
+                zip(self.groups(), self.compliant_clusters())):
 
             if shared_namespace:
                 if shared_namespace.stop:
@@ -569,7 +600,7 @@ class GroupLight(object):
             if shared_namespace:
                 shared_namespace.progress = p
 
-            if self._get_compliance(cl) == (1, 1):
+            if compliant:
                 if shared_namespace:
                     shared_namespace.good += 1
                 if self.excluded_taxa:
@@ -580,24 +611,51 @@ class GroupLight(object):
 
         output_handle.close()
 
+    @staticmethod
+    def _value_counts(values):
+        """
+        Returns the sorted unique values of an array and the number of times
+        each one occurs, as lists.
+        """
+
+        x_labels, data = np.unique(values, return_counts=True)
+
+        return [int(x) for x in x_labels], [int(x) for x in data]
+
+    def _taxa_counts(self, counts):
+        """
+        Pairs the taxa of the species_list attribute with their values in
+        `counts`, sorted by decreasing value. Taxa with a value of 0 are only
+        kept when the group file has no clusters.
+        :param counts: array. One value for each column of the
+        species_frequency matrix without the excluded taxa
+        """
+
+        taxa = [tx for tx in self.species_index if tx not in
+                self.excluded_taxa]
+        counts = dict(zip(taxa, (int(x) for x in counts)))
+
+        data = [(tx, counts.get(tx, 0)) for tx in self.species_list]
+
+        if self.species_frequency.shape[0]:
+            data = [x for x in data if x[1] > 0]
+
+        return sorted(data, key=lambda x: -x[1])
+
     def bar_species_distribution(self, filt=False):
 
         if filt:
-            data = Counter((len(cl) for cl in self.iter_species_frequency() if
-                           self._get_compliance(cl) == (1, 1)))
+            n_taxa = self._cluster_stats()[0][self.compliant_clusters()]
         else:
-            data = Counter((len(cl) for cl in self.species_frequency))
+            n_taxa = np.diff(self.species_frequency.indptr)
+            n_taxa = n_taxa[n_taxa > 0]
 
-        x_labels = [x for x in list(data)]
-        data = list(data.values())
+        x_labels, data = self._value_counts(n_taxa)
 
         # When data is empty, return an exception
         if not data:
             return {"data": None}
 
-        # Sort lists
-        x_labels = [list(x) for x in zip(*sorted(zip(x_labels, data)))][0]
-
         # Convert label to strings
         x_labels = [str(x) for x in x_labels]
 
@@ -619,22 +677,17 @@ class GroupLight(object):
         """
 
         if filt:
-            data = Counter((max(cl.values()) for cl in
-                            self.iter_species_frequency() if
-                            self._get_compliance(cl) == (1, 1)))
+            max_copies = self._cluster_stats()[1][self.compliant_clusters()]
         else:
-            data = Counter((max(cl.values()) for cl in self.species_frequency
-                           if cl))
+            max_copies = self._row_max(self.species_frequency)
+            max_copies = max_copies[max_copies > 0]
 
-        x_labels = [x for x in list(data)]
-        data = list(data.values())
+        x_labels, data = self._value_counts(max_copies)
 
         # When data is empty, return an exception
         if not data:
             return {"data": None}
 
-        x_labels, data = (list(x) for x in zip(*sorted(zip(x_labels, data))))
-
         # Convert label to strings
         x_labels = [str(x) for x in x_labels]
 
@@ -654,20 +707,15 @@ class GroupLight(object):
         :return:
         """
 
-        data = Counter(dict((x, 0) for x in self.species_list))
-
-        self._reset_counter()
+        self._apply_filter()
 
-        for cl in self.iter_species_frequency():
-
-            self._apply_filter(cl)
-            if filt:
-                data += Counter(dict((x, 1) for x, y in cl.items() if y > 0 and
-                           self._get_compliance(cl) == (1, 1)))
-            else:
-                data += Counter(dict((x, 1) for x, y in cl.items() if y > 0))
+        mtx = self._included_frequency()
+        if filt:
+            mtx = mtx[np.flatnonzero(self.compliant_clusters())]
 
-        data = data.most_common()
+        # Number of clusters with each taxon
+        data = self._taxa_counts(np.bincount(mtx.indices,
+                                             minlength=mtx.shape[1]))
 
         # When data is empty, return an exception
         if not data:
@@ -688,20 +736,17 @@ class GroupLight(object):
 
     def bar_genecopy_per_species(self, filt=False):
 
-        data = Counter(dict((x, 0) for x in self.species_list))
-
-        self._reset_counter()
+        self._apply_filter()
 
-        for cl in self.iter_species_frequency():
-
-            self._apply_filter(cl)
-            if filt:
-                data += Counter(dict((x, y) for x, y in cl.items() if y > 1 and
-                           self._get_compliance(cl) == (1, 1)))
-            else:
-                data += Counter(dict((x, y) for x, y in cl.items() if y > 1))
+        mtx = self._included_frequency()
+        if filt:
+            mtx = mtx[np.flatnonzero(self.compliant_clusters())]
 
-        data = data.most_common()
+        # Total gene copies of each taxon in the clusters where it has
+        # more than one copy
+        data = self._taxa_counts(np.bincount(
+            mtx.indices, weights=mtx.data * (mtx.data > 1),
+            minlength=mtx.shape[1]))
 
         # When data is empty, return an exception
         if not data:
@@ -1596,7 +1641,8 @@ class MultiGroupsLight(object):
             gpath = os.path.join(self.db_path,
                     "".join(random.choice(string.ascii_uppercase) for _ in
                             range(15)))
-            pickle.dump(group_obj, open(gpath, "wb"))
+            pickle.dump(group_obj, open(gpath, "wb"),
+                        pickle.HIGHEST_PROTOCOL)
             self.groups[group_obj.name] = gpath
             self.filters[group_obj.name] = (1, len(group_obj.species_list), [])
             self.max_extra_copy[group_obj.name] = group_obj.max_extra_copy
@@ -1680,7 +1726,8 @@ class MultiGroupsLight(object):
             # Update group stats
 
             self.get_multigroup_statistics(group_obj)
-            pickle.dump(group_obj, open(self.groups[group_name], "wb"))
+            pickle.dump(group_obj, open(self.groups[group_name], "wb"),
+                        pickle.HIGHEST_PROTOCOL)
             # Update filter map
 
             self.filters[group_name] = (gn_filter, group_obj.species_threshold)
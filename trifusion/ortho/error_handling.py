@@ -25,3 +25,27 @@ class NoUniqueField(Exception):
 
     def __str__(self):
         return repr(self.value)
+
+
+class NoPreviousSearch(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class DuplicateProteome(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class UsearchError(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2012 Unknown <diogo@arch>
+#
+#  This program is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 2 of the License, or
+#  (at your option) any later version.
+#  
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA 02110-1301, USA.
+
+"""
+In-process implementation of the Markov Cluster algorithm (MCL) over
+a sparse matrix, used as an alternative to the external `mcl` executable
+in the orthology search.
+
+The graph is read once from the ABC file written by
+`orthomclDumpPairsFiles` and can then be clustered with multiple
+inflation values. The clusters are written in the same format as the
+output of `mcl --abc`, so that they can be converted into group files by
+`orthomclMclToGroups`.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+try:
+    from process.error_handling import KillByUser
+except ImportError:
+    from trifusion.process.error_handling import KillByUser
+
+
+class MarkovClustering(object):
+    """
+    Markov clustering of a weighted, undirected graph.
+
+    The graph is built from an ABC file, with one edge per line in the
+    "label_a<tab>label_b<tab>weight" format. Edges are made symmetric and,
+    when an edge is provided more than once, its maximum weight is used.
+    As in `mcl`, each node receives a loop with the maximum weight of its
+    edges.
+
+    Parameters
+    ----------
+    abc_file : str
+        Path to the ABC file.
+
+    Attributes
+    ----------
+    labels : numpy.array
+        Node labels, in order of first appearance in the ABC file.
+    graph : scipy.sparse.csr_matrix
+        Weighted adjacency matrix of the graph, including loops.
+    """
+
+    def __init__(self, abc_file):
+
+        edges = pd.read_csv(abc_file, sep="\t", header=None,
+                            names=["a", "b", "w"],
+                            dtype={"a": str, "b": str, "w": np.float64})
+
+        # Interleave both ends of the edges so that the node indexes follow
+        # the order of appearance
+        codes, self.labels = pd.factorize(
+            np.column_stack((edges.a.values, edges.b.values)).ravel())
+        codes = codes.reshape(-1, 2)
+        n = len(self.labels)
+
+        rows, cols, weights = codes[:, 0], codes[:, 1], edges.w.values
+
+        # Keep the maximum weight of repeated edges
+        keys = rows.astype(np.int64) * n + cols
+        order = np.lexsort((weights, keys))
+        keys = keys[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        rows, cols, weights = (rows[order][last], cols[order][last],
+                               weights[order][last])
+
+        graph = sparse.csr_matrix((weights, (rows, cols)), shape=(n, n))
+        graph = graph.maximum(graph.T)
+
+        loops = graph.max(axis=0).toarray().ravel()
+
+        self.graph = (graph + sparse.diags(loops - graph.diagonal())).tocsr()
+        self.graph.eliminate_zeros()
+
+    @staticmethod
+    def _normalize(mtx):
+        """
+        Scales the columns of a matrix to sum 1.
+
+        Parameters
+        ----------
+        mtx : scipy.sparse.csr_matrix
+            Matrix to normalize.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Column stochastic matrix.
+        """
+
+        sums = np.asarray(mtx.sum(axis=0)).ravel()
+        sums[sums == 0] = 1
+
+        return mtx.dot(sparse.diags(1. / sums)).tocsr()
+
+    @staticmethod
+    def _prune(mtx, threshold):
+        """
+        Removes the entries below `threshold`, except the maximum entry of
+        each column.
+
+        Parameters
+        ----------
+        mtx : scipy.sparse.csr_matrix
+            Column stochastic matrix.
+        threshold : float
+            Minimum value of the entries that are kept.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Pruned matrix.
+        """
+
+        col_max = mtx.max(axis=0).toarray().ravel()
+
+        mtx.data[(mtx.data < threshold) &
+                 (mtx.data < col_max[mtx.indices])] = 0
+        mtx.eliminate_zeros()
+
+        return mtx
+
+    def cluster(self, inflation, expansion=2, prune_threshold=1e-4,
+                max_iter=100, tol=1e-6, ns=None):
+        """
+        Clusters the graph with the Markov Cluster algorithm.
+
+        Each iteration expands the column stochastic matrix of the graph by
+        raising it to the `expansion` power, inflates it by raising its
+        entries to the `inflation` power and prunes the entries below
+        `prune_threshold`. Iterations stop when no entry changes more than
+        `tol` or after `max_iter` iterations. The clusters are the
+        connected components of the final matrix.
+
+        Parameters
+        ----------
+        inflation : float
+            Inflation value.
+        expansion : int
+            Expansion power.
+        prune_threshold : float
+            Entries below this value are removed after each iteration.
+        max_iter : int
+            Maximum number of iterations.
+        tol : float
+            Convergence tolerance.
+        ns : multiprocessing.Manager.Namespace
+            A Namespace object used to check the kill switch.
+
+        Returns
+        -------
+        clusters : list
+            List of clusters, each a list of node labels, sorted by
+            decreasing size.
+        """
+
+        mtx = self._normalize(self.graph.copy())
+
+        for _ in xrange(max_iter):
+
+            if ns:
+                if ns.stop:
+                    raise KillByUser("")
+
+            prev = mtx
+
+            for _ in xrange(expansion - 1):
+                mtx = mtx.dot(prev)
+
+            mtx.data **= inflation
+            mtx = self._normalize(self._prune(self._normalize(mtx),
+                                              prune_threshold))
+
+            diff = abs(mtx - prev)
+            if not diff.nnz or diff.max() < tol:
+                break
+
+        _, components = connected_components(mtx, directed=True,
+                                             connection="weak")
+
+        # Members of each cluster follow the node order. Clusters are sorted
+        # by decreasing size and then by their first member
+        order = np.argsort(components, kind="mergesort")
+        bounds = np.flatnonzero(np.diff(components[order])) + 1
+        clusters = np.split(order, bounds)
+        clusters.sort(key=lambda x: (-len(x), x[0]))
+
+        return [list(self.labels[x]) for x in clusters]
+
+    def write_clusters(self, inflation, outfile, **kwargs):
+        """
+        Clusters the graph and writes the clusters in the format of the
+        `mcl --abc` output, one cluster per line with tab separated labels.
+
+        Parameters
+        ----------
+        inflation : float
+            Inflation value.
+        outfile : str
+            Path to the output file.
+        kwargs
+            Other arguments of `cluster`.
+        """
+
+        with open(outfile, "w") as fh:
+            for cl in self.cluster(inflation, **kwargs):
+                fh.write("\t".join(cl) + "\n")
+
+
+__author__ = "Diogo N. Silva"
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import sqlite3 as lite
 from decimal import Decimal
 
@@ -13,8 +14,17 @@ except ImportError:
 
 VAR_LENGTH = 0
 VAR_TAXON = 1
+VAR_ID = 2
 cur = None
 
+# Size hint (in bytes) of each chunk of lines read from the blast file
+CHUNK_SIZE = 16 * 1024 * 1024
+# Interval (in seconds) between reads of a blast file that is still being
+# written
+POLL_INTERVAL = .5
+# Number of SimilarSequences rows inserted by each executemany call
+BATCH_SIZE = 50000
+
 """
 Read all fasta files from a folder, placing the genes present on those fasta
 into a single variable
@@ -60,7 +70,7 @@ def get_genes(files_dir):
 
                 # save new gene info
                 gene = line[1:]
-                genes[gene] = [None, taxon]
+                genes[gene] = [None, taxon, None]
 
                 # reset vars
                 length = 0
@@ -74,12 +84,138 @@ def get_genes(files_dir):
     return genes
 
 
+def load_dictionaries(genes, cur):
+    """
+    Assigns integer ids to the sequences and taxa in `genes` and stores
+    them in the SequenceDictionary and TaxonDictionary tables. The ids
+    follow the sort order of the names. The taxon name of each gene is
+    replaced by the taxon id, and the sequence id is stored in the VAR_ID
+    field.
+    """
+
+    taxon_ids = dict((taxon, i) for i, taxon in enumerate(
+        sorted(set(x[VAR_TAXON] for x in genes.itervalues())), 1))
+
+    cur.executemany("INSERT INTO TaxonDictionary VALUES (?, ?)",
+                    ((i, taxon) for taxon, i in taxon_ids.iteritems()))
+
+    for i, gene in enumerate(sorted(genes), 1):
+        genes[gene][VAR_TAXON] = taxon_ids[genes[gene][VAR_TAXON]]
+        genes[gene][VAR_ID] = i
+
+    cur.executemany("INSERT INTO SequenceDictionary VALUES (?, ?, ?)",
+                    ((x[VAR_ID], gene, x[VAR_TAXON]) for gene, x in
+                     genes.iteritems()))
+
+
+def extend_dictionaries(genes, cur):
+    """
+    Adds the new sequences and taxa in `genes` to the dictionaries of a
+    database that already contains similar sequences. All ids are assigned
+    again by `load_dictionaries`, so that they follow the sort order of
+    the names, and the ids of the existing SimilarSequences rows are
+    converted to the new ones. Rows of sequences that are no longer in
+    `genes` are removed.
+    """
+
+    cur.execute("SELECT SEQUENCE_ID, SEQUENCE_NAME FROM SequenceDictionary")
+    old_sequences = cur.fetchall()
+    cur.execute("SELECT TAXON_ID, TAXON_NAME FROM TaxonDictionary")
+    old_taxa = cur.fetchall()
+
+    cur.execute("DELETE FROM SequenceDictionary")
+    cur.execute("DELETE FROM TaxonDictionary")
+
+    load_dictionaries(genes, cur)
+
+    cur.execute("SELECT TAXON_NAME, TAXON_ID FROM TaxonDictionary")
+    taxon_ids = dict(cur.fetchall())
+
+    cur.execute("CREATE TEMP TABLE SequenceMap "
+                "(OLD_ID INTEGER PRIMARY KEY, NEW_ID INT)")
+    cur.executemany("INSERT INTO SequenceMap VALUES (?, ?)",
+                    ((i, genes[name][VAR_ID]) for i, name in old_sequences
+                     if name in genes))
+
+    cur.execute("CREATE TEMP TABLE TaxonMap "
+                "(OLD_ID INTEGER PRIMARY KEY, NEW_ID INT)")
+    cur.executemany("INSERT INTO TaxonMap VALUES (?, ?)",
+                    ((i, taxon_ids[name]) for i, name in old_taxa
+                     if name in taxon_ids))
+
+    # The rows are copied back in their original order, as if the blast
+    # output had been parsed again
+    cur.execute("CREATE TEMP TABLE PreviousSequences AS "
+                "SELECT * FROM SimilarSequences ORDER BY rowid")
+    cur.execute("DELETE FROM SimilarSequences")
+    cur.execute("INSERT INTO SimilarSequences "
+                "SELECT q.new_id, s.new_id, qt.new_id, st.new_id, "
+                "p.evalue_mant, p.evalue_exp, p.percent_identity, "
+                "p.percent_match "
+                "FROM PreviousSequences p "
+                "JOIN SequenceMap q ON q.old_id = p.query_id "
+                "JOIN SequenceMap s ON s.old_id = p.subject_id "
+                "JOIN TaxonMap qt ON qt.old_id = p.query_taxon_id "
+                "JOIN TaxonMap st ON st.old_id = p.subject_taxon_id "
+                "ORDER BY p.rowid")
+
+    for table in ["SequenceMap", "TaxonMap", "PreviousSequences"]:
+        cur.execute("DROP TABLE %s" % table)
+
+
+def read_chunks(blast_fh, follow=None, nm=None):
+    """
+    Generator of the chunks of complete lines of the blast file.
+
+    If `follow` is provided, the file is being written while it is read.
+    At the end of the file, lines that are not yet complete are kept until
+    the rest of the line is written, and the file is read again while
+    `follow()` returns True. Since lines are only appended, the chunks
+    are the same as if the complete file was read.
+    """
+
+    pending = ""
+
+    while True:
+
+        # Checked before reading, so that the lines written until the end
+        # of the search are read
+        running = follow is not None and follow()
+
+        lines = blast_fh.readlines(CHUNK_SIZE)
+
+        if lines:
+            lines[0] = pending + lines[0]
+            pending = ""
+            if running and not lines[-1].endswith("\n"):
+                pending = lines.pop()
+            if lines:
+                yield lines
+            continue
+
+        if not running:
+            break
+
+        if nm:
+            if nm.stop:
+                raise KillByUser("")
+
+        time.sleep(POLL_INTERVAL)
+        # Clears the end of file state
+        blast_fh.seek(blast_fh.tell())
+
+    if pending:
+        yield [pending]
+
+
 def get_taxon_and_length(subject, genes):
 
     subject["queryTaxon"] = genes[subject["queryId"]][VAR_TAXON]
     subject["subjectTaxon"] = genes[subject["subjectId"]][VAR_TAXON]
     subject["queryLength"] = genes[subject["queryId"]][VAR_LENGTH]
     subject["subjectLength"] = genes[subject["subjectId"]][VAR_LENGTH]
+    subject["querySeqId"] = genes[subject["queryId"]][VAR_ID]
+    subject["subjectSeqId"] = genes[subject["subjectId"]][VAR_ID]
 
     try:
         subject["subjectTaxon"]
@@ -93,7 +229,11 @@ def get_taxon_and_length(subject, genes):
     return subject["queryLength"] < subject["subjectLength"]
 
 
-def print_previous_subject(subject, db):
+def get_similar_sequence(subject):
+    """
+    Returns the SimilarSequences row of a query-subject pair from its
+    aggregated HSP information
+    """
 
     non_overlap = non_overlapping_match(subject)
 
@@ -107,16 +247,15 @@ def print_previous_subject(subject, db):
     percent_match = '{0:.3g}'.format((float(non_overlap) /
                                       float(shorter_length) * 1000 + .5) / 10)
 
-    db.execute("INSERT OR IGNORE INTO SimilarSequences VALUES(?, ?, ?, ?, ?, ? ,?, ?)",
-                [subject["queryId"],
-                subject["subjectId"],
-                subject["queryTaxon"],
-                subject["subjectTaxon"],
-                float(subject["evalueMant"]),
-                int(subject["evalueExp"]),
-                float(percent_ident),
-                float(percent_match)])
-    
+    return (subject["querySeqId"],
+            subject["subjectSeqId"],
+            subject["queryTaxon"],
+            subject["subjectTaxon"],
+            float(subject["evalueMant"]),
+            int(subject["evalueExp"]),
+            float(percent_ident),
+            float(percent_match))
+
 
 def format_evalue(evalue):
     if evalue == '0':
@@ -172,87 +311,138 @@ def get_start_end(h):
     return start, end
 
 
-def orthomcl_blast_parser(blast_file, fasta_dir, db_dir, nm):
+def orthomcl_blast_parser(blast_file, fasta_dir, db_dir, nm, append=False,
+                          follow=None):
+    """
+    Parses the tabular output of the all-vs-all search into the
+    SimilarSequences table. If `append` is True, the hits are added to
+    the similar sequences of a previous search in the same database
+    (see `extend_dictionaries`), instead of replacing them. If `follow`
+    is provided, the blast file is parsed while the search writes it,
+    until `follow()` returns False (see `read_chunks`).
+
+    The blast file is read in chunks of lines of about `CHUNK_SIZE` bytes
+    and the HSPs of each query-subject pair are aggregated as they are
+    read. The resulting rows are inserted in batches of `BATCH_SIZE`
+    within a single transaction. Progress is reported in bytes read.
+
+    Sequences and taxa are stored by their integer ids (see
+    `load_dictionaries`).
+    """
+
+    insert_sql = "INSERT OR IGNORE INTO SimilarSequences " \
+                 "VALUES(?, ?, ?, ?, ?, ?, ?, ?)"
+
+    # Set progress information
+    if nm:
+        if nm.stop:
+            raise KillByUser("")
+        nm.total = os.path.getsize(blast_file)
+        nm.msg = None
+        nm.counter = 0
+
+    # parse fasta files
+    genes = get_genes(fasta_dir)
+
+    # Search programs report e-values with few significant digits, so the
+    # same e-value strings repeat often. Their mantissa and exponent are
+    # cached to avoid the Decimal formatting for each pair.
+    evalues = {}
+
+    prev_key = None
+    # hash to hold subject info
+    subject = {}
+    rows = []
 
     # create connection to DB
     con = lite.connect(os.path.join(db_dir, "orthoDB.db"))
-    with con:
-        #global cur
-        cur = con.cursor()
+    cur = con.cursor()
 
-        prev_subjectid = ''
-        prev_queryid = ''
-        # hash to hold subject info
-        subject = {}
+    # The connection is also closed when the parsing is stopped or fails
+    try:
+        cur.execute("PRAGMA synchronous = OFF")
+        cur.execute("PRAGMA journal_mode = MEMORY")
 
-        # Set progress information
-        if nm:
-            if nm.stop:
-                raise KillByUser("")
-            total = 0
-            for total, _ in enumerate(open(blast_file)):
-                pass
-            nm.total = total
-            nm.msg = None
-            nm.counter = 0
-
-        # parse fasta files
-        genes = get_genes(fasta_dir)
-        blast_fh = open(blast_file, "r")
-
-        for line in blast_fh:
-
-            if nm:
-                if nm.stop:
-                    raise KillByUser("")
-                nm.counter += 1
-
-            splitted = line.split()
-
-            query_id = splitted[0]
-            subject_id = splitted[1]
-            percent_identity = splitted[2]
-            length = int(splitted[3])
-            query_start = splitted[6]
-            query_end = splitted[7]
-            subject_start = splitted[8]
-            subject_end = splitted[9]
-            evalue = splitted[10]
-
-            if query_id != prev_queryid or subject_id != prev_subjectid:
-
-                # print previous subject
-                if subject:
-                    print_previous_subject(subject, cur)
-
-                # initialize new one from first HSP
-                prev_subjectid = subject_id
-                prev_queryid = query_id
-
-                # from first hsp
-                tup = format_evalue(evalue)
-
-                subject = {"queryId": query_id}
-                subject["subjectId"] = subject_id
-                subject["queryShorter"] = get_taxon_and_length(subject, genes)
-
-                subject["evalueMant"] = tup[0]
-                subject["evalueExp"] = tup[1]
-                subject["totalIdentities"] = 0
-                subject["totalLength"] = 0
-                subject["hspspans"] = []
-
-            # get additional info from subsequent HSPs
-            hspspan = (subject_start, subject_end)
-            if subject and subject["queryShorter"]:
-                hspspan = (query_start, query_end)
-            subject["hspspans"].append(hspspan)
-            subject["totalIdentities"] += float(percent_identity) * length
-            subject["totalLength"] += length
-
-        print_previous_subject(subject, cur)
-
-    con.close()
+        with con, open(blast_file, "r") as blast_fh:
+
+            if append:
+                extend_dictionaries(genes, cur)
+            else:
+                # Remove the sequences of a previous execution in the same
+                # database
+                for table in ["SimilarSequences", "SequenceDictionary",
+                              "TaxonDictionary"]:
+                    cur.execute("DELETE FROM %s" % table)
+
+                load_dictionaries(genes, cur)
+
+            for lines in read_chunks(blast_fh, follow, nm):
+
+                if nm:
+                    if nm.stop:
+                        raise KillByUser("")
+                    if follow:
+                        nm.total = os.fstat(blast_fh.fileno()).st_size
+                    nm.counter = blast_fh.tell()
+
+                for line in lines:
+
+                    splitted = line.split()
+
+                    if not splitted:
+                        continue
+
+                    key = (splitted[0], splitted[1])
+
+                    if key != prev_key:
+
+                        # store previous subject
+                        if subject:
+                            rows.append(get_similar_sequence(subject))
+
+                        # initialize new one from first HSP
+                        prev_key = key
+
+                        # from first hsp
+                        evalue = splitted[10]
+                        try:
+                            tup = evalues[evalue]
+                        except KeyError:
+                            tup = evalues[evalue] = format_evalue(evalue)
+
+                        subject = {"queryId": key[0],
+                                   "subjectId": key[1]}
+                        subject["queryShorter"] = get_taxon_and_length(subject,
+                                                                       genes)
+
+                        subject["evalueMant"] = tup[0]
+                        subject["evalueExp"] = tup[1]
+                        subject["totalIdentities"] = 0
+                        subject["totalLength"] = 0
+                        subject["hspspans"] = []
+
+                    # get additional info from subsequent HSPs
+                    length = int(splitted[3])
+                    if subject["queryShorter"]:
+                        subject["hspspans"].append((int(splitted[6]),
+                                                    int(splitted[7])))
+                    else:
+                        subject["hspspans"].append((int(splitted[8]),
+                                                    int(splitted[9])))
+                    subject["totalIdentities"] += float(splitted[2]) * length
+                    subject["totalLength"] += length
+
+                if len(rows) >= BATCH_SIZE:
+                    cur.executemany(insert_sql, rows)
+                    rows = []
+
+            if subject:
+                rows.append(get_similar_sequence(subject))
+
+            cur.executemany(insert_sql, rows)
+
+    finally:
+        con.close()
 
 
 # if __name__ == "__main__":
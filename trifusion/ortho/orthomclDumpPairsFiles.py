@@ -12,9 +12,12 @@ except ImportError:
 
 def printInparalogsFile (cur, filename, nm=None):
 
-    cur.execute("select taxon_id, sequence_id_a, sequence_id_b, normalized_score\
-        from InParalog\
-        order by taxon_id, sequence_id_a, sequence_id_b asc")
+    cur.execute("select ip.taxon_id, a.sequence_name, b.sequence_name,\
+        ip.normalized_score\
+        from InParalog ip\
+        join SequenceDictionary a on a.sequence_id = ip.sequence_id_a\
+        join SequenceDictionary b on b.sequence_id = ip.sequence_id_b\
+        order by ip.taxon_id, ip.sequence_id_a, ip.sequence_id_b asc")
 
     file_fh = open(filename, "w")
 
@@ -39,9 +42,13 @@ def printInparalogsFile (cur, filename, nm=None):
 
 def printOrthologsFile (cur, filename, nm=None):
 
-    cur.execute("select taxon_id_a, taxon_id_b, sequence_id_a, sequence_id_b, normalized_score\
-        from Ortholog\
-        order by taxon_id_a, taxon_id_b, sequence_id_a, sequence_id_b asc")
+    cur.execute("select o.taxon_id_a, o.taxon_id_b, a.sequence_name,\
+        b.sequence_name, o.normalized_score\
+        from Ortholog o\
+        join SequenceDictionary a on a.sequence_id = o.sequence_id_a\
+        join SequenceDictionary b on b.sequence_id = o.sequence_id_b\
+        order by o.taxon_id_a, o.taxon_id_b, o.sequence_id_a,\
+        o.sequence_id_b asc")
 
     file_fh = open(filename, "w")
 
@@ -65,9 +72,13 @@ def printOrthologsFile (cur, filename, nm=None):
 
 def printCoOrthologsFile (cur, filename, nm=None):
 
-    cur.execute("select taxon_id_a, taxon_id_b, sequence_id_a, sequence_id_b, normalized_score\
-        from CoOrtholog\
-        order by taxon_id_a, taxon_id_b, sequence_id_a, sequence_id_b asc")
+    cur.execute("select o.taxon_id_a, o.taxon_id_b, a.sequence_name,\
+        b.sequence_name, o.normalized_score\
+        from CoOrtholog o\
+        join SequenceDictionary a on a.sequence_id = o.sequence_id_a\
+        join SequenceDictionary b on b.sequence_id = o.sequence_id_b\
+        order by o.taxon_id_a, o.taxon_id_b, o.sequence_id_a,\
+        o.sequence_id_b asc")
 
     file_fh = open(filename, "w")
 
@@ -91,14 +102,18 @@ def printCoOrthologsFile (cur, filename, nm=None):
 
 def printMclAbcFile (cur, filename, nm=None):
 
-    cur.execute("select sequence_id_a, sequence_id_b, normalized_score\
+    cur.execute("select a.sequence_name, b.sequence_name, p.normalized_score\
+        from (select sequence_id_a, sequence_id_b, normalized_score\
         from InParalog\
         union\
         select sequence_id_a, sequence_id_b, normalized_score\
         from Ortholog\
         union\
         select sequence_id_a, sequence_id_b, normalized_score\
-        from CoOrtholog")
+        from CoOrtholog) p\
+        join SequenceDictionary a on a.sequence_id = p.sequence_id_a\
+        join SequenceDictionary b on b.sequence_id = p.sequence_id_b\
+        order by p.sequence_id_a, p.sequence_id_b, p.normalized_score")
 
     file_fh = open(filename, "w")
 
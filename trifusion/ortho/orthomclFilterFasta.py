@@ -11,7 +11,13 @@ except ImportError:
 
 
 def orthomcl_filter_fasta(input_dir, min_length, max_stop_percent, db, dest,
-                             nm=None):
+                             nm=None, files=None, append=False):
+    """
+    Filters the proteome files in `input_dir` into the `db` file (good
+    proteins) and the poorProteins.txt file. If `files` is provided, only
+    these files of `input_dir` are filtered. If `append` is True, the
+    sequences are appended to existing output files.
+    """
 
     def handle_seq(seq, length, stop_cnt):
         is_bad = 0
@@ -25,10 +31,14 @@ def orthomcl_filter_fasta(input_dir, min_length, max_stop_percent, db, dest,
 
         return is_bad
 
-    good = open(os.path.join(dest, "backstage_files", db), "w")
-    bad = open(os.path.join(dest, "backstage_files", "poorProteins.txt"), "w")
+    mode = "a" if append else "w"
+    good = open(os.path.join(dest, "backstage_files", db), mode)
+    bad = open(os.path.join(dest, "backstage_files", "poorProteins.txt"), mode)
 
-    filenames = [os.path.join(input_dir, x) for x in os.listdir(input_dir)]
+    if files is None:
+        files = os.listdir(input_dir)
+
+    filenames = [os.path.join(input_dir, x) for x in files]
 
     reject_rates = []
 
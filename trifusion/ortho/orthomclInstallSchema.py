@@ -7,13 +7,33 @@ import os
 ##############################################################
 
 
+def createDictionaryTables(cur):
+    """
+    Sequence and taxon names are stored only in these tables. The
+    remaining tables refer to them by their integer ids, which are
+    assigned in the sort order of the names so that comparisons between
+    ids are equivalent to comparisons between names.
+    """
+
+    cur.execute("CREATE TABLE TaxonDictionary (\
+        TAXON_ID INTEGER PRIMARY KEY,\
+        TAXON_NAME VARCHAR(40) UNIQUE)")
+
+    cur.execute("CREATE TABLE SequenceDictionary (\
+        SEQUENCE_ID INTEGER PRIMARY KEY,\
+        SEQUENCE_NAME VARCHAR(60) UNIQUE,\
+        TAXON_ID INT)")
+
+##############################################################
+
+
 def createSimilarSequencesTable(cur):
 
     cur.execute("CREATE TABLE SimilarSequences (\
-        QUERY_ID VARCHAR(60),\
-        SUBJECT_ID VARCHAR(60),\
-        QUERY_TAXON_ID VARCHAR(40),\
-        SUBJECT_TAXON_ID VARCHAR(40),\
+        QUERY_ID INT,\
+        SUBJECT_ID INT,\
+        QUERY_TAXON_ID INT,\
+        SUBJECT_TAXON_ID INT,\
         EVALUE_MANT FLOAT,\
         EVALUE_EXP INT,\
         PERCENT_IDENTITY FLOAT,\
@@ -36,9 +56,9 @@ def createSimilarSequencesTable(cur):
 def createInParalogTable (cur):
 
     cur.execute("CREATE TABLE InParalog (\
-        SEQUENCE_ID_A VARCHAR(60),\
-        SEQUENCE_ID_B VARCHAR(60),\
-        TAXON_ID VARCHAR(40),\
+        SEQUENCE_ID_A INT,\
+        SEQUENCE_ID_B INT,\
+        TAXON_ID INT,\
         UNNORMALIZED_SCORE FLOAT,\
         NORMALIZED_SCORE FLOAT)")
 
@@ -54,10 +74,10 @@ def createInParalogTable (cur):
 def createOrthologTable(cur):
 
     cur.execute("CREATE TABLE Ortholog (\
-        SEQUENCE_ID_A VARCHAR(60),\
-        SEQUENCE_ID_B VARCHAR(60),\
-        TAXON_ID_A VARCHAR(40),\
-        TAXON_ID_B VARCHAR(40),\
+        SEQUENCE_ID_A INT,\
+        SEQUENCE_ID_B INT,\
+        TAXON_ID_A INT,\
+        TAXON_ID_B INT,\
         UNNORMALIZED_SCORE FLOAT,\
         NORMALIZED_SCORE FLOAT)")
 
@@ -73,10 +93,10 @@ def createOrthologTable(cur):
 def createCoOrthologTable(cur):
 
     cur.execute("CREATE TABLE CoOrtholog (\
-        SEQUENCE_ID_A VARCHAR(60),\
-        SEQUENCE_ID_B VARCHAR(60),\
-        TAXON_ID_A VARCHAR(40),\
-        TAXON_ID_B VARCHAR(40),\
+        SEQUENCE_ID_A INT,\
+        SEQUENCE_ID_B INT,\
+        TAXON_ID_A INT,\
+        TAXON_ID_B INT,\
         UNNORMALIZED_SCORE FLOAT,\
         NORMALIZED_SCORE FLOAT)")
 
@@ -116,6 +136,7 @@ def execute(out_dir):
 
         cur.execute("PRAGMA SYNCHRONOUS = OFF")
 
+        createDictionaryTables(cur)
         createSimilarSequencesTable(cur)
         createInParalogTable(cur)
         createOrthologTable(cur)
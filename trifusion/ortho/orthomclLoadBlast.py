@@ -5,24 +5,55 @@ import sqlite3 as lite
 import os
 
 
+def read_rows(similar_seqs_file):
+    """
+    Generator of the rows of the similar sequences file, with the names
+    of the sequences and taxa and the numeric fields converted to float.
+    """
+
+    with open(similar_seqs_file) as file_handle:
+        for line in file_handle:
+            if line.strip() != "" and line:
+                f = line.split("\t")
+
+                yield (f[0], f[1], f[2], f[3], float(f[4]), float(f[5]),
+                       float(f[6]), float(f[7]))
+
+
 def execute(db_dir, similar_seqs_file):
+    """
+    Loads the similar sequences file into the database. The file is read
+    twice, so that only the ids of the sequences and taxa are kept in
+    memory: the first pass collects the names, and the second inserts
+    the rows as they are read.
+    """
+
     con = lite.connect(os.path.join(db_dir, "orthoDB.db"))
 
     with con:
 
         cur = con.cursor()
 
-        file_handle = open(similar_seqs_file)
-
-        for line in file_handle:
-            if line.strip() != "" and line:
-                f = line.split("\t")
-
-                l = (f[0], f[1], f[2], f[3], float(f[4]), float(f[5]),
-                    float(f[6]), float(f[7]))
-                
-                cur.execute("INSERT INTO SimilarSequences VALUES(?, ?, ?, ?, "
-                            "?, ? ,?, ?)", l)
+        # Sequences and taxa are stored by their integer ids, assigned in
+        # the sort order of their names
+        seq_taxon = {}
+        for l in read_rows(similar_seqs_file):
+            seq_taxon[l[0]], seq_taxon[l[1]] = l[2], l[3]
+        taxon_ids = dict((x, i) for i, x in enumerate(
+            sorted(set(seq_taxon.values())), 1))
+        seq_ids = dict((x, i) for i, x in enumerate(sorted(seq_taxon), 1))
+
+        cur.executemany("INSERT INTO TaxonDictionary VALUES (?, ?)",
+                        ((i, x) for x, i in taxon_ids.items()))
+        cur.executemany("INSERT INTO SequenceDictionary VALUES (?, ?, ?)",
+                        ((i, x, taxon_ids[seq_taxon[x]]) for x, i in
+                         seq_ids.items()))
+
+        cur.executemany("INSERT INTO SimilarSequences VALUES(?, ?, ?, ?, "
+                        "?, ? ,?, ?)",
+                        ((seq_ids[l[0]], seq_ids[l[1]], taxon_ids[l[2]],
+                          taxon_ids[l[3]]) + l[4:] for l in
+                         read_rows(similar_seqs_file)))
 
     con.close()
 
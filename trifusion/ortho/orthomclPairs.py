@@ -4,6 +4,8 @@
 import sqlite3 as lite
 import os
 import math
+import numpy as np
+import pandas as pd
 
 try:
     from process.error_handling import KillByUser
@@ -64,6 +66,17 @@ except ImportError:
 ############################### Auxiliar    #################################
 ################################################################################
 
+# Memory budget (in bytes) for the in memory engine. If None, half of the
+# available memory is used
+MEMORY_BUDGET = None
+# Estimate of the memory used per SimilarSequences row by the in memory
+# engine, including the intermediate tables
+BYTES_PER_HIT = 500
+# Tables created by orthomclInstallSchema
+SCHEMA_TABLES = ["TaxonDictionary", "SequenceDictionary", "SimilarSequences",
+                 "InParalog", "Ortholog", "CoOrtholog"]
+
+
 def log(value):
     return math.log10(value)
 
@@ -124,8 +137,7 @@ def normalizeOrthologsSub (cur, co, table):
 ################################################################################
 ############################### Common tables #################################
 ################################################################################
-def commonTempTables (cur):
-
+def updateMinimumEvalueExponent (cur):
 
     cur.execute("select min(evalue_exp)\
         from SimilarSequences\
@@ -138,6 +150,11 @@ def commonTempTables (cur):
         set evalue_exp = ?\
         where evalue_exp = 0 and evalue_mant = 0", (minEvalueExp,))
 
+
+def commonTempTables (cur):
+
+    updateMinimumEvalueExponent(cur)
+
 ##########################################################################
 
     cur.execute("create table BestQueryTaxonScore as\
@@ -430,7 +447,238 @@ def coorthologs (cur):
     normalizeOrthologsSub(cur, "Co", "CoOrtholog")
 
 
-def execute(db_dir, nm=None):
+################################################################################
+############################### In memory engine ##############################
+################################################################################
+"""
+Column based implementation of the ortholog, in-paralog and co-ortholog
+stages above. SimilarSequences is loaded into a DataFrame and each of the
+intermediate tables of the SQL implementation is replaced by sorted
+group-by and merge operations. Only the final InParalog, Ortholog and
+CoOrtholog tables are written to the database.
+"""
+
+def fitsMemory(cur):
+
+    budget = MEMORY_BUDGET
+    if budget is None:
+        try:
+            import psutil
+            budget = psutil.virtual_memory().available / 2
+        except ImportError:
+            budget = 2 * 1024 ** 3
+
+    cur.execute("select max(rowid) from SimilarSequences")
+    nrows = cur.fetchone()[0] or 0
+
+    return nrows * BYTES_PER_HIT <= budget
+
+
+def loadSimilarSequences(cur):
+
+    cur.execute("select query_id, subject_id, query_taxon_id,\
+        subject_taxon_id, evalue_exp, evalue_mant, percent_match\
+        from SimilarSequences")
+
+    # Rows are converted directly into typed columns
+    rows = np.fromiter(cur, dtype=[
+        ("q", np.int64), ("s", np.int64), ("qt", np.int64),
+        ("st", np.int64), ("e", np.int64), ("m", np.float64),
+        ("pm", np.float64)])
+
+    return pd.DataFrame(rows)
+
+
+def pairScore(e1, m1, e2, m2, threshold):
+
+    # Same as the score expression of the SQL queries. When any of the
+    # mantissas is below the threshold, the integer division truncates
+    # towards zero as in SQLite.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mant_score = (np.log10(m1 * m2) + e1 + e2) / -2.
+
+    return np.where((m1 < threshold) | (m2 < threshold),
+                    np.fix((e1 + e2) / -2.), mant_score)
+
+
+def reciprocalHits(hits, threshold):
+
+    # Pairs of hits in both directions, reported once with query < subject
+    rev = hits[["q", "s", "e", "m"]].rename(
+        columns={"q": "s", "s": "q", "e": "e2", "m": "m2"})
+    pairs = hits[hits.q < hits.s].merge(rev, on=["q", "s"])
+
+    pairs["score"] = pairScore(pairs.e.values, pairs.m.values,
+                               pairs.e2.values, pairs.m2.values, threshold)
+
+    return pairs
+
+
+def bestScore(hits, keys):
+
+    # Lowest exponent and, within it, lowest mantissa for each key
+    return hits.sort_values(keys + ["e", "m"]).drop_duplicates(keys)[
+        keys + ["e", "m"]]
+
+
+def insertPairs(cur, table, pairs, norm_keys):
+
+    avg_score = pairs.groupby(norm_keys)["score"].transform("mean")
+    pairs = pairs.assign(norm=pairs.score / avg_score)
+
+    cur.executemany("insert into %s values (?, ?, ?, ?, ?, ?)" % table,
+                    zip(*[pairs[x].tolist() for x in
+                          ["a", "b", "ta", "tb", "score", "norm"]]))
+
+
+def orthologPairs(pairs):
+
+    pairs = pairs.rename(columns={"q": "a", "s": "b", "qt": "ta",
+                                  "st": "tb"})
+    pairs["smaller_tax_id"] = np.minimum(pairs.ta.values, pairs.tb.values)
+    pairs["bigger_tax_id"] = np.maximum(pairs.ta.values, pairs.tb.values)
+
+    return pairs
+
+
+def memCommon(cur, data):
+
+    ss = loadSimilarSequences(cur)
+
+    # Same as updateMinimumEvalueExponent, without changing the table
+    min_exp = ss.e.values[ss.m.values != 0].min() - 1
+    ss.loc[(ss.e == 0) & (ss.m == 0), "e"] = min_exp
+
+    data["ss"] = ss
+    data["bqts"] = bestScore(ss[ss.qt != ss.st], ["q", "st"])
+
+
+def memOrthologs(cur, data):
+
+    ss, bqts = data["ss"], data["bqts"]
+
+    cutoff = bqts.rename(columns={"e": "ce", "m": "cm"})
+    bh = ss[ss.qt != ss.st].merge(cutoff, on=["q", "st"])
+    bh = bh[(bh.e <= -5) & (bh.pm >= 50) &
+            ((bh.m < 0.01) | ((bh.e == bh.ce) & (bh.m == bh.cm)))]
+
+    ortho = orthologPairs(reciprocalHits(bh, 0.01))
+
+    insertPairs(cur, "Ortholog", ortho, ["smaller_tax_id", "bigger_tax_id"])
+
+    data["ortho"] = ortho
+
+
+def memInparalogs(cur, data):
+
+    ss, bqts, ortho = data["ss"], data["bqts"], data["ortho"]
+
+    bis = bestScore(bqts, ["q"]).rename(columns={"e": "be", "m": "bm"})
+
+    hits = ss[(ss.qt == ss.st) & (ss.e <= -5) & (ss.pm >= 50)].merge(
+        bis, on="q", how="left")
+
+    # Queries with an inter taxon hit must be better than it. Those without
+    # any inter taxon hit keep all their hits, including self hits.
+    has_bis = hits.be.notnull()
+    better = hits[(has_bis & (hits.q != hits.s) &
+                   ((hits.m < 0.001) | (hits.e < hits.be) |
+                    ((hits.e == hits.be) & (hits.m <= hits.bm)))) |
+                  ~has_bis]
+
+    inpara = reciprocalHits(better, 0.01).rename(
+        columns={"q": "a", "s": "b", "qt": "ta"})
+
+    all_avg = inpara.groupby("ta")["score"].mean()
+
+    ortho_ids = np.union1d(ortho.a.values, ortho.b.values)
+    in_ortho = inpara.a.isin(ortho_ids) | inpara.b.isin(ortho_ids)
+    orth_avg = inpara[in_ortho].groupby("ta")["score"].mean()
+
+    avg_score = orth_avg.reindex(all_avg.index).fillna(all_avg)
+    inpara["norm"] = inpara.score / inpara.ta.map(avg_score)
+
+    cur.executemany("insert into InParalog values (?, ?, ?, ?, ?)",
+                    zip(*[inpara[x].tolist() for x in
+                          ["a", "b", "ta", "score", "norm"]]))
+
+    data["inpara"] = inpara
+
+
+def memCoorthologs(cur, data):
+
+    ss, ortho, inpara = data["ss"], data["ortho"], data["inpara"]
+
+    def twoWay(pairs):
+        return pd.concat([
+            pairs[["a", "b"]],
+            pairs[["b", "a"]].rename(columns={"b": "a", "a": "b"})
+        ]).drop_duplicates()
+
+    ip2 = twoWay(inpara)
+    o2 = twoWay(ortho).rename(columns={"a": "oa", "b": "ob"})
+
+    # InParalogOrtholog, which is also the first join of InplgOrthoInplg
+    ip_o = ip2.merge(o2, left_on="b", right_on="oa")[["a", "ob"]]
+    ip_o = ip_o.drop_duplicates().rename(columns={"ob": "b"})
+
+    ip_o_ip = ip_o.merge(ip2.rename(columns={"a": "b", "b": "b2"}),
+                         on="b")[["a", "b2"]].rename(columns={"b2": "b"})
+
+    cand = pd.concat([ip_o, ip_o_ip])
+    cand = pd.DataFrame({
+        "a": np.minimum(cand.a.values, cand.b.values),
+        "b": np.maximum(cand.a.values, cand.b.values)}).drop_duplicates()
+
+    # Remove candidates that are already orthologs
+    cand = cand.merge(ortho[["a", "b"]], how="left", indicator=True)
+    cand = cand[cand._merge == "left_only"][["a", "b"]]
+
+    hits = ss[(ss.e <= -5) & (ss.pm >= 50)]
+    ab = hits[["q", "s", "qt", "st", "e", "m"]].rename(
+        columns={"q": "a", "s": "b"})
+    ba = hits[["q", "s", "e", "m"]].rename(
+        columns={"q": "b", "s": "a", "e": "e2", "m": "m2"})
+
+    coortho = cand.merge(ab, on=["a", "b"]).merge(ba, on=["a", "b"])
+    coortho["score"] = pairScore(
+        coortho.e.values, coortho.m.values, coortho.e2.values,
+        coortho.m2.values, 0.00001)
+
+    coortho = orthologPairs(coortho)
+
+    insertPairs(cur, "CoOrtholog", coortho,
+                ["smaller_tax_id", "bigger_tax_id"])
+
+
+def cleanPairs(cur):
+    """
+    Removes the pairs and the intermediate tables left by a previous
+    execution, so that the pairs can be found again in the same database.
+    """
+
+    cur.execute("select name from sqlite_master where type = 'table'")
+
+    for (table,) in cur.fetchall():
+        if table not in SCHEMA_TABLES:
+            cur.execute("drop table %s" % table)
+
+    for table in ["InParalog", "Ortholog", "CoOrtholog"]:
+        cur.execute("delete from %s" % table)
+
+
+def execute(db_dir, nm=None, engine="auto"):
+    """
+    Finds the orthologs, in-paralogs and co-orthologs from the
+    SimilarSequences table.
+
+    The `engine` can be "sql", which runs the original queries in SQLite,
+    or "memory" (also "auto"), which runs the column based implementation
+    when SimilarSequences fits in the MEMORY_BUDGET. The budget is checked
+    before the table is loaded, and the SQL engine is used when it is
+    exceeded. Both engines produce the same tables.
+    """
+
     con = lite.connect(os.path.join(db_dir, "orthoDB.db"))
 
     with con:
@@ -446,14 +694,30 @@ def execute(db_dir, nm=None):
 
         cur = con.cursor()
 
-        for func in [commonTempTables, orthologs, inparalogs, coorthologs]:
+        cleanPairs(cur)
+
+        if engine in ["auto", "memory"]:
+            engine = "memory" if fitsMemory(cur) else "sql"
+
+        if engine == "memory":
+            steps = [memCommon, memOrthologs, memInparalogs, memCoorthologs]
+        else:
+            steps = [commonTempTables, orthologs, inparalogs, coorthologs]
+
+        # The memory engine steps share their results through this dict
+        data = {}
+
+        for func in steps:
 
             if nm:
                 if nm.stop:
                     raise KillByUser("")
                 nm.counter += 1
 
-            func(cur)
+            if engine == "memory":
+                func(cur, data)
+            else:
+                func(cur)
 
     con.close()
 
@@ -251,14 +251,14 @@ def convert_protein_file(pairs, group_obj, id_db, output_dir, shared_ns):
     # Create handle for file storing bad sequence headers.
     bad_file = open(join(output_dir, "missed_sequences.log"), "w")
 
-    for line, cl in zip(group_obj.groups(),
-                        group_obj.iter_species_frequency()):
+    for line, compliant in zip(group_obj.groups(),
+                               group_obj.compliant_clusters()):
 
         if shared_ns:
             if shared_ns.stop:
                 raise KillByUser("")
 
-        if group_obj._get_compliance(cl) == (1, 1):
+        if compliant:
 
             line = group_obj._remove_tx(line)
 
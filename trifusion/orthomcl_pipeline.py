@@ -19,6 +19,7 @@
 
 
 import json
+import hashlib
 import warnings
 
 # Suppress import warnings
@@ -28,9 +29,12 @@ with warnings.catch_warnings():
     import os
     import sys
     import time
-    import codecs
     import subprocess
     import shutil
+    import multiprocessing
+    import threading
+    from multiprocessing.pool import ThreadPool
+    from functools import partial
     import traceback
     import argparse
     from os.path import abspath, join, basename
@@ -44,6 +48,7 @@ with warnings.catch_warnings():
         import ortho.orthomclFilterFasta as FilterFasta
         import ortho.orthomclBlastParser as BlastParser
         import ortho.orthomclMclToGroups as MclGroups
+        from ortho.markov_clustering import MarkovClustering
         from ortho.error_handling import *
         from process.error_handling import KillByUser
     except ImportError:
@@ -55,6 +60,7 @@ with warnings.catch_warnings():
         import trifusion.ortho.orthomclFilterFasta as FilterFasta
         import trifusion.ortho.orthomclBlastParser as BlastParser
         import trifusion.ortho.orthomclMclToGroups as MclGroups
+        from trifusion.ortho.markov_clustering import MarkovClustering
         from trifusion.ortho.error_handling import *
         from trifusion.process.error_handling import KillByUser
 
@@ -70,109 +76,144 @@ def install_schema(db_dir):
     install_sqlite.execute(db_dir)
 
 
-def check_unique_field(proteome_file, verbose=False, nm=None):
+def check_unique_field(header_list, proteome_file):
     """
-    Checks the original proteome file for a field in the fasta header
-    that is unique to all sequences
+    Checks a list of fasta headers for a field that is unique to all
+    sequences
+
+    :param header_list: list, with the split fields of each header
+    :param proteome_file: string, path to the proteome file, used only in
+    the error message
     """
 
-    # Some files may have utf8 encoding problems so I used codecs here
-    file_handle = codecs.open(proteome_file, "r", "cp1252")
-    header_list = []
+    # Headers may have different number of fields, so only the fields
+    # shared by all are checked
+    header_field_size = min(len(x) for x in header_list) if header_list else 0
 
-    header = ""
-    for line in file_handle:
+    for i in range(header_field_size):
 
-        if nm:
-            if nm.stop:
-                raise KillByUser("")
+        if len(set(x[i] for x in header_list)) == len(header_list):
+            return i
 
-        if line.startswith(">"):
-            header = line[1:].strip()
-            # Store header in list format
-            header_list.append(header.split("|"))
+    # Ideally, a unique field should be found before this code. If not, raise
+    #  exception
+    raise NoUniqueField("The proteome file {} has no unique field".format(
+        os.path.basename(proteome_file)))
 
-    # Get the size of the header fields
-    header_field_size = len(header.split("|"))
 
-    for i in range(header_field_size):
+def prep_fasta(proteome_file, code, dest, nm=None):
+    """
+    Prepares a proteome file for USEARCH.
+
+    Only the headers of the proteome are kept in memory. They are read in
+    a first pass over the file, skipping duplicates, to find the field of
+    the header that is unique to all sequences. The records are then
+    streamed to the `dest` directory in a second pass, with headers in the
+    "code|unique_field" format and without the records of duplicate
+    headers.
+
+    :param proteome_file: string, path to the proteome file
+    :param code: string, code of the proteome
+    :param dest: string, path to the directory where the adjusted file
+    is written
+    :param nm: Namespace object used to check for the kill switch
+    :return: tuple, with the index of the unique field and a dictionary
+    mapping the new headers to the original ones
+    """
 
-        if nm:
-            if nm.stop:
-                raise KillByUser("")
+    # Storing header set to check for duplicates
+    header_set = set()
+    headers = []
 
-        temp_list = []
-        for header in header_list:
-            temp_list.append(header[i])
+    with open(proteome_file) as file_in:
+        for line in file_in:
 
-        if len(temp_list) == len(set(temp_list)) and len(set(temp_list)) ==\
-                len(header_list):
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
 
-            # The orthoMCL program uses an index starting from 1, so the +1 is
-            #  a necessary adjustment
-            if verbose:
-                print_col("\t Using unique header field {}".format(i), GREEN, 1)
-            return i
+            if line.startswith(">"):
+                # Compared without the line ending, which the last line of
+                # the file may not have
+                header = line.strip()
+                if header not in header_set:
+                    header_set.add(header)
+                    headers.append(header)
 
-    # Ideally, a unique field should be found before this code. If not, raise
-    #  exception
-    raise NoUniqueField("The proteome file {} has no unique field".format(
-        os.path.basename(proteome_file)))
+    header_list = [x[1:].split("|") for x in headers]
+    unique_id = check_unique_field(header_list, proteome_file)
 
+    header_mapping = {}
+    new_headers = {}
 
-def prep_fasta(proteome_file, code, unique_id, dest, verbose=False, nm=None):
+    for header, fields in zip(headers, header_list):
+        new_header = "%s|%s" % (code, fields[unique_id].replace(" ", "_"))
+        header_mapping[new_header] = header
+        new_headers[header] = new_header
 
-    if verbose:
-        print_col("\t Preparing file for USEARCH", GREEN, 1)
+    # Will prevent writing the sequence of duplicate headers, whose new
+    # header was already used by the first record
+    lock = False
 
-    # Storing header list to check for duplicates
-    header_list = []
+    with open(proteome_file) as file_in, \
+            open(join(dest, code + ".fasta"), "w") as file_out:
+        for line in file_in:
 
-    # Get json with header mappings, if exists
-    json_f = join(dest, "backstage_files", "header_mapping.json")
-    if os.path.exists(json_f):
-        with open(json_f) as fh:
-            header_mapping = json.load(fh)
-    else:
-        header_mapping = {}
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
 
-    # Will prevent writing
-    lock = True
+            if line.startswith(">"):
+                lock = line.strip() in new_headers
+                if lock:
+                    file_out.write(">%s\n" % new_headers.pop(line.strip()))
+            elif lock:
+                file_out.write(line)
 
-    # File handles
-    file_in = open(proteome_file)
-    pfile = basename(proteome_file.split(".")[0] + "_mod.fas")
-    file_out_path = join(dest, "backstage_files", pfile)
-    file_out = open(file_out_path, "w")
+    return unique_id, header_mapping
 
-    for line in file_in:
 
-        if nm:
-            if nm.stop:
-                raise KillByUser("")
+def _prep_fasta_worker(args):
+    """
+    Wrapper of `prep_fasta` used by the process pool of `adjust_fasta`.
+    Proteome files that cannot be read return None instead of the
+    `prep_fasta` results.
 
-        if line.startswith(">"):
-            if line not in header_list:
-                fields = line.split("|")
-                unique_str = fields[unique_id].replace(" ", "_")
-                header_mapping["%s|%s" % (code, unique_str)] = line.strip()
-                header_list.append(line)
-                file_out.write(">%s|%s\n" % (code, unique_str))
-                lock = True
-            else:
-                lock = False
-        elif lock:
-            file_out.write(line)
-
-    # Close file handles:
-    file_in.close()
-    file_out.close()
+    :param args: tuple, with the proteome file, code, destination
+    directory and Namespace object
+    """
 
-    with open(json_f, "w") as fh:
-        json.dump(header_mapping, fh)
+    proteome, code, dest, nm = args
+
+    try:
+        return proteome, prep_fasta(proteome, code, dest, nm)
+    except (IOError, OSError):
+        return proteome, None
+
+
+def proteome_code(proteome_file):
+    """
+    Returns the code of a proteome, which is taken from its file name.
+    """
 
+    return proteome_file.split(os.path.sep)[-1].split(".")[0]
 
-def adjust_fasta(file_list, dest, nm=None):
+
+def adjust_fasta(file_list, dest, nm=None, cpus=1, append=False):
+    """
+    Adjusts the headers of the proteome files for USEARCH.
+
+    Proteome files are prepared independently, in a pool of `cpus`
+    processes when more than one is requested, and the header mappings of
+    all files are merged and written once at the end.
+
+    :param file_list: list, paths to the proteome files
+    :param dest: string, path to the output directory
+    :param nm: Namespace object used to communicate with TriFusion
+    :param cpus: int, number of processes used to prepare the files
+    :param append: bool, if True the files are added to the previously
+    adjusted files, which are otherwise removed
+    """
 
     print_col("Adjusting proteome files", GREEN, 1)
 
@@ -180,7 +221,7 @@ def adjust_fasta(file_list, dest, nm=None):
     cf_dir = join(dest, "backstage_files", "compliantFasta")
     if not os.path.exists(cf_dir):
         os.makedirs(cf_dir)
-    else:
+    elif not append:
         for f in os.listdir(cf_dir):
             os.remove(join(cf_dir, f))
 
@@ -192,43 +233,61 @@ def adjust_fasta(file_list, dest, nm=None):
         nm.total = len(file_list)
         nm.counter = 0
 
-    for proteome in file_list:
-        # Get code for proteome
-        code_name = proteome.split(os.path.sep)[-1].split(".")[0]
+    # Get json with header mappings, if exists
+    json_f = join(dest, "backstage_files", "header_mapping.json")
+    if os.path.exists(json_f):
+        with open(json_f) as fh:
+            header_mapping = json.load(fh)
+    else:
+        header_mapping = {}
+
+    jobs = [(proteome, proteome_code(proteome), cf_dir)
+            for proteome in file_list]
 
-        if nm:
-            if nm.stop:
-                raise KillByUser("")
-            nm.counter += 1
-            nm.msg = "Adjusting file {}".format(basename(proteome))
+    cpus = max(1, int(cpus))
+    pool = None
 
-        # Check the unique ID field
-        try:
-            unique_id = check_unique_field(proteome, True, nm)
-        except (IOError, OSError):
-            print_col("The file {} could not be parsed".format(proteome),
-                      YELLOW, 1)
-            continue
+    if cpus > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(cpus, len(jobs)))
+        results = pool.imap_unordered(_prep_fasta_worker,
+                                      [x + (None,) for x in jobs])
+    else:
+        # Running in the current process allows the kill switch to be
+        # checked while each file is read
+        results = (_prep_fasta_worker(x + (nm,)) for x in jobs)
 
-        # Adjust fasta
-        # stg = prep_fasta(proteome, code_name, unique_id)
-        prep_fasta(proteome, code_name, unique_id, dest, nm)
+    try:
+        for proteome, res in results:
 
-        protome_file_name = proteome.split(os.path.sep)[-1].split(".")[0] + \
-                            ".fasta"
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
+                nm.counter += 1
+                nm.msg = "Adjusting file {}".format(basename(proteome))
 
-        pfile = basename(proteome.split(".")[0] + "_mod.fas")
-        shutil.move(join(dest, "backstage_files", pfile),
-                    join(cf_dir, protome_file_name))
+            if res is None:
+                print_col("The file {} could not be parsed".format(proteome),
+                          YELLOW, 1)
+                continue
+
+            unique_id, file_mapping = res
+            print_col("\t Using unique header field {} for {}".format(
+                unique_id, basename(proteome)), GREEN, 1)
+            header_mapping.update(file_mapping)
+
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
 
-    json_f = join(dest, "backstage_files", "header_mapping.json")
     header_f = join(dest, "backstage_files", "header_mapping.csv")
-    if os.path.exists(json_f):
-        with open(json_f) as fh, open(header_f, "w") as ofh:
-            header_map = json.load(fh)
 
-            for k, v in header_map.items():
-                ofh.write("{}; {}\n".format(k, v))
+    with open(json_f, "w") as fh:
+        json.dump(header_mapping, fh)
+
+    with open(header_f, "w") as ofh:
+        for k, v in header_mapping.items():
+            ofh.write("{}; {}\n".format(k, v))
 
 
 def filter_fasta(min_len, max_stop, db, dest, nm=None):
@@ -240,37 +299,152 @@ def filter_fasta(min_len, max_stop, db, dest, nm=None):
     FilterFasta.orthomcl_filter_fasta(cp_dir, min_len, max_stop, db, dest, nm)
 
 
-def allvsall_usearch(goodproteins, evalue, dest, cpus, usearch_outfile,
-                     usearch_bin="usearch", nm=None):
+def _usearch_cmd(query, db, evalue, dest, cpus, usearch_outfile,
+                 usearch_bin="usearch", dbsize=None):
 
-    print_col("Perfoming USEARCH All-vs-All (may take a while...)", GREEN, 1)
+    # The size of the database used for the E-values. By default, the size
+    # of the searched database
+    extra = ["-ka_dbsize", str(dbsize)] if dbsize else []
 
     # FNULL = open(os.devnull, "w")
-    usearch_cmd = [usearch_bin,
+    return [usearch_bin,
                    "-ublast",
-                   join(dest, "backstage_files", goodproteins),
+                   join(dest, "backstage_files", query),
                    "-db",
-                   join(dest, "backstage_files", goodproteins),
+                   join(dest, "backstage_files", db),
                    "-blast6out",
                    join(dest, "backstage_files", usearch_outfile),
                    "-evalue", str(evalue),
                    "--maxaccepts",
                    "0",
                    "-threads",
-                   str(cpus)]
+                   str(cpus)] + extra
+
+
+def _usearch(query, db, evalue, dest, cpus, usearch_outfile,
+             usearch_bin="usearch", nm=None, dbsize=None):
+    """
+    Runs USEARCH and returns its exit status.
+    """
+
+    usearch_cmd = _usearch_cmd(query, db, evalue, dest, cpus, usearch_outfile,
+                               usearch_bin=usearch_bin, dbsize=dbsize)
 
     if nm:
         # The subprocess.Popen handler cannot be passed directly in Windows
         # due to pickling issues. So I pass the pid of the process instead.
         subp = subprocess.Popen(usearch_cmd)
         nm.subp = subp.pid
-        subp.wait()
+        code = subp.wait()
         nm.subp = None
     else:
-        _ = subprocess.Popen(usearch_cmd).wait()
+        code = subprocess.Popen(usearch_cmd).wait()
+
+    return code
+
 
+def _fasta_size(fasta_file):
+    """
+    Returns the number of residues of the sequences in `fasta_file`.
+    """
+
+    size = 0
+    with open(fasta_file) as fh:
+        for line in fh:
+            if not line.startswith(">"):
+                size += len(line.strip())
 
-def blast_parser(usearch_ouput, dest, db_dir, nm):
+    return size
+
+
+def allvsall_usearch(goodproteins, evalue, dest, cpus, usearch_outfile,
+                     usearch_bin="usearch", nm=None):
+
+    print_col("Perfoming USEARCH All-vs-All (may take a while...)", GREEN, 1)
+
+    _usearch(goodproteins, goodproteins, evalue, dest, cpus, usearch_outfile,
+             usearch_bin=usearch_bin, nm=nm)
+
+
+def incremental_usearch(goodproteins, newproteins, evalue, dest, cpus,
+                        usearch_outfile, usearch_bin="usearch", nm=None):
+    """
+    Searches the proteins in `newproteins` against themselves and the
+    proteins of `goodproteins`, and the proteins of `goodproteins` against
+    the new ones. The comparisons between proteins of `goodproteins` are
+    not repeated. The new proteins are then added to `goodproteins`.
+
+    Both searches compute the E-values with the size of the merged
+    database (-ka_dbsize), as a search of all proteins against all
+    proteins would. What still differs from a complete search is that the
+    hits between the previous proteins are kept from the previous search,
+    whose E-values were computed with the smaller database, and that the
+    heuristics of USEARCH may accept slightly different hits when the
+    searched database is not the complete one.
+
+    The merged database and the hits are written to side files, which are
+    only moved into place after both searches succeed. If the search is
+    stopped or fails, `goodproteins` is left unchanged.
+
+    :param goodproteins: string, name of the database with the proteins of
+    the previous search
+    :param newproteins: string, name of the database with the new proteins
+    :param usearch_outfile: string, name of the file where the hits of the
+    new comparisons are written
+    """
+
+    print_col("Perfoming USEARCH of the new proteins against all proteins "
+              "(may take a while...)", GREEN, 1)
+
+    bs_dir = join(dest, "backstage_files")
+    merged = goodproteins + ".merged"
+    prev_hits = usearch_outfile + ".prev"
+    new_hits = usearch_outfile + ".tmp"
+
+    with open(join(bs_dir, merged), "w") as fh:
+        for f in [goodproteins, newproteins]:
+            with open(join(bs_dir, f)) as in_fh:
+                shutil.copyfileobj(in_fh, fh)
+
+    dbsize = _fasta_size(join(bs_dir, merged))
+
+    # Previous proteins against the new ones, and new proteins against all
+    # proteins
+    searches = [(goodproteins, newproteins, prev_hits),
+                (newproteins, merged, new_hits)]
+
+    try:
+        for query, db, outfile in searches:
+
+            code = _usearch(query, db, evalue, dest, cpus, outfile,
+                            usearch_bin=usearch_bin, nm=nm, dbsize=dbsize)
+
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
+
+            if code:
+                raise UsearchError("USEARCH exited with status {}".format(
+                    code))
+
+        with open(join(bs_dir, new_hits), "a") as fh, \
+                open(join(bs_dir, prev_hits)) as prev_fh:
+            shutil.copyfileobj(prev_fh, fh)
+
+        for f, target in [(new_hits, usearch_outfile),
+                          (merged, goodproteins)]:
+            # os.rename does not replace existing files in Windows
+            if os.name == "nt" and os.path.exists(join(bs_dir, target)):
+                os.remove(join(bs_dir, target))
+            os.rename(join(bs_dir, f), join(bs_dir, target))
+
+    finally:
+        for f in [merged, prev_hits, new_hits]:
+            if os.path.exists(join(bs_dir, f)):
+                os.remove(join(bs_dir, f))
+
+
+def blast_parser(usearch_ouput, dest, db_dir, nm, append=False):
 
     print_col("Parsing BLAST output", GREEN, 1)
 
@@ -278,14 +452,89 @@ def blast_parser(usearch_ouput, dest, db_dir, nm):
         join(dest, "backstage_files", usearch_ouput),
         join(dest, "backstage_files", "compliantFasta"),
         db_dir,
-        nm)
+        nm,
+        append=append)
+
+
+def stream_usearch(goodproteins, evalue, dest, cpus, usearch_outfile, db_dir,
+                   usearch_bin="usearch", nm=None):
+    """
+    Performs the USEARCH All-vs-All and parses its output into the database
+    while it is being written, so that parsing overlaps with the search.
+    The hits of each query-subject pair are written together by USEARCH,
+    and the parser only reads complete lines, so the result is the same of
+    `allvsall_usearch` followed by `blast_parser`.
+
+    If the search is stopped or the parser fails, the USEARCH process is
+    terminated. If USEARCH fails, UsearchError is raised after the hits
+    written until then are parsed, so that the stage is not recorded as
+    completed.
+    """
+
+    print_col("Perfoming USEARCH All-vs-All and parsing its output (may "
+              "take a while...)", GREEN, 1)
+
+    outfile = join(dest, "backstage_files", usearch_outfile)
+
+    # The parser must not read the output of a previous search
+    if os.path.exists(outfile):
+        os.remove(outfile)
+
+    subp = subprocess.Popen(_usearch_cmd(goodproteins, goodproteins, evalue,
+                                         dest, cpus, usearch_outfile,
+                                         usearch_bin=usearch_bin))
+
+    # The subprocess.Popen handler cannot be passed directly in Windows
+    # due to pickling issues. So the pid of the process is passed instead.
+    if nm:
+        nm.subp = subp.pid
+
+    def running():
+        return subp.poll() is None
+
+    try:
+        # Wait for the output file to be created
+        while running() and not os.path.exists(outfile):
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
+            time.sleep(BlastParser.POLL_INTERVAL)
+
+        if not os.path.exists(outfile):
+            if nm:
+                if nm.stop:
+                    raise KillByUser("")
+            raise UsearchError("USEARCH exited with status {} without "
+                               "writing its output".format(subp.wait()))
+
+        BlastParser.orthomcl_blast_parser(
+            outfile, join(dest, "backstage_files", "compliantFasta"), db_dir,
+            nm, follow=running)
+
+        code = subp.wait()
+
+        if nm:
+            if nm.stop:
+                raise KillByUser("")
+
+        if code:
+            raise UsearchError("USEARCH exited with status {}".format(code))
+
+    except BaseException:
+        if running():
+            subp.terminate()
+        raise
+
+    finally:
+        if nm:
+            nm.subp = None
 
 
-def pairs(db_dir, nm=None):
+def pairs(db_dir, nm=None, engine="auto"):
 
     print_col("Finding pairs for orthoMCL", GREEN, 1)
 
-    make_pairs_sqlite.execute(db_dir, nm=nm)
+    make_pairs_sqlite.execute(db_dir, nm=nm, engine=engine)
 
 
 def dump_pairs(db_dir, dest, nm=None):
@@ -296,104 +545,846 @@ def dump_pairs(db_dir, dest, nm=None):
     dump_pairs_sqlite.execute(db_dir, dest, nm=nm)
 
 
-def mcl(inflation_list, dest, mcl_file="mcl", nm=None):
+def find_pairs(db_dir, dest, nm=None, engine="auto"):
 
-    print_col("Running mcl algorithm", GREEN, 1)
-    mcl_input = join(dest, "backstage_files", "mclInput")
-    mcl_output = join(dest, "backstage_files", "mclOutput_")
+    pairs(db_dir, nm=nm, engine=engine)
+    dump_pairs(db_dir, dest, nm=nm)
 
-    for val in inflation_list:
 
-        mcl_cmd = [mcl_file,
-                   mcl_input,
-                   "--abc",
-                   "-I",
-                   val,
-                   "-o",
-                   mcl_output + val.replace(".", "")]
+# Stages of the orthology search, in order of execution. The mcl, dump and
+# filter_groups stages are performed for each inflation value
+PIPELINE_STAGES = ["schema", "adjust", "filter", "usearch", "parse", "pairs",
+                   "mcl", "dump", "filter_groups"]
 
-        if nm:
-            # The subprocess.Popen handler cannot be passed directly in Windows
-            # due to pickling issues. So I pass the pid of the process instead.
-            subp = subprocess.Popen(mcl_cmd)
-            nm.subp = subp.pid
-            subp.wait()
-            nm.subp = None
-        else:
-            _ = subprocess.Popen(mcl_cmd).wait()
 
+class PipelineManifest(object):
+    """
+    Checkpoints of the orthology search stages.
+
+    When a stage is completed, its parameters and the fingerprints (size
+    and modification time) of its input and output files are recorded in
+    the backstage_files/pipeline_manifest.json file of the output
+    directory. When resuming, a stage is skipped if its parameters, inputs
+    and outputs are unchanged since it was completed and none of the
+    stages it depends on is executed.
+
+    Outputs that are shared and modified by several stages, such as the
+    sqlite database, are recorded as temporary outputs. These may be
+    removed after the search, and are only required when a stage that
+    depends on them is executed. In that case, they must match the
+    fingerprint left by the last stage that modified them, otherwise the
+    stages that produced them are executed as well.
+
+    Stages are described by dictionaries with their `name`, the `task`
+    in PIPELINE_STAGES they belong to (defaults to the name), the names of
+    the stages they depend on (`deps`), their `params` and the paths of
+    their `inputs`, `outputs` and `temp` outputs.
+
+    :param dest: string, path to the output directory
+    :param resume: bool, if False all stages are executed
+    :param force_from: string, name of the task in PIPELINE_STAGES from
+    which all stages are executed
+    """
 
-def mcl_groups(inflation_list, mcl_prefix, start_id, group_file, dest,
-                nm=None):
+    def __init__(self, dest, resume=False, force_from=None):
+
+        self.path = join(dest, "backstage_files", "pipeline_manifest.json")
+        self.resume = resume or bool(force_from)
+        self.force_from = force_from
+
+        # Names of the stages that will be executed. None until the stages
+        # are planned
+        self.run = None
+        self.lock = threading.Lock()
+
+        self.records = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as fh:
+                    self.records = json.load(fh)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def fingerprint(path):
+        """
+        Returns the fingerprint of a file or directory, or None if the path
+        does not exist. The fingerprint of a directory covers all files
+        inside it.
+        """
+
+        if os.path.isdir(path):
+            entries = []
+            for root, _, files in os.walk(path):
+                for f in files:
+                    st = os.stat(join(root, f))
+                    entries.append((os.path.relpath(join(root, f), path),
+                                    st.st_size, st.st_mtime))
+            return hashlib.md5(json.dumps(sorted(entries))).hexdigest()
+
+        if os.path.isfile(path):
+            st = os.stat(path)
+            return "{}:{!r}".format(st.st_size, st.st_mtime)
+
+        return None
+
+    @staticmethod
+    def _normalize(params):
+
+        # Parameters are compared as they are stored in the manifest
+        return json.loads(json.dumps(params or {}))
+
+    def _current(self, stage):
+        """
+        Checks if a stage is unchanged since it was last completed.
+        """
+
+        rec = self.records.get(stage["name"])
+
+        if rec is None or rec["params"] != self._normalize(stage.get(
+                "params")):
+            return False
+
+        for field in ("inputs", "outputs"):
+            paths = set(abspath(x) for x in stage.get(field, []))
+            if paths != set(rec[field]):
+                return False
+            if any(self.fingerprint(x) != fp for x, fp in
+                   rec[field].items()):
+                return False
+
+        return True
+
+    def temp_current(self, path, names=None):
+        """
+        Checks if a temporary output matches the fingerprint left by the
+        last stage, in `names`, that modified it.
+
+        :param path: string, path to the temporary output
+        :param names: list, names of the stages in order of execution.
+        Defaults to PIPELINE_STAGES
+        """
+
+        path = abspath(path)
+        expected = [self.records[x]["temp"][path] for x in
+                    names or PIPELINE_STAGES if x in self.records and
+                    path in self.records[x]["temp"]]
+
+        return bool(expected) and self.fingerprint(path) == expected[-1]
+
+    def plan(self, stages):
+        """
+        Sets the stages that will be executed.
+
+        :param stages: list, the stages of the search in order of execution
+        :return: list, the names of the stages that will be executed
+        """
+
+        names = [x["name"] for x in stages]
+        deps = dict((x["name"], [d for d in x.get("deps", []) if d in names])
+                    for x in stages)
+
+        forced = PIPELINE_STAGES[PIPELINE_STAGES.index(self.force_from):] \
+            if self.force_from else []
+
+        run = set()
+        for stage in stages:
+            if not self.resume or stage.get("task", stage["name"]) in forced \
+                    or run.intersection(deps[stage["name"]]) \
+                    or not self._current(stage):
+                run.add(stage["name"])
+
+        # Stages whose temporary outputs are used by an executed stage, but
+        # no longer match, are executed again along with the stages that
+        # depend on them
+        temp = dict((x["name"], [abspath(y) for y in x.get("temp", [])])
+                    for x in stages)
+        changed = True
+        while changed:
+            changed = False
+            for name in names:
+                if name in run:
+                    continue
+                if run.intersection(deps[name]) or any(
+                        not self.temp_current(path, names)
+                        for x in run if name in deps[x] for path in
+                        set(temp[x]).intersection(temp[name])):
+                    run.add(name)
+                    changed = True
+
+        self.run = run
+
+        return [x for x in names if x in run]
+
+    def should_run(self, name):
+
+        return self.run is None or name in self.run
 
-    print_col("Dumping groups", GREEN, 1)
+    def _save(self):
 
-    # Create a results directory
-    results_dir = join(dest, "Orthology_results")
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
 
-    mcl_output = join(dest, "backstage_files", "mclOutput_")
+        with open(self.path, "w") as fh:
+            json.dump(self.records, fh, indent=1, sort_keys=True)
 
-    if nm:
-        if nm.stop:
-            raise KillByUser("")
-        nm.total = len(inflation_list)
-        nm.counter = 0
+    def begin(self, stage):
+        """
+        Removes the record of a stage before it is executed, so that it is
+        not considered complete if the execution is interrupted.
+        """
+
+        with self.lock:
+            if self.records.pop(stage["name"], None) is not None:
+                self._save()
+
+    def done(self, stage):
+        """
+        Records a completed stage.
+        """
+
+        rec = {"params": self._normalize(stage.get("params"))}
+        for field in ("inputs", "outputs", "temp"):
+            rec[field] = dict((abspath(x), self.fingerprint(abspath(x)))
+                              for x in stage.get(field, []))
+
+        with self.lock:
+            self.records[stage["name"]] = rec
+            self._save()
 
-    for val in inflation_list:
+
+def run_checkpoint(manifest, stage, func):
+    """
+    Executes `func` for a stage, unless the stage is skipped by the
+    manifest, in which case None is returned.
+    """
+
+    if manifest is None or stage is None:
+        return func()
+
+    if not manifest.should_run(stage["name"]):
+        print_col("Skipping stage {} (unchanged since last run)".format(
+            stage["name"]), GREEN, 1)
+        return None
+
+    manifest.begin(stage)
+    res = func()
+    manifest.done(stage)
+
+    return res
+
+
+def run_stages(stages, manifest=None, nm=None):
+    """
+    Executes the stages returned by `search_stages` in order. When `nm`
+    is provided, nm.task and nm.finished_tasks are updated with the stage
+    names.
+    """
+
+    for stage in stages:
 
         if nm:
             if nm.stop:
                 raise KillByUser("")
-            nm.counter += 1
+            nm.task = stage["name"]
 
-        MclGroups.mcl_to_groups(
-            mcl_prefix,
-            start_id,
-            mcl_output + val.replace(".", ""),
-            os.path.join(results_dir, group_file + "_" + str(val) + ".txt"),
-            nm=nm)
+        run_checkpoint(manifest, stage, stage["func"])
 
+        if nm:
+            nm.finished_tasks = nm.finished_tasks + [stage["name"]]
 
-def export_filtered_groups(inflation_list, group_prefix, gene_t, sp_t, sqldb,
-                           db, tmp_dir, dest, nm=None):
 
-    print_col("Exporting filtered groups to protein sequence files", GREEN, 1)
+def search_stages(proteome_files, min_len, max_stop, db, evalue, cpus,
+                  usearch_outfile, usearch_bin, db_dir, dest, nm=None,
+                  adjust=True, adjust_cpus=1, stream=False,
+                  pairs_engine="auto"):
+    """
+    Returns the stages of the orthology search until the dump of the
+    pairs files, in order of execution (see `PipelineManifest`). Each
+    stage also contains the function that executes it (`func`). The
+    arguments are the same of the functions of each stage. If `adjust`
+    is False, the proteome files are not adjusted. If `stream` is True,
+    the search output is parsed while it is written (see
+    `stream_usearch`), and the parse stage is performed by the usearch
+    stage. `pairs_engine` is the engine of the pairs stage (see
+    `orthomclPairs.execute`), which is not a parameter of the stage
+    since both engines produce the same pairs.
+    """
 
-    stats_storage = {}
-    groups_obj = OT.MultiGroupsLight(tmp_dir)
+    bs_dir = join(dest, "backstage_files")
+    cf_dir = join(bs_dir, "compliantFasta")
+    sqlite_db = join(db_dir, "orthoDB.db")
+
+    stages = [
+        {"name": "schema",
+         "temp": [sqlite_db],
+         "func": partial(install_schema, db_dir)},
+        {"name": "adjust",
+         "params": {"proteomes": sorted(proteome_files)},
+         "inputs": proteome_files,
+         "outputs": [cf_dir],
+         "func": partial(adjust_fasta, proteome_files, dest, nm=nm,
+                         cpus=adjust_cpus)},
+        {"name": "filter",
+         "deps": ["adjust"],
+         "params": {"min_length": min_len, "max_stop": max_stop},
+         "inputs": [cf_dir],
+         "outputs": [join(bs_dir, db)],
+         "func": partial(filter_fasta, min_len, max_stop, db, dest, nm=nm)},
+        {"name": "usearch",
+         "deps": ["filter"],
+         "params": {"evalue": evalue},
+         "inputs": [join(bs_dir, db)],
+         "outputs": [join(bs_dir, usearch_outfile)],
+         "func": partial(allvsall_usearch, db, evalue, dest, cpus,
+                         usearch_outfile, usearch_bin=usearch_bin, nm=nm)},
+        {"name": "parse",
+         "deps": ["schema", "usearch"],
+         "inputs": [join(bs_dir, usearch_outfile), cf_dir],
+         "temp": [sqlite_db],
+         "func": partial(blast_parser, usearch_outfile, dest, db_dir, nm)},
+        {"name": "pairs",
+         "deps": ["parse"],
+         "outputs": [join(bs_dir, x) for x in ["mclInput", "orthologs.txt",
+                                                "inparalogs.txt",
+                                                "coorthologs.txt"]],
+         "temp": [sqlite_db],
+         "func": partial(find_pairs, db_dir, dest, nm=nm,
+                         engine=pairs_engine)}]
+
+    if not adjust:
+        stages = [x for x in stages if x["name"] != "adjust"]
+
+    if stream:
+        search, parse = [x for x in stages
+                         if x["name"] in ["usearch", "parse"]]
+        search["deps"] += parse["deps"][:1]
+        search["inputs"] += parse["inputs"][1:]
+        search["temp"] = parse["temp"]
+        search["func"] = partial(stream_usearch, db, evalue, dest, cpus,
+                                 usearch_outfile, db_dir,
+                                 usearch_bin=usearch_bin, nm=nm)
+        stages[-1]["deps"] = ["usearch"]
+        stages.remove(parse)
+
+    return stages
+
+
+def inflation_stages(inflation_list, mcl_prefix, start_id, group_prefix,
+                     gene_t, sp_t, db, dest, mcl_file="mcl"):
+    """
+    Returns a dictionary with the mcl, dump and filter_groups stages of
+    each inflation value (see `PipelineManifest`). The arguments are the
+    same of `inflation_search`.
+    """
 
-    if nm:
-        if nm.stop:
-            raise KillByUser("")
+    mcl_input = join(dest, "backstage_files", "mclInput")
+    stages = {}
 
     for val in inflation_list:
-        # Create a directory that will store the results for the current
-        # inflation value
-        inflation_dir = join(dest, "Orthology_results", "Inflation%s" % val)
-        if not os.path.exists(inflation_dir):
-            os.makedirs(inflation_dir)
 
+        mcl_output = join(dest, "backstage_files",
+                          "mclOutput_" + val.replace(".", ""))
         group_file = join(dest, "Orthology_results",
                           group_prefix + "_%s.txt" % val)
 
-        # Create Group object
-        group_obj = OT.GroupLight(group_file, gene_t, sp_t)
-        # Add group to the MultiGroups object
-        groups_obj.add_group(group_obj)
-        # Export filtered groups and return stats to present in the app
-        stats = group_obj.basic_group_statistics()
-        # Retrieve fasta sequences from the filtered groups
+        stages[val] = [
+            {"name": "mcl_" + val,
+             "task": "mcl",
+             "deps": ["pairs"],
+             "params": {"inflation": val, "mcl": mcl_file},
+             "inputs": [mcl_input],
+             "outputs": [mcl_output]},
+            {"name": "dump_" + val,
+             "task": "dump",
+             "deps": ["mcl_" + val],
+             "params": {"prefix": mcl_prefix, "start_id": start_id},
+             "inputs": [mcl_output],
+             "outputs": [group_file]},
+            {"name": "filter_groups_" + val,
+             "task": "filter_groups",
+             "deps": ["dump_" + val, "filter"],
+             "params": {"gene_threshold": gene_t, "sp_threshold": sp_t},
+             "inputs": [group_file, db],
+             "outputs": [join(dest, "Orthology_results",
+                              "Inflation%s" % val)]}]
+
+    return stages
+
+
+def add_proteomes(proteome_files, min_len, max_stop, db, evalue, cpus,
+                  usearch_outfile, usearch_bin, db_dir, dest, nm=None,
+                  manifest=None, pairs_engine="auto"):
+    """
+    Adds proteome files to the orthology search previously performed into
+    `dest`.
+
+    Only the new proteomes are adjusted and filtered, and only the
+    comparisons that involve new proteins are searched (see
+    `incremental_usearch`). The new hits are added to the search output
+    and, if the database of the previous search is unchanged, also to its
+    SimilarSequences table. Otherwise, the database is created again from
+    the complete search output, without repeating the search. The pairs
+    are then found again for all sequences, since the normalization of
+    their scores depends on all hits.
+
+    The database can only be checked if a `manifest` of the previous
+    search is provided, in which case the search stages are also recorded
+    as completed with the previous and new proteomes. The remaining
+    arguments are the same of `search_stages`.
+    """
+
+    bs_dir = join(dest, "backstage_files")
+    cf_dir = join(bs_dir, "compliantFasta")
+    sqlite_db = join(db_dir, "orthoDB.db")
+
+    if not all(os.path.exists(x) for x in [cf_dir, join(bs_dir, db),
+                                           join(bs_dir, usearch_outfile)]):
+        raise NoPreviousSearch("No previous orthology search was found in "
+                               "{}".format(dest))
+
+    codes = [proteome_code(x) for x in proteome_files]
+    duplicates = [x for i, x in enumerate(codes) if x in codes[:i] or
+                  os.path.exists(join(cf_dir, x + ".fasta"))]
+    if duplicates:
+        raise DuplicateProteome("The proteomes {} are already present in "
+                                "the search".format(", ".join(duplicates)))
+
+    # Checked before any file of the previous search is modified
+    append = manifest is not None and manifest.temp_current(sqlite_db)
+
+    new_db = db + "_new"
+    new_hits = usearch_outfile + "_new"
+
+    try:
+        adjust_fasta(proteome_files, dest, nm=nm, cpus=cpus, append=True)
+
+        print_col("Filtering new proteome files", GREEN, 1)
+
+        if os.path.exists(join(bs_dir, new_db)):
+            os.remove(join(bs_dir, new_db))
+
+        FilterFasta.orthomcl_filter_fasta(
+            cf_dir, min_len, max_stop, new_db, dest, nm,
+            files=[x + ".fasta" for x in codes
+                   if os.path.exists(join(cf_dir, x + ".fasta"))],
+            append=True)
+
+        incremental_usearch(db, new_db, evalue, dest, cpus, new_hits,
+                            usearch_bin=usearch_bin, nm=nm)
+
+    except BaseException:
+        # The previous search is left unchanged, so that the proteomes can
+        # be added again
+        for f in [join(cf_dir, x + ".fasta") for x in codes] + \
+                [join(bs_dir, new_db)]:
+            if os.path.exists(f):
+                os.remove(f)
+        raise
+
+    with open(join(bs_dir, usearch_outfile), "a") as fh, \
+            open(join(bs_dir, new_hits)) as new_fh:
+        shutil.copyfileobj(new_fh, fh)
+
+    if append:
+        blast_parser(new_hits, dest, db_dir, nm, append=True)
+    else:
+        print_col("The database of the previous search is not available. "
+                  "Parsing the complete search output", YELLOW, 1)
+        install_schema(db_dir)
+        blast_parser(usearch_outfile, dest, db_dir, nm)
+
+    for f in [new_db, new_hits]:
+        os.remove(join(bs_dir, f))
+
+    find_pairs(db_dir, dest, nm=nm, engine=pairs_engine)
+
+    if manifest:
+        previous = manifest.records.get("adjust", {}).get(
+            "params", {}).get("proteomes", [])
+        for stage in search_stages(previous + proteome_files, min_len,
+                                   max_stop, db, evalue, cpus,
+                                   usearch_outfile, usearch_bin, db_dir,
+                                   dest):
+            manifest.done(stage)
+
+
+# Default number of inflation values processed at the same time. Each one
+# runs its own mcl process, which may take as much memory as the graph, so
+# only a few are run concurrently unless more are requested
+INFLATION_JOBS = 2
+
+
+class _JobNamespace(object):
+    """
+    Namespace given to each inflation job. The kill switch is read from the
+    shared Namespace of TriFusion, while the progress attributes set by
+    each job are kept local, so that concurrent jobs do not overwrite each
+    other.
+    """
+
+    def __init__(self, nm, runner):
+        self._nm = nm
+        self._runner = runner
+
+    @property
+    def stop(self):
+        return self._runner.stopped or bool(self._nm and self._nm.stop)
+
+    def register(self, subp):
+        self._runner.register(subp)
+
+    def unregister(self, subp):
+        self._runner.unregister(subp)
+
+
+class InflationJobs(object):
+    """
+    Runs the stages that are performed for each inflation value (mcl,
+    group dumping and group filtering/export) as concurrent jobs.
+
+    Each job executes the `steps` for a single inflation value in order,
+    so that the stages of different inflation values overlap. At most
+    `jobs` inflation values (INFLATION_JOBS by default) are processed at
+    the same time, and all jobs are stopped as soon as one of them fails.
+    When `tasks`
+    is provided, it should contain the name of the task of each step,
+    and nm.task and nm.finished_tasks are updated as the stages are
+    completed for all inflation values, as in the serial execution.
+    When a `manifest` is provided, `stages` should contain the stage of
+    each step for every inflation value (see `inflation_stages`), and the
+    steps are checkpointed with `run_checkpoint`. The result of skipped
+    steps is None.
+    """
+
+    def __init__(self, inflation_list, steps, nm=None, jobs=None,
+                 tasks=None, manifest=None, stages=None):
+
+        self.inflation_list = inflation_list
+        self.steps = steps
+        self.nm = nm
+        self.tasks = tasks
+        self.manifest = manifest
+        self.stages = stages
+
+        if not jobs:
+            jobs = INFLATION_JOBS
+        self.jobs = max(1, min(int(jobs), len(inflation_list)))
+
+        # Number of completed steps for each inflation value
+        self.completed = dict((val, 0) for val in inflation_list)
+        self.stopped = False
+        self.procs = []
+        self.lock = threading.Lock()
+
+    def register(self, subp):
+
+        with self.lock:
+            self.procs.append(subp)
+            self._update_subp()
+
+    def unregister(self, subp):
+
+        with self.lock:
+            self.procs.remove(subp)
+            self._update_subp()
+
+    def _update_subp(self):
+
+        # The subprocess.Popen handler cannot be passed directly in Windows
+        # due to pickling issues. So the pids of the processes are passed
+        if self.nm:
+            self.nm.subp = [x.pid for x in self.procs] or None
+
+    def _job(self, val):
+
+        job_nm = _JobNamespace(self.nm, self)
+        results = []
+
+        for i, step in enumerate(self.steps):
+
+            if job_nm.stop:
+                raise KillByUser("")
+
+            stage = self.stages[val][i] if self.stages else None
+            results.append(run_checkpoint(
+                self.manifest, stage,
+                partial(step, val, job_nm if self.nm else None)))
+
+            with self.lock:
+                self.completed[val] += 1
+
+        return results
+
+    def _update_progress(self, finished):
+
+        done = min(self.completed.values())
+
+        if self.tasks:
+            for task in self.tasks[:done]:
+                if task not in finished:
+                    finished.append(task)
+                    self.nm.finished_tasks = self.nm.finished_tasks + [task]
+            self.nm.task = self.tasks[min(done, len(self.tasks) - 1)]
+
+        self.nm.counter = sum(self.completed.values())
+
+    def run(self):
+        """
+        Runs the jobs and returns a dictionary with the list of step results
+        for each inflation value.
+        """
+
+        if not self.inflation_list:
+            return {}
+
+        if self.nm:
+            if self.nm.stop:
+                raise KillByUser("")
+            self.nm.total = len(self.inflation_list) * len(self.steps)
+            self.nm.counter = 0
+
+        pool = ThreadPool(self.jobs)
+        results = dict((val, pool.apply_async(self._job, (val,)))
+                       for val in self.inflation_list)
+        pool.close()
+
+        finished = []
+
+        try:
+            while not all(x.ready() for x in results.values()):
+
+                # Re-raises the error of the first failed job
+                for res in results.values():
+                    if res.ready() and not res.successful():
+                        res.get()
+
+                if self.nm:
+                    if self.nm.stop:
+                        raise KillByUser("")
+                    self._update_progress(finished)
+
+                time.sleep(.1)
+
+            results = dict((val, res.get()) for val, res in results.items())
+
+            if self.nm:
+                self._update_progress(finished)
+
+        except BaseException:
+            # Stop the remaining jobs and their external processes
+            self.stopped = True
+            with self.lock:
+                for subp in self.procs:
+                    subp.terminate()
+            raise
+
+        finally:
+            pool.join()
+
+        return results
+
+
+def _mcl_step(val, nm, dest, mcl_file, graph=None):
+
+    mcl_output = join(dest, "backstage_files", "mclOutput_" +
+                      val.replace(".", ""))
+
+    # Use the built-in engine on the graph that was loaded for all
+    # inflation values
+    if graph is not None:
+        graph.write_clusters(float(val), mcl_output, ns=nm)
+        return
+
+    mcl_cmd = [mcl_file,
+               join(dest, "backstage_files", "mclInput"),
+               "--abc",
+               "-I",
+               val,
+               "-o",
+               mcl_output]
+
+    subp = subprocess.Popen(mcl_cmd)
+    if nm:
+        nm.register(subp)
+    subp.wait()
+    if nm:
+        nm.unregister(subp)
+
+
+def _mcl_groups_step(val, nm, dest, mcl_prefix, start_id, group_file):
+
+    MclGroups.mcl_to_groups(
+        mcl_prefix,
+        start_id,
+        join(dest, "backstage_files", "mclOutput_" + val.replace(".", "")),
+        join(dest, "Orthology_results", group_file + "_" + str(val) + ".txt"),
+        nm=nm)
+
+
+# Serializes the sequence retrieval of concurrent jobs, which share the
+# sqlite database with the protein sequences
+_retrieve_lock = threading.Lock()
+
+
+def _export_step(val, nm, dest, group_prefix, gene_t, sp_t, sqldb, db,
+                 retrieve=True):
+
+    # Create a directory that will store the results for the current
+    # inflation value
+    inflation_dir = join(dest, "Orthology_results", "Inflation%s" % val)
+    if not os.path.exists(inflation_dir):
+        os.makedirs(inflation_dir)
+
+    group_file = join(dest, "Orthology_results",
+                      group_prefix + "_%s.txt" % val)
+
+    # Create Group object
+    group_obj = OT.GroupLight(group_file, gene_t, sp_t)
+    # Export filtered groups and return stats to present in the app
+    stats = group_obj.basic_group_statistics()
+
+    if not retrieve:
+        return stats, group_obj
+
+    # Retrieve fasta sequences from the filtered groups
+    with _retrieve_lock:
         group_obj.retrieve_sequences(sqldb, db,
                                      dest=join(inflation_dir, "Orthologs"),
                                      shared_namespace=nm)
-        # os.remove(sqldb)
+
+    return stats, group_obj
+
+
+def _create_results_dir(dest):
+
+    results_dir = join(dest, "Orthology_results")
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+
+
+def _collect_groups(inflation_list, results, tmp_dir):
+
+    stats_storage = {}
+    groups_obj = OT.MultiGroupsLight(tmp_dir)
+
+    # Groups are added in the order of the inflation values
+    for val in inflation_list:
+        stats, group_obj = results[val][-1]
+        groups_obj.add_group(group_obj)
         stats_storage[val] = stats
 
     return stats_storage, groups_obj
 
 
+def _load_graph(dest, mcl_file):
+    """
+    Loads the mclInput graph for the built-in MCL engine, which is used
+    when no mcl executable is provided.
+    """
+
+    if mcl_file:
+        return None
+
+    return MarkovClustering(join(dest, "backstage_files", "mclInput"))
+
+
+def mcl(inflation_list, dest, mcl_file="mcl", nm=None, jobs=None):
+    """
+    Runs mcl for each inflation value. If `mcl_file` is None, the built-in
+    MCL engine is used instead of the mcl executable.
+    """
+
+    print_col("Running mcl algorithm", GREEN, 1)
+
+    graph = _load_graph(dest, mcl_file)
+
+    InflationJobs(inflation_list,
+                  [partial(_mcl_step, dest=dest, mcl_file=mcl_file,
+                           graph=graph)],
+                  nm=nm, jobs=jobs).run()
+
+
+def mcl_groups(inflation_list, mcl_prefix, start_id, group_file, dest,
+               nm=None, jobs=None):
+
+    print_col("Dumping groups", GREEN, 1)
+
+    _create_results_dir(dest)
+
+    InflationJobs(inflation_list,
+                  [partial(_mcl_groups_step, dest=dest, mcl_prefix=mcl_prefix,
+                           start_id=start_id, group_file=group_file)],
+                  nm=nm, jobs=jobs).run()
+
+
+def export_filtered_groups(inflation_list, group_prefix, gene_t, sp_t, sqldb,
+                           db, tmp_dir, dest, nm=None, jobs=None):
+
+    print_col("Exporting filtered groups to protein sequence files", GREEN, 1)
+
+    results = InflationJobs(
+        inflation_list,
+        [partial(_export_step, dest=dest, group_prefix=group_prefix,
+                 gene_t=gene_t, sp_t=sp_t, sqldb=sqldb, db=db)],
+        nm=nm, jobs=jobs).run()
+
+    return _collect_groups(inflation_list, results, tmp_dir)
+
+
+def inflation_search(inflation_list, mcl_prefix, start_id, group_prefix,
+                     gene_t, sp_t, sqldb, db, tmp_dir, dest, mcl_file="mcl",
+                     nm=None, jobs=None, tasks=None, manifest=None):
+    """
+    Runs the mcl, group dumping and group export stages for each inflation
+    value as a single job, so that the stages of different inflation values
+    run concurrently. The arguments are the same of the `mcl`, `mcl_groups`
+    and `export_filtered_groups` functions. If `mcl_file` is None, the
+    built-in MCL engine is used. `tasks` may contain the names
+    of the three stages, which are then set in nm.task and
+    nm.finished_tasks as they are completed for all inflation values.
+    If a `PipelineManifest` is provided, the stages that are unchanged
+    since the last run are skipped. The statistics of skipped group
+    exports are still retrieved from the group files.
+
+    :return: tuple, with the group statistics for each inflation value and
+    the MultiGroupsLight object
+    """
+
+    print_col("Running mcl algorithm, dumping and exporting groups", GREEN, 1)
+
+    _create_results_dir(dest)
+
+    stages = inflation_stages(inflation_list, mcl_prefix, start_id,
+                              group_prefix, gene_t, sp_t, db, dest,
+                              mcl_file=mcl_file) if manifest else None
+
+    # The graph is only loaded if mcl is executed for some inflation value
+    graph = None
+    if not manifest or any(manifest.should_run(x[0]["name"])
+                           for x in stages.values()):
+        graph = _load_graph(dest, mcl_file)
+
+    export = partial(_export_step, dest=dest, group_prefix=group_prefix,
+                     gene_t=gene_t, sp_t=sp_t, sqldb=sqldb, db=db)
+
+    steps = [
+        partial(_mcl_step, dest=dest, mcl_file=mcl_file, graph=graph),
+        partial(_mcl_groups_step, dest=dest, mcl_prefix=mcl_prefix,
+                start_id=start_id, group_file=group_prefix),
+        export]
+
+    results = InflationJobs(inflation_list, steps, nm=nm, jobs=jobs,
+                            tasks=tasks, manifest=manifest,
+                            stages=stages).run()
+
+    for val in inflation_list:
+        if results[val][-1] is None:
+            results[val][-1] = export(val, None, retrieve=False)
+
+    return _collect_groups(inflation_list, results, tmp_dir)
+
+
 def check_bin_path(bin_path, program):
 
     prog = {"usearch": "usearch",
@@ -437,6 +1428,12 @@ def main():
                             dest="no_adjust",
                             help="Complete run of the pipeline without "
                                  "adjusting fasta files")
+    exec_modes.add_argument("-add", action="store_const", const=True,
+                            dest="add",
+                            help="Add the proteome files to the search "
+                                 "previously performed into the output "
+                                 "directory. Only the comparisons that "
+                                 "involve the new proteins are searched")
 
     # Input formatting
     input_format = parser.add_argument_group("Input formatting")
@@ -464,6 +1461,24 @@ def main():
                                   "PATH environment variable, specify only"
                                   " the name of the executable (default is "
                                   "'%(default)s')")
+    search_opts.add_argument("--builtin-mcl", action="store_const",
+                             const=True, dest="builtin_mcl",
+                             help="Use the built-in MCL implementation "
+                                  "instead of the MCL executable")
+    search_opts.add_argument("--stream-search", action="store_const",
+                             const=True, dest="stream_search",
+                             help="Parse the output of the USEARCH "
+                                  "All-vs-All while it is being written, "
+                                  "instead of waiting for the search to "
+                                  "finish")
+    search_opts.add_argument("--pairs-engine", dest="pairs_engine",
+                             choices=["auto", "sql"], default="auto",
+                             help="Engine used to find the ortholog pairs. "
+                                  "'sql' runs the queries in the sqlite "
+                                  "database, while 'auto' loads the hits "
+                                  "into memory when they fit in half of the "
+                                  "available memory and uses 'sql' "
+                                  "otherwise (default is '%(default)s')")
     search_opts.add_argument("--min-length", dest="min_length", type=int,
                              default=10, help="Set minimum length allowed "
                              "for protein sequences (default is '%(default)s')")
@@ -518,8 +1533,28 @@ def main():
     # Miscellaneous options
     misc_options = parser.add_argument_group("Miscellaneous options")
     misc_options.add_argument("-np", dest="cpus", default=1, help="Number of "
-                              "CPUs to be used during search operation ("
-                              "default is '%(default)s')")
+                              "CPUs to be used during proteome adjustment "
+                              "and search operation (default is "
+                              "'%(default)s')")
+    misc_options.add_argument("--inflation-jobs", dest="inflation_jobs",
+                              type=int, default=INFLATION_JOBS,
+                              help="Maximum number of inflation values that "
+                              "are clustered and exported concurrently "
+                              "(default is '%(default)s')")
+    misc_options.add_argument("--resume", action="store_const", const=True,
+                              dest="resume", help="Skip the stages that "
+                              "were completed in a previous run into the "
+                              "same output directory and whose parameters "
+                              "and input files are unchanged. The sqlite "
+                              "database of the search (orthoDB.db), which "
+                              "can take several GB, is only kept in the "
+                              "backstage_files directory of the output "
+                              "directory when this option is provided, so "
+                              "that later runs can reuse it")
+    misc_options.add_argument("--force-from", dest="force_from",
+                              choices=PIPELINE_STAGES, help="Resume the "
+                              "pipeline, but execute the provided stage and "
+                              "all subsequent stages")
 
     if len(sys.argv) == 1:
         parser.print_help()
@@ -561,7 +1596,10 @@ def main():
         # Check USEARCH bin
         check_bin_path(usearch_bin, "usearch")
         # Check MCL bin
-        check_bin_path(mcl_bin, "mcl")
+        if arg.builtin_mcl:
+            mcl_bin = None
+        else:
+            check_bin_path(mcl_bin, "mcl")
 
         sql_path = join(tmp_dir, "sqldb.db")
 
@@ -584,43 +1622,65 @@ def main():
         if not os.path.exists(int_dir):
             os.makedirs(int_dir)
 
-        if arg.normal:
-            install_schema(tmp_dir)
-            adjust_fasta(proteome_files, output_dir)
-            filter_fasta(min_length, max_percent_stop, database_name,
-                         output_dir)
-            allvsall_usearch(database_name, evalue_cutoff, output_dir, cpus,
-                             usearch_out_name, usearch_bin=usearch_bin)
-            blast_parser(usearch_out_name, output_dir, tmp_dir, None)
-            pairs(tmp_dir)
-            dump_pairs(tmp_dir, output_dir)
-            mcl(inflation, output_dir, mcl_file=mcl_bin)
-            mcl_groups(inflation, prefix, start_id, groups_file, output_dir)
-            export_filtered_groups(inflation, groups_file, max_gn, min_sp,
-                                   sql_path, database_name, tmp_dir,
-                                   output_dir)
+        # The sqlite database is kept with the intermediate files, so that
+        # it can be reused when resuming or adding proteomes. Without
+        # --resume it is removed at the end of the run
+        db_dir = int_dir
+
+        # Stages completed in previous runs are recorded in the manifest and
+        # skipped when resuming
+        manifest = PipelineManifest(output_dir, resume=arg.resume,
+                                    force_from=arg.force_from)
+
+        stages = search_stages(proteome_files, min_length, max_percent_stop,
+                               database_name, evalue_cutoff, cpus,
+                               usearch_out_name, usearch_bin, db_dir,
+                               output_dir, adjust=not arg.no_adjust,
+                               adjust_cpus=cpus, stream=arg.stream_search,
+                               pairs_engine=arg.pairs_engine)
+
+        if arg.normal or arg.no_adjust:
+            inf_stages = inflation_stages(inflation, prefix, start_id,
+                                          groups_file, max_gn, min_sp,
+                                          database_name, output_dir,
+                                          mcl_file=mcl_bin)
+            manifest.plan(stages + [x for val in inflation
+                                    for x in inf_stages[val]])
+
+            run_stages(stages, manifest)
+            inflation_search(inflation, prefix, start_id, groups_file,
+                             max_gn, min_sp, sql_path, database_name,
+                             tmp_dir, output_dir, mcl_file=mcl_bin,
+                             jobs=arg.inflation_jobs, manifest=manifest)
 
         elif arg.adjust:
-            adjust_fasta(proteome_files, output_dir)
-
-        elif arg.no_adjust:
-            install_schema(tmp_dir)
-            filter_fasta(min_length, max_percent_stop, database_name,
-                         output_dir)
-            allvsall_usearch(database_name, evalue_cutoff, output_dir, cpus,
-                             usearch_out_name, usearch_bin=usearch_bin)
-            blast_parser(usearch_out_name, output_dir, tmp_dir, None)
-            pairs(tmp_dir)
-            dump_pairs(tmp_dir, output_dir)
-            mcl(inflation, output_dir, mcl_file=mcl_bin)
-            mcl_groups(inflation, prefix, start_id, groups_file, output_dir)
-            export_filtered_groups(inflation, groups_file, max_gn, min_sp,
-                                   sql_path, database_name, tmp_dir,
-                                   output_dir)
+            stages = [x for x in stages if x["name"] == "adjust"]
+            manifest.plan(stages)
+            run_stages(stages, manifest)
+
+        elif arg.add:
+            add_proteomes(proteome_files, min_length, max_percent_stop,
+                          database_name, evalue_cutoff, cpus,
+                          usearch_out_name, usearch_bin, db_dir, output_dir,
+                          manifest=manifest, pairs_engine=arg.pairs_engine)
+            inf_stages = inflation_stages(inflation, prefix, start_id,
+                                          groups_file, max_gn, min_sp,
+                                          database_name, output_dir,
+                                          mcl_file=mcl_bin)
+            manifest.plan([x for val in inflation for x in inf_stages[val]])
+            inflation_search(inflation, prefix, start_id, groups_file,
+                             max_gn, min_sp, sql_path, database_name,
+                             tmp_dir, output_dir, mcl_file=mcl_bin,
+                             jobs=arg.inflation_jobs, manifest=manifest)
 
         print_col("OrthoMCL pipeline execution successfully completed in %s "
                   "seconds" % (round(time.time() - start_time, 2)), GREEN, 1)
 
+        # Proteomes can still be added without the database, whose
+        # SimilarSequences table is then created again from the search output
+        if not arg.resume and os.path.exists(join(db_dir, "orthoDB.db")):
+            os.remove(join(db_dir, "orthoDB.db"))
+
         if os.path.exists(tmp_dir):
             shutil.rmtree(tmp_dir)
     except Exception as e:
@@ -76,6 +76,13 @@ iupac_conv = {"v": "acg", "r": "ag", "m": "ac", "s": "cg", "d": "agt",
               "b": "cgt", "n": "acgt", "h": "act", "y": "ct", "w": "at",
               "k": "gt", "a": "aa", "t": "tt", "c": "cc", "g": "gg"}
 
+# 4-bit encoding of nucleotides and IUPAC ambiguity codes, where each bit
+# corresponds to one nucleotide (a=1, c=2, g=4, t=8). The code of a set of
+# nucleotides is the bitwise OR of their individual codes
+iupac_bits = dict([("a", 1), ("c", 2), ("g", 4), ("t", 8)] +
+                  [(k, sum(1 << "acgt".index(x) for x in v))
+                   for k, v in iupac_rev.items()])
+
 
 class CleanUp(object):
     """Decorator class that handles temporary data for TriSeq and TriStats.
@@ -283,8 +290,11 @@ class Base(object):
         
         Parameters
         ----------
-        reference_file : str
-            Path to sequence file
+        reference_file : str or file
+            Path to sequence file or an open file handle. If a file handle
+            is provided, it is rewound to the beginning of the file after
+            detection and left open, so that it can be handed to the
+            alignment parser without opening and reading the file again.
         
         Returns
         -------
@@ -300,7 +310,44 @@ class Base(object):
         
         """
 
-        file_handle = open(reference_file, "r")
+        if isinstance(reference_file, basestring):
+            file_handle = open(reference_file, "r")
+        else:
+            file_handle = reference_file
+
+        try:
+            return self._sniff_file(file_handle)
+        finally:
+            if file_handle is reference_file:
+                file_handle.seek(0)
+            else:
+                file_handle.close()
+
+    def _sniff_file(self, file_handle):
+        """Detects format and sequence type from an open file handle.
+
+        Reads `file_handle` only until the first sequence is found. This
+        method is only called from `autofinder`, which handles the opening
+        and rewinding of the file.
+
+        Parameters
+        ----------
+        file_handle : file
+            File handle of the sequence file, positioned at the beginning
+            of the file.
+
+        Returns
+        -------
+        fmt : str
+            File format of `reference_file`
+        code : tuple
+            The sequence type as string in first element and missing data
+            symbol as string in the second element
+
+        See Also
+        --------
+        autofinder
+        """
 
         # Set to True when the format has been detected
         format_found = False
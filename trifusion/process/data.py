@@ -215,6 +215,41 @@ class Partitions(object):
 
         self.partition_format = None
 
+        self._index = None
+        """
+        Interval index of the ranges in `partitions`, built on demand by
+        `_get_index`. It stores the sorted start positions of all ranges
+        (non contiguous partitions contribute one range per segment), the
+        corresponding (end, name) tuples and a mapping of end positions to
+        the names of contiguous partitions. It is reset when `partitions`
+        is replaced, and methods that modify `partitions` in place must
+        either update the index or reset it to None. The index is not part
+        of the stored state of the object (see `__getstate__`).
+        """
+
+    @property
+    def partitions(self):
+
+        return self._partitions
+
+    @partitions.setter
+    def partitions(self, partitions):
+
+        self._partitions = partitions
+        self._index = None
+
+    def __getstate__(self):
+        """Returns the state of the object, without the interval index.
+
+        Returns
+        -------
+        state : dict
+            Copy of `__dict__` without the `_index` attribute.
+        """
+
+        return dict((k, v) for k, v in self.__dict__.items()
+                    if k != "_index")
+
     def __iter__(self):
         """Iterator behavior for `Partitions`.
 
@@ -590,6 +625,68 @@ class Partitions(object):
 
         return True
 
+    def _get_index(self):
+        """Returns the interval index of the `partitions` ranges.
+
+        The index (see the `_index` attribute) is built when it does not
+        exist.
+
+        Returns
+        -------
+        index : list
+            List with the sorted start positions, the corresponding
+            (end, name) tuples and the mapping of end positions to
+            partition names.
+        """
+
+        index = getattr(self, "_index", None)
+
+        if index:
+            return index
+
+        segments = []
+        ends = {}
+
+        for name, vals in self.partitions.items():
+            lrange = vals[0]
+            if isinstance(lrange[0], int):
+                segments.append((lrange[0], lrange[1], name))
+                ends.setdefault(lrange[1], name)
+            else:
+                segments.extend((st, en, name) for st, en in lrange)
+
+        segments.sort()
+
+        self._index = [[x[0] for x in segments],
+                       [(x[1], x[2]) for x in segments],
+                       ends]
+
+        return self._index
+
+    def _add_to_index(self, name):
+        """Adds a new contiguous partition to the interval index.
+
+        The index is only updated when it already exists and the new
+        partition starts after all indexed ranges, which is the case when
+        partitions are added sequentially. Otherwise, the index is reset
+        and rebuilt when it is next required.
+
+        Parameters
+        ----------
+        name : str
+            Name of the partition, already in `partitions`.
+        """
+
+        index = getattr(self, "_index", None)
+        st, en = self.partitions[name][0]
+
+        if index and (not index[0] or st > index[0][-1]):
+            index[0].append(st)
+            index[1].append((en, name))
+            index[2].setdefault(en, name)
+        else:
+            self._index = None
+
     def _find_parent(self, max_range):
         """Finds the parent partition from a specified range.
 
@@ -606,10 +703,7 @@ class Partitions(object):
             The name of the parent partition, from the `partitions` attribute.
         """
 
-        for part, vals in self.partitions.items():
-            lrange = vals[0]
-            if lrange[1] == max_range:
-                return part
+        return self._get_index()[2].get(max_range)
 
     def add_partition(self, name, length=None, locus_range=None, codon=False,
                       use_counter=False, file_name=None, model_cls=None,
@@ -657,6 +751,9 @@ class Partitions(object):
 
         """
 
+        # Partitions that replace an existing name invalidate the index
+        replaced = name in self.partitions
+
         # Check for duplicate names in partitions
         if name in self.partitions:
             if auto_correct_name:
@@ -705,6 +802,10 @@ class Partitions(object):
 
             self.partitions[name] = [(self.counter,
                                       self.counter + (length - 1)), codon]
+            if replaced:
+                self._index = None
+            else:
+                self._add_to_index(name)
             self.counter += length
             self.partition_length += length
 
@@ -797,6 +898,10 @@ class Partitions(object):
 
                 self.partitions[name] = [(locus_range[0], locus_range[1]),
                                          codon]
+                if replaced:
+                    self._index = None
+                else:
+                    self._add_to_index(name)
 
                 self.counter = locus_range[1] + 1
                 self.partition_length = locus_range[1] + 1
@@ -819,9 +924,11 @@ class Partitions(object):
         if not isinstance(part_name, list):
             part_name = [part_name]
 
+        part_set = set(part_name)
+
         # Remove partition from partition_index
         self.partitions_index = [
-            x for x in self.partitions_index if x[0] not in part_name]
+            x for x in self.partitions_index if x[0] not in part_set]
 
         for p in part_name:
 
@@ -843,6 +950,8 @@ class Partitions(object):
         for i in nm:
             del self.partitions[i]
 
+        self._index = None
+
         new_dic = self.sort_partitions()
 
         return new_dic
@@ -879,6 +988,8 @@ class Partitions(object):
 
         if file_list:
 
+            file_list = set(file_list)
+
             part_list = []
             update_parts = []
             for part, fl in self.partitions_alignments.items():
@@ -936,6 +1047,7 @@ class Partitions(object):
         self.partitions_alignments[new_name] = \
             self.partitions_alignments.pop(old_name)
         self.models[new_name] = self.models.pop(old_name)
+        self._index = None
 
     def merge_partitions(self, partition_list, name):
         """Merges multiple partitions into a single one.
@@ -981,17 +1093,19 @@ class Partitions(object):
                     for j in i:
                         yield j
 
+        part_set = set(partition_list)
+
         # Get new range
         new_range = [x for x in merger(flatter((y[0] for x, y in
                                                self.partitions.items()
-                                               if x in partition_list)))]
+                                               if x in part_set)))]
 
         # Add entries for new partition
         self.partitions[name] = [new_range[0] if len(new_range) == 1 else
             new_range, False]
         self.partitions_alignments[name] = list(set([i for x, y in
                                             self.partitions_alignments.items()
-                                            if x in partition_list for i in y]))
+                                            if x in part_set for i in y]))
         self.models[name] = [[[]], [None], []]
 
         # Delete previous partitions and update merged dict
@@ -1147,6 +1261,8 @@ class Partitions(object):
             self.partitions_alignments[aln_name] = [fl]
             self.models[aln_name] = [[[]], [None], []]
 
+        self._index = None
+
     # ==========================================================================
     # Model handling
     # ==========================================================================
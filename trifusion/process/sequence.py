@@ -53,14 +53,17 @@ dictionary::
     }
 
     # Call the appropriate method
-    parsing_methods[self.input_format]()
+    parsing_methods[self.input_format](file_handle)
 
 Each format has its own parsing method (which can be modified directly). To
 add a new format, it is necessary to add it to the automatic format
 recognition in :meth:`~trifusion.process.base.Base.autofinder`. Then,
 create the new parsing method, using the same `_read_<format>` notation and
 add it to the `parsing_methods` dictionary in
-:meth:`~.Alignment.read_alignment`.
+:meth:`~.Alignment.read_alignment`. The parsing methods receive the file
+handle that was used for the format recognition, already rewound to the
+beginning of the file, so they should read from it instead of opening the
+alignment file again.
 
 New parsers must insert alignment data into a table in the sqlite database.
 This table is automatically created when the :class:`.Alignment` object
@@ -375,15 +378,10 @@ roughly with the same arguments in both classes so that their behavior is
 the same. These can be simple wrappers that call the respective
 :class:`.Alignment` method for each alignment in the
 :attr:`~.AlignmentList.alignments` attribute. For instance,
-the :meth:`~.AlignmentList.change_taxon_name` method is simply::
+the :meth:`~.AlignmentList.update_taxa_names` method ends with::
 
-    def change_taxon_name(self, old_name, new_name):
-
-        for alignment_obj in list(self.alignments.values()):
-            alignment_obj.change_taxon_name(old_name, new_name)
-
-        self.taxa_names = [new_name if x == old_name else x
-                           for x in self.taxa_names]
+        for aln_obj in self.alignments.values():
+            aln_obj.shelve_taxa(self.shelved_taxa)
 
 To avoid duplicating the argument list, the wrapping method can use `args`
 and `kwargs` to transfer arguments. This ensures that if the argument list
@@ -442,16 +440,31 @@ list of taxa from the :class:`.AlignmentList` object. It is easy to change
 only the relevant :class:`.AlignmentList` attributes, but this change also
 requires those particular taxa to be removed in all :class:`.Alignment`
 objects. For this reason, such methods should be defined in the same way in
-both classes. Using the :meth:`~.AlignmentList.remove_taxa` example::
+both classes, so that the usage is the same for both methods.
+
+However, calling the :class:`.Alignment` method for each alignment
+results in one database statement per taxon and alignment, which is slow
+for large data sets. When the change can be expressed in SQL, the
+:class:`.AlignmentList` method should instead apply it to the
+`alignment_data` table for all active alignments at once. The taxa and
+alignments targeted by the operation are loaded into temporary tables with
+:meth:`~.AlignmentList._load_selection_table`, and the `taxa_idx` of
+each :class:`.Alignment` is then updated with
+:meth:`~.AlignmentList._update_taxa_idx`. Using the
+:meth:`~.AlignmentList.remove_taxa` example::
 
     def remove_taxa(self, taxa_list, mode="remove"):
 
         # <changes to AlignmentList>
 
-        for alignment_obj in list(self.alignments.values()):
-            alignment_obj.remove_taxa(taxa_list, mode=mode)
+        self._load_selection_table("taxa_selection", taxa_list)
+        self._load_selection_table(
+            "aln_selection", (x.db_idx for x in self.alignments.values()))
 
-As you can see, the usage is the same for both methods.
+        self.cur.execute(
+            "DELETE FROM alignment_data WHERE "
+            "aln_idx IN (SELECT val FROM temp.aln_selection) AND "
+            "taxon IN (SELECT val FROM temp.taxa_selection)")
 
 Plot data methods
 ~~~~~~~~~~~~~~~~~
@@ -622,13 +635,13 @@ leave formats, it's fairly straightforward to do this. However, interleave
 formats can fragment the data from each taxon across the entire file. Since
 database insertions and updates are expensive, loading the data in each line
 can greatly decrease the performance in these formats. Therefore,
-it's preferable to read the alignment file once per taxon, join the entire
-sequence of that taxon, and then insert it into the database. This ensures
-that only sequence data from one taxon is kept in memory at any given time
-and only a minimal number of database insertions are performed. It will also
-result in the same file being parsed N times, where N is the number of taxa.
-However, the decrease in speed is marginal, since most lines are actually
-skipped, whereas the efficiency increase is substantial.
+the interleave parsers read the alignment file only once and gather the
+fragments of each taxon in memory buffers. These buffers are stored as
+chunks in a temporary table only when their size exceeds a given threshold
+(the module level `interleave_buffer_size`), and the chunks of each taxon
+are concatenated once at the end of the file. This keeps memory usage
+bounded and results in a minimal number of database insertions and
+updates.
 
 Implications for fetching data
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -674,13 +687,20 @@ from itertools import compress
 from threading import Lock
 import functools
 import sqlite3
+import hashlib
+import heapq
+import inspect
+import copy
+import struct
+import zlib
+import uuid
 
 # TriFusion imports
 
 try:
     import process
     from process.base import dna_chars, aminoacid_table, iupac, \
-        iupac_rev, iupac_conv, Base
+        iupac_rev, iupac_conv, iupac_bits, Base
     from process.data import Partitions
     from process.data import PartitionException
     from process.error_handling import DuplicateTaxa, KillByUser, \
@@ -689,7 +709,7 @@ try:
 except ImportError:
     import trifusion.process as process
     from trifusion.process.base import dna_chars, aminoacid_table, iupac, \
-        iupac_rev, iupac_conv, Base
+        iupac_rev, iupac_conv, iupac_bits, Base
     from trifusion.process.data import Partitions
     from trifusion.process.data import PartitionException
     from trifusion.process.error_handling import DuplicateTaxa, KillByUser, \
@@ -711,6 +731,114 @@ except ImportError:
 # Lock mechanism to prevent concurrent access to sqlite database
 lock = Lock()
 
+# Maximum number of sequence characters that the interleave parsers keep
+# in memory before storing the buffered fragments in the database
+interleave_buffer_size = 50000000
+
+# Width of the column blocks used by `AlignmentList.iter_columns` to
+# retrieve the columns of long alignments
+column_block_size = 100000
+
+# Lookup tables between the character codes of nucleotides/IUPAC ambiguity
+# codes and their 4-bit masks (see `process.base.iupac_bits`). Characters
+# other than nucleotides and IUPAC codes are considered fully ambiguous
+nt_to_bits = np.full(256, 15, dtype=np.uint8)
+bits_to_nt = np.zeros(16, dtype=np.uint8)
+for _char, _bits in iupac_bits.items():
+    nt_to_bits[ord(_char)] = nt_to_bits[ord(_char.upper())] = _bits
+    bits_to_nt[_bits] = ord(_char)
+
+# Lookup tables between the characters of nucleotide sequences and the
+# 4-bit codes of the compact sequence encoding (see `pack_sequence`). The
+# gap is encoded as 0 and the lower case nucleotides/IUPAC codes as their
+# 4-bit masks. All other characters are flagged with 255.
+nt_to_code = np.full(256, 255, dtype=np.uint8)
+code_to_nt = bits_to_nt.copy()
+for _char, _bits in iupac_bits.items():
+    nt_to_code[ord(_char)] = _bits
+nt_to_code[ord("-")] = 0
+code_to_nt[0] = ord("-")
+
+# Leading byte of the compact sequence encodings
+_PACKED_NT = "\x01"
+_PACKED_RAW = "\x02"
+
+
+def pack_sequence(seq):
+    """Encodes a sequence string in the compact storage format.
+
+    Sequences that only contain lower case nucleotides, IUPAC ambiguity
+    codes and gaps are packed as 4-bit codes (two characters per byte).
+    All other sequences (e.g., proteins) are kept as bytes. In both
+    cases, the result is compressed with zlib, which also collapses the
+    long runs of gaps and missing data that are common in alignments.
+
+    Parameters
+    ----------
+    seq : str or unicode
+        Sequence string.
+
+    Returns
+    -------
+    _ : buffer
+        Encoded sequence, which is stored as a BLOB in the database.
+
+    See Also
+    --------
+    unpack_sequence
+    """
+
+    seq = seq.encode("utf8") if isinstance(seq, unicode) else seq
+    codes = nt_to_code[np.frombuffer(seq, dtype=np.uint8)]
+
+    if not seq or codes.max() == 255:
+        return sqlite3.Binary(_PACKED_RAW + zlib.compress(seq, 1))
+
+    if len(codes) % 2:
+        codes = np.append(codes, 0).astype(np.uint8)
+
+    packed = (codes[0::2] << 4) | codes[1::2]
+
+    return sqlite3.Binary(_PACKED_NT + struct.pack("<I", len(seq)) +
+                          zlib.compress(packed.tostring(), 1))
+
+
+def unpack_sequence(data):
+    """Decodes a sequence stored in the compact storage format.
+
+    Parameters
+    ----------
+    data : buffer or unicode
+        Value of the `seq` column. Values that are not BLOBs are plain
+        sequence strings and are returned unchanged.
+
+    Returns
+    -------
+    _ : unicode
+        Sequence string.
+
+    See Also
+    --------
+    pack_sequence
+    """
+
+    if not isinstance(data, buffer):
+        return data
+
+    data = str(data)
+
+    if data[0] == _PACKED_NT:
+        length = struct.unpack("<I", data[1:5])[0]
+        packed = np.frombuffer(zlib.decompress(data[5:]), dtype=np.uint8)
+
+        codes = np.empty(len(packed) * 2, dtype=np.uint8)
+        codes[0::2] = packed >> 4
+        codes[1::2] = packed & 15
+
+        return code_to_nt[codes[:length]].tostring().decode("ascii")
+
+    return zlib.decompress(data[1:]).decode("utf8")
+
 
 class LookupDatabase(object):
     """Decorator handling hash lookup table with pre-calculated values.
@@ -850,6 +978,198 @@ class LookupDatabase(object):
         return functools.partial(self.__call__, obj)
 
 
+class PlotCache(object):
+    """Two tier cache for the results of `AlignmentList` plotting methods.
+
+    Stores the dictionaries returned by the `check_data` decorated methods
+    of `AlignmentList`, so that requesting the same plot for the same
+    active data set does not repeat the (sometimes very long) calculations.
+    The first tier is an in-memory LRU dictionary with, at most, `max_size`
+    entries. The second tier is a sqlite database ("plot_cache.db") in the
+    `cache_dir` directory, which allows the results to be reused by other
+    `AlignmentList` instances, including those of different TriStats runs
+    that use the same cache directory.
+
+    Instances should be retrieved with the `get_cache` class method, which
+    ensures that all `AlignmentList` objects (including the deep copies
+    created by the GUI background tasks) sharing the same `cache_dir` also
+    share the same in-memory tier.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the directory where the on-disk database will be stored.
+    max_size : int
+        Maximum number of entries kept in the in-memory tier.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Path to the directory where the on-disk database will be stored.
+    db_path : str
+        Path to the on-disk sqlite database.
+    max_size : int
+        Maximum number of entries kept in the in-memory tier.
+    memory : OrderedDict
+        In-memory tier, with the most recently used entries at the end.
+
+    Notes
+    -----
+    The connection to the on-disk database is opened and closed for each
+    transaction. This is a bit slower, but the database can be safely used
+    from the worker threads of the GUI and the cache directory can be
+    removed at any time (e.g. when the temporary directory is cleaned),
+    in which case only the in-memory tier is used.
+    """
+
+    _instances = {}
+    """Maps the absolute path of each cache directory to its `PlotCache`"""
+
+    def __init__(self, cache_dir, max_size=32):
+
+        self.cache_dir = cache_dir
+        self.db_path = join(cache_dir, "plot_cache.db")
+        self.max_size = max_size
+        self.memory = OrderedDict()
+
+    @classmethod
+    def get_cache(cls, cache_dir):
+        """Returns the `PlotCache` object for a given directory.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Path to the cache directory.
+
+        Returns
+        -------
+        _ : PlotCache
+            Cache object associated with `cache_dir`.
+        """
+
+        cache_dir = os.path.abspath(cache_dir)
+
+        if cache_dir not in cls._instances:
+            cls._instances[cache_dir] = cls(cache_dir)
+
+        return cls._instances[cache_dir]
+
+    def _connect(self):
+        """Opens a connection to the on-disk database.
+
+        Returns
+        -------
+        con : sqlite3.Connection or None
+            Connection to the on-disk database. None if the cache directory
+            does not exist or the database cannot be opened.
+        """
+
+        if not os.path.isdir(self.cache_dir):
+            return None
+
+        try:
+            con = sqlite3.connect(self.db_path, timeout=5.0)
+            con.execute("CREATE TABLE IF NOT EXISTS plot_cache "
+                        "(key TEXT PRIMARY KEY, data BLOB)")
+        except sqlite3.Error:
+            return None
+
+        return con
+
+    def _remember(self, key, value):
+        """Adds an entry to the in-memory tier, evicting the oldest ones."""
+
+        self.memory[key] = value
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """Retrieves a cached result.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as generated by `AlignmentList._plot_cache_key`.
+
+        Returns
+        -------
+        _ : dict or None
+            A copy of the cached result, or None if `key` is not cached.
+        """
+
+        if key in self.memory:
+            value = self.memory.pop(key)
+            self.memory[key] = value
+            return copy.deepcopy(value)
+
+        con = self._connect()
+        if not con:
+            return None
+
+        try:
+            row = con.execute("SELECT data FROM plot_cache WHERE key=?",
+                              (key,)).fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            con.close()
+
+        if not row:
+            return None
+
+        try:
+            value = pickle.loads(str(row[0]))
+        except Exception:
+            return None
+
+        self._remember(key, value)
+
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """Stores a result in both tiers of the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as generated by `AlignmentList._plot_cache_key`.
+        value : dict
+            Result of the plotting method.
+        """
+
+        value = copy.deepcopy(value)
+        self._remember(key, value)
+
+        con = self._connect()
+        if not con:
+            return
+
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            with con:
+                con.execute("INSERT OR REPLACE INTO plot_cache VALUES (?, ?)",
+                            (key, sqlite3.Binary(data)))
+        except (sqlite3.Error, pickle.PicklingError, TypeError):
+            pass
+        finally:
+            con.close()
+
+    def clear(self):
+        """Removes all entries from both tiers of the cache."""
+
+        self.memory = OrderedDict()
+
+        con = self._connect()
+        if not con:
+            return
+
+        try:
+            with con:
+                con.execute("DELETE FROM plot_cache")
+        finally:
+            con.close()
+
+
 def check_data(func):
     """Decorator handling the result from AlignmentList plotting methods.
     
@@ -868,6 +1188,12 @@ def check_data(func):
     {"exception":<exception_type_string>}. The <exception_type_string> should
     be a simple string with an informative name that will be handled in
     the `stats_write_plot` of the `TriFusionApp` class.
+
+    Successful results are also stored in the `PlotCache` of the
+    `AlignmentList` (see `AlignmentList.get_plot_cache`). When the same
+    method is called with the same arguments and the active alignments,
+    active taxa and source table are unchanged, the cached result is
+    returned without executing `func`.
     
     Parameters
     ----------
@@ -915,10 +1241,20 @@ def check_data(func):
             if func.__name__ in no_mixing:
                 return {"exception": "no_missing"}
 
+        # Return the cached result for the current active data set, if any
+        cache = args[0].get_plot_cache()
+        if cache:
+            key = args[0]._plot_cache_key(func, args[1:], kwargs)
+            cached_res = cache.get(key)
+            if cached_res is not None:
+                return cached_res
+
         res = func(*args, **kwargs)
 
         if "data" in res:
             if np.asarray(res["data"]).any():
+                if cache:
+                    cache.set(key, res)
                 return res
             else:
                 return {"exception": "empty_data"}
@@ -1217,6 +1553,9 @@ class Alignment(Base):
         to their index in the sqlite database table. This option should only
         be used when `input_alignment` is a database table name. Otherwise,
         it is automatically set during alignment parsing.
+    compact_storage : bool, optional
+        If True, the parsed sequences are stored in the database with the
+        compact encoding of `pack_sequence`.
     
     Attributes
     ----------
@@ -1260,6 +1599,8 @@ class Alignment(Base):
         created for the alignment data.
     input_format : str
         Format of the input alignment file.
+    compact_storage : bool
+        Whether the parsed sequences are stored with the compact encoding.
     
     Notes
     -----
@@ -1289,7 +1630,8 @@ class Alignment(Base):
     def __init__(self, input_alignment, input_format=None, partitions=None,
                  locus_length=None, sequence_code=None,
                  taxa_idx=None, sql_cursor=None, sql_con=None,
-                 db_idx=None, ignore_db_check=False, temp_dir=""):
+                 db_idx=None, ignore_db_check=False, temp_dir="",
+                 compact_storage=False):
 
         self.cur = sql_cursor
         self.con = sql_con
@@ -1391,18 +1733,28 @@ class Alignment(Base):
         stored in the database, and then further usages will use that table.
         """
 
+        self.compact_storage = compact_storage
+        """
+        When True, the parsed sequences are stored in the database with
+        the compact encoding (see `pack_sequence`). Sequences are always
+        decoded when retrieved, regardless of this attribute.
+        """
+
         self.temp_dir = temp_dir if temp_dir else "."
 
         if not ignore_db_check:
 
+            # The alignment file is opened only once. The same file handle
+            # is used to sniff the format and is then handed to the parser
+            fh = open(input_alignment)
+
             # Get alignment format and code. Sequence code is a tuple of
             # (DNA, N) or (Protein, X)
-            finder_content = self.autofinder(input_alignment)
+            finder_content = self.autofinder(fh)
             # Handles the case where the input format is invalid and
             # finder_content is an Exception
             if isinstance(finder_content, Exception) is False:
-                self.input_format, self.sequence_code = self.autofinder(
-                    input_alignment)
+                self.input_format, self.sequence_code = finder_content
 
                 # In case the input format is specified, overwrite the
                 # attribute
@@ -1413,8 +1765,9 @@ class Alignment(Base):
                     """
 
                 # parsing the alignment
-                self.read_alignment()
+                self.read_alignment(fh)
             else:
+                fh.close()
                 # Setting the sequence code attribute for seq type checking
                 # in AlignmentList
                 self.sequence_code = None
@@ -1446,7 +1799,7 @@ class Alignment(Base):
                 "SELECT taxon,seq from alignment_data WHERE aln_idx=?",
                 (self.db_idx,)):
             if tx not in self.shelved_taxa:
-                yield tx, seq
+                yield tx, unpack_sequence(seq)
 
     def _create_table(self, table_name, index=None, cur=None):
         """Creates a new table in the database.
@@ -1503,7 +1856,7 @@ class Alignment(Base):
         cur = self.con.cursor()
 
         cur.execute("INSERT INTO aux VALUES (?, ?, ?)",
-                    (self.db_idx, str(tx_idx), str(part.__dict__)))
+                    (self.db_idx, str(tx_idx), str(part.__getstate__())))
         
         self._partitions = None
         self._taxa_idx = None
@@ -1530,7 +1883,7 @@ class Alignment(Base):
 
         cur = self.con.cursor()
         cur.execute("UPDATE aux SET partitions=? WHERE aln_idx=?",
-                    (str(partitions_obj.__dict__), self.db_idx,))
+                    (str(partitions_obj.__getstate__()), self.db_idx,))
 
     @property
     def taxa_idx(self):
@@ -1766,7 +2119,7 @@ class Alignment(Base):
                     "FROM [{}] "
                     "WHERE aln_idx=?".format(table_name), (self.db_idx, )):
                 if tx not in self.shelved_taxa:
-                    yield seq
+                    yield unpack_sequence(seq)
         finally:
             lock.release()
 
@@ -1821,7 +2174,7 @@ class Alignment(Base):
                     "FROM [{}] "
                     "WHERE aln_idx=?".format(table_name), (self.db_idx,)):
                 if tx not in self.shelved_taxa:
-                    yield tx, seq
+                    yield tx, unpack_sequence(seq)
         finally:
             lock.release()
 
@@ -1883,7 +2236,7 @@ class Alignment(Base):
                         "WHERE taxon=? "
                         "AND aln_idx=?".format(table_name),
                         (taxon, self.db_idx)).fetchone()[0]
-                    return seq
+                    return unpack_sequence(seq)
                 elif taxon not in self.shelved_taxa:
                     seq = self.cur.execute(
                         "SELECT seq "
@@ -1891,7 +2244,7 @@ class Alignment(Base):
                         "WHERE taxon=? "
                         "AND aln_idx=?".format(table_name),
                         (taxon, self.db_idx)).fetchone()[0]
-                    return seq
+                    return unpack_sequence(seq)
             except TypeError:
                 raise KeyError
         finally:
@@ -1928,6 +2281,10 @@ class Alignment(Base):
         -------
 
         """
+
+        if self.compact_storage:
+            seq = pack_sequence(seq)
+
         try:
 
             lock.acquire(True)
@@ -1946,7 +2303,92 @@ class Alignment(Base):
         finally:
             lock.release()
 
-    def _read_interleave_phylip(self, ntaxa):
+    def _flush_interleave_buffer(self, buffer, chunk_no):
+        """Stores buffered sequence fragments as a chunk in the database.
+
+        Used by the interleave parsers to store the sequence fragments
+        gathered since the last flush. The fragments of each taxon are
+        inserted as chunk `chunk_no` of its sequence in the temporary
+        `interleave_chunks` table, and the chunks are concatenated once at
+        the end of the parsing by `_store_interleave_buffer`. The buffer is
+        emptied in place.
+
+        Parameters
+        ----------
+        buffer : collections.OrderedDict
+            Maps the taxon index to a list of [taxon name, list of
+            sequence fragments].
+        chunk_no : int
+            Index of the chunk in the sequence of each taxon.
+        """
+
+        def chunks():
+            for idx, (taxon, fragments) in buffer.items():
+                yield self.db_idx, idx, chunk_no, "".join(fragments)
+                del fragments[:]
+
+        try:
+            lock.acquire(True)
+            self.cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS interleave_chunks ("
+                "aln_idx INT, txId INT, chunk_no INT, seq TEXT, "
+                "PRIMARY KEY (aln_idx, txId, chunk_no))")
+            self.cur.executemany(
+                "INSERT INTO interleave_chunks VALUES (?, ?, ?, ?)",
+                chunks())
+        finally:
+            lock.release()
+
+    def _store_interleave_buffer(self, buffer, chunk_no):
+        """Stores the sequences gathered by the interleave parsers.
+
+        Called at the end of the interleave parsers. If the buffer was
+        never flushed, the sequences are inserted directly from the
+        buffer. Otherwise, the remaining fragments are stored as the last
+        chunk and the chunks of each taxon are read in order and joined,
+        so that a single sequence is kept in memory at any given time.
+        The chunks are removed at the end.
+
+        Parameters
+        ----------
+        buffer : collections.OrderedDict
+            Maps the taxon index to a list of [taxon name, list of
+            sequence fragments].
+        chunk_no : int
+            Number of chunks already stored by `_flush_interleave_buffer`.
+        """
+
+        if not chunk_no:
+            for idx, (taxon, fragments) in buffer.items():
+                self._insert_data(idx, taxon, "".join(fragments))
+                del fragments[:]
+            return
+
+        self._flush_interleave_buffer(buffer, chunk_no)
+
+        for idx, (taxon, _) in buffer.items():
+
+            try:
+                lock.acquire(True)
+                chunks = self.cur.execute(
+                    "SELECT seq FROM interleave_chunks WHERE aln_idx=? AND "
+                    "txId=? ORDER BY chunk_no",
+                    (self.db_idx, idx)).fetchall()
+            finally:
+                lock.release()
+
+            self._insert_data(idx, taxon, "".join(x[0] for x in chunks))
+            del chunks
+
+        try:
+            lock.acquire(True)
+            self.cur.execute(
+                "DELETE FROM interleave_chunks WHERE aln_idx=?",
+                (self.db_idx,))
+        finally:
+            lock.release()
+
+    def _read_interleave_phylip(self, ntaxa, fh):
         """ Alignment parser for interleave phylip format.
 
         Parses an interleave phylip alignment file and stores taxa and
@@ -1958,6 +2400,10 @@ class Alignment(Base):
         ----------
         ntaxa : int
             Number of taxa contained in the alignment file.
+        fh : file
+            File handle of the alignment file that is being parsed by
+            `_read_phylip`. The handle is rewound and read from the beginning
+            of the file.
 
         Returns
         -------
@@ -1968,78 +2414,75 @@ class Alignment(Base):
 
         See Also
         --------
-        _read_phylip
+        _read_phylip, _flush_interleave_buffer, _store_interleave_buffer
 
         Notes
         -----
         The phylip interleave format splits the alignment into blocks of
         a certain lenght (usually 90 characters) separated by blank lines.
-        This means that to gather the complete sequence of a given taxon,
-        the parser has to read the entire file. To prevent the entire
-        alignment to be loaded into memory, we actually iterate over a range
-        determined by the number of taxa in the alignment. In each iteration,
-        we open a file handle and we retrieve only the sequence of
-        a particular taxon. This ensures that only sequence data for
-        a single taxon is store in memory at any given time. This also means
-        that the alignment file has to be read N times, where N = number of
-        taxa. However, since the vast majority of lines are actually skipped
-        in each iteration, the decrease in speed is marginal, while the
-        gains in memory efficient are much larger.
-        """
-
-        size_list = []
-
-        for i in xrange(ntaxa):
+        The file is read only once and the fragments of each block are
+        appended to a per-taxon buffer. To keep memory usage bounded for
+        very large alignments, the buffered fragments are stored as chunks
+        in the database whenever their size exceeds
+        `interleave_buffer_size` characters, and the chunks of each taxon
+        are concatenated at the end of the file.
+        """
+
+        # Maps the taxon index to [taxon name, sequence fragments]
+        buffer = OrderedDict(
+            (i, [taxon, []]) for i, taxon in
+            enumerate(self._taxa_idx.keys()[:ntaxa]))
+        size_list = [0] * len(buffer)
+        # Number of chunks stored in the database
+        chunk_no = 0
+        buffered = 0
+
+        # Index identifier of the current taxon
+        idx = 0
+        # When True, it means that the alignment line has the taxon
+        # and sequence. When False, it means that the line contains
+        # only sequence.
+        taxa_gather = True
 
-            # Variable that will store the sequence for the current taxon.
-            sequence = []
-            # Index identifier of the current taxon
-            idx = 0
-            # When True, it means that the alignment line has the taxon
-            # and sequence. When False, it means that the line contains
-            # only sequence.
-            taxa_gather = True
+        fh.seek(0)
 
-            fh = open(self.path)
+        # Skip header an any potential blank lines
+        header = ""
+        while not header:
+            header = next(fh)
 
-            # Skip header an any potential blank lines
-            header = ""
-            while not header:
-                header = next(fh)
+        for line in fh:
 
-            for line in fh:
+            # At blank lines, reset the idx and set taxa_gather to False.
+            # All lines from this point on will only contain sequence.
+            if not line.strip():
+                idx = 0
+                taxa_gather = False
+                continue
 
-                # At blank lines, reset the idx and set taxa_gather to False.
-                # All lines from this point on will only contain sequence.
-                if not line.strip():
-                    idx = 0
-                    taxa_gather = False
+            if idx in buffer:
+                # Remove the taxon from the gathering
+                if taxa_gather:
+                    seq = "".join(line.strip().lower().split()[1:])
                 else:
-                    # If the idx of the alignment block matches the taxon
-                    # from the current iteration, add to sequence variable
-                    if idx == i:
-                        # Remove the taxon from the gathering
-                        if taxa_gather:
-                            sequence.append(
-                                "".join(line.strip().lower().split()[1:]))
-                        else:
-                            sequence.append(
-                                "".join(line.strip().lower().split()))
-                    idx += 1
+                    seq = "".join(line.strip().lower().split())
 
-            seq = "".join(sequence)
-            taxa = self._taxa_idx.keys()[i]
+                buffer[idx][1].append(seq)
+                size_list[idx] += len(seq)
+                buffered += len(seq)
 
-            size_list.append(len(seq))
+            idx += 1
 
-            # Insert data into database
-            self._insert_data(i, taxa, seq)
+            if buffered > interleave_buffer_size:
+                self._flush_interleave_buffer(buffer, chunk_no)
+                chunk_no += 1
+                buffered = 0
 
-            fh.close()
+        self._store_interleave_buffer(buffer, chunk_no)
 
         return size_list
 
-    def _read_interleave_nexus(self, ntaxa):
+    def _read_interleave_nexus(self, ntaxa, fh):
         """ Alignment parser for interleave nexus format.
 
         Parses an interleave nexus alignment file and stores taxa and
@@ -2051,6 +2494,10 @@ class Alignment(Base):
         ----------
         ntaxa : int
             Number of taxa contained in the alignment file.
+        fh : file
+            File handle of the alignment file that is being parsed by
+            `_read_nexus`. The handle is rewound and read from the beginning
+            of the file.
 
         Returns
         -------
@@ -2061,74 +2508,75 @@ class Alignment(Base):
 
         See Also
         --------
-        _read_nexus
+        _read_nexus, _flush_interleave_buffer, _store_interleave_buffer
 
         Notes
         -----
         The nexus interleave format splits the alignment into blocks of
         a certain lenght (usually 90 characters) separated by blank lines.
-        This means that to gather the complete sequence of a given taxon,
-        the parser has to read the entire file. To prevent the entire
-        alignment to be loaded into memory, we actually iterate over a range
-        determined by the number of taxa in the alignment. In each iteration,
-        we open a file handle and we retrieve only the sequence of a
-        particular taxon. This ensures that only sequence data for
-        a single taxon is store in memory at any given time. This also means
-        that the alignment file has to be read N times, where N = number of
-        taxa. However, since the vast majority of lines are actually skipped
-        in each iteration, the decrease in speed is marginal, while the
-        gains in memory efficient are much larger.
+        The file is read only once and the fragments of each block are
+        appended to a per-taxon buffer, with the taxa names being retrieved
+        from the first block. To keep memory usage bounded for very large
+        alignments, the buffered fragments are stored as chunks in the
+        database whenever their size exceeds `interleave_buffer_size`
+        characters, and the chunks of each taxon are concatenated at the
+        end of the file.
         """
 
+        # Maps the taxon index to [taxon name, sequence fragments]
+        buffer = OrderedDict()
         size_list = []
+        # Number of chunks stored in the database
+        chunk_no = 0
+        buffered = 0
 
-        for i in xrange(ntaxa):
+        # counter used to skip the Nexus header and footer
+        counter = 0
+        # Index identifier of the current taxon
+        idx = 0
 
-            # Variable that will store the sequence for the current taxon.
-            sequence = []
-            # counter used to skip the Nexus header and footer
-            counter = 0
-            # Index identifier of the current taxon
-            idx = 0
-            taxa = None
+        fh.seek(0)
 
-            fh = open(self.path)
+        for line in fh:
 
-            for line in fh:
+            if line.strip().lower() == "matrix" and counter == 0:
+                counter = 1
 
-                if line.strip().lower() == "matrix" and counter == 0:
-                    counter = 1
+            elif line.strip() == ";" and counter == 1:
+                break
 
-                elif line.strip() == ";" and counter == 1:
-                    counter = 2
+            elif counter == 1:
 
-                elif counter == 1:
+                if not line.strip():
+                    idx = 0
+                    continue
 
-                    if not line.strip():
-                        idx = 0
-                    else:
-                        if idx == i:
-                            if not taxa:
-                                taxa = line.strip().split()[0].replace(" ",
-                                                                       "")
-                                taxa = self.rm_illegal(taxa)
+                if idx < ntaxa:
 
-                            sequence.append(
-                                "".join(line.strip().lower().split()[1:]))
+                    if idx not in buffer:
+                        taxa = line.strip().split()[0].replace(" ", "")
+                        taxa = self.rm_illegal(taxa)
+                        self._taxa_idx[taxa] = idx
+                        buffer[idx] = [taxa, []]
+                        size_list.append(0)
 
-                        idx += 1
+                    seq = "".join(line.strip().lower().split()[1:])
 
-            self._taxa_idx[taxa] = i
+                    buffer[idx][1].append(seq)
+                    size_list[idx] += len(seq)
+                    buffered += len(seq)
 
-            seq = "".join(sequence)
-            if not self.locus_length:
-                self.locus_length = len(seq)
+                idx += 1
 
-            size_list.append(len(seq))
+                if buffered > interleave_buffer_size:
+                    self._flush_interleave_buffer(buffer, chunk_no)
+                    chunk_no += 1
+                    buffered = 0
 
-            self._insert_data(i, taxa, seq)
+        self._store_interleave_buffer(buffer, chunk_no)
 
-            fh.close()
+        if not self.locus_length and size_list:
+            self.locus_length = size_list[0]
 
         return size_list
 
@@ -2163,19 +2611,23 @@ class Alignment(Base):
             elif sequence.count("x") and self.sequence_code[0] == "Protein":
                 self.sequence_code[1] = "x"
 
-    def _read_phylip(self):
+    def _read_phylip(self, fh):
         """Alignment parser for phylip format.
 
         Parses a phylip alignment file and stored taxa and sequence data in
         the database.
 
+        Parameters
+        ----------
+        fh : file
+            File handle of the alignment file, positioned at the beginning
+            of the file.
+
         See Also
         --------
         read_alignment
         """
 
-        fh = open(self.path)
-
         # Variable storing the lenght of each sequence
         size_list = []
 
@@ -2214,10 +2666,12 @@ class Alignment(Base):
                 if not taxa_gather:
 
                     # Oh boy, this seems like an interleave phylip file.
-                    # Redirect parsing to appropriate method
-                    # self.cur.execute("DELETE FROM [{}]".format(
-                    #     self.db_idx))
-                    size_list = self._read_interleave_phylip(taxa_num)
+                    # Remove the partial sequences of the first block
+                    # and redirect parsing to appropriate method
+                    self.cur.execute(
+                        "DELETE FROM alignment_data WHERE aln_idx=?",
+                        (self.db_idx,))
+                    size_list = self._read_interleave_phylip(taxa_num, fh)
                     break
 
                 # To support interleave phylip, while the taxa_pos
@@ -2262,25 +2716,27 @@ class Alignment(Base):
                                        file_name=self.path,
                                        seq_type=self.sequence_code[0])
         
-        fh.close()
-
         # Checks the size consistency of the alignment
         if len(set(size_list)) > 1:
             self.e = AlignmentUnequalLength()
 
-    def _read_fasta(self):
+    def _read_fasta(self, fh):
         """Alignment parser for fasta format.
 
         Parses a fasta alignment file and stores taxa and sequence data in
         the database.
 
+        Parameters
+        ----------
+        fh : file
+            File handle of the alignment file, positioned at the beginning
+            of the file.
+
         See Also
         --------
         read_alignment
         """
 
-        fh = open(self.path)
-
         # Variable storing the lenght of each sequence
         size_list = []
 
@@ -2338,15 +2794,19 @@ class Alignment(Base):
                                        file_name=self.path,
                                        seq_type=self.sequence_code[0])
 
-        fh.close()
-
         # Checks the size consistency of the alignment
         if len(set(size_list)) > 1:
             self.e = AlignmentUnequalLength()
 
-    def _read_loci(self):
+    def _read_loci(self, fh):
         """Alignment parser for pyRAD and ipyrad loci format.
 
+        Parameters
+        ----------
+        fh : file
+            File handle of the alignment file, positioned at the beginning
+            of the file.
+
         See Also
         --------
         read_alignment
@@ -2356,16 +2816,18 @@ class Alignment(Base):
         temp_table = ".locidata"
         self._create_table(temp_table, index=("lociindex", "txId"))
 
-        fh = open(self.path)
-
         # Variable storing the length of each sequence
         size_list = []
 
-        taxa_list = self.get_loci_taxa(self.path)
-        self._taxa_idx = dict((x, p) for p, x in enumerate(taxa_list))
+        # The taxa are indexed as they are found in the file, instead of
+        # being retrieved from a previous pass over the whole file
+        self._taxa_idx = {}
 
         # Create empty dict
         sequence_data = []
+        # Stores the missing data of the previous partitions for taxa that
+        # appear for the first time in the current partition
+        backfill_data = []
 
         # Add a counter to name each locus
         locus_c = 1
@@ -2385,6 +2847,15 @@ class Alignment(Base):
                 taxon = fields[0].lstrip(">")
                 present_taxa.append(taxon)
                 cur_seq = fields[1].lower()
+
+                if taxon not in self._taxa_idx:
+                    self._taxa_idx[taxon] = len(self._taxa_idx)
+                    if self.locus_length:
+                        backfill_data.append(
+                            (self._taxa_idx[taxon], taxon,
+                             self.sequence_code[1] * self.locus_length,
+                             self.db_idx))
+
                 sequence_data.append(
                     (self._taxa_idx[taxon], taxon, cur_seq, self.db_idx))
                 size_list.append(len(cur_seq))
@@ -2423,17 +2894,25 @@ class Alignment(Base):
 
                 present_taxa = []
 
-                # Insert previous partition in the database
+                # Insert previous partition in the database. The missing
+                # data of new taxa is inserted first to preserve the order
+                # of the partitions when their sequence is concatenated
                 self.cur.executemany(
                     "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                        temp_table), sequence_data)
+                        temp_table), backfill_data + sequence_data)
 
                 # Reset sequence data for next partition
                 sequence_data = []
+                backfill_data = []
 
-        self._partitions.set_length(self.locus_length)
+        # Taxa that only appear after the last partition end are filled
+        # with missing data
+        if backfill_data:
+            self.cur.executemany(
+                "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
+                    temp_table), backfill_data)
 
-        fh.close()
+        self._partitions.set_length(self.locus_length)
 
         # Add temp table to master table
         self.cur.execute(
@@ -2446,19 +2925,23 @@ class Alignment(Base):
 
         return size_list
 
-    def _read_nexus(self):
+    def _read_nexus(self, fh):
         """Alignment parser for nexus format.
 
         Parses a nexus alignment file and stores taxa and sequence data in
         the database.
 
+        Parameters
+        ----------
+        fh : file
+            File handle of the alignment file, positioned at the beginning
+            of the file.
+
         See Also
         --------
         read_alignment
         """
 
-        fh = open(self.path)
-
         # Variable storing the lenght of each sequence
         size_list = []
 
@@ -2568,7 +3051,7 @@ class Alignment(Base):
                     idx += 1
 
                 else:
-                    size_list = self._read_interleave_nexus(ntaxa)
+                    size_list = self._read_interleave_nexus(ntaxa, fh)
                     counter = 2
 
             # If _partitions are specified using the charset command, this
@@ -2593,8 +3076,6 @@ class Alignment(Base):
         if self.name not in self._partitions.partitions_type:
             self._partitions.partitions_type[self.path] = self.sequence_code[0]
 
-        fh.close()
-
         # Checks the size consistency of the alignment
         if len(set(size_list)) > 1:
             self.e = AlignmentUnequalLength()
@@ -2608,19 +3089,23 @@ class Alignment(Base):
             self._partitions.add_partition(self.name, self.locus_length,
                                            file_name=self.path)
 
-    def _read_stockholm(self):
+    def _read_stockholm(self, fh):
         """Alignment parser for stockholm format.
 
         Parses a stockholm alignment file and stores taxa and sequence data in
         the database.
 
+        Parameters
+        ----------
+        fh : file
+            File handle of the alignment file, positioned at the beginning
+            of the file.
+
         See Also
         --------
         read_alignment
         """
 
-        fh = open(self.path)
-
         # Variable storing the lenght of each sequence
         size_list = []
         idx = 0
@@ -2662,13 +3147,11 @@ class Alignment(Base):
                                        file_name=self.path,
                                        seq_type=self.sequence_code[0])
 
-        fh.close()
-
         # Checks the size consistency of the alignment
         if len(set(size_list)) > 1:
             self.e = AlignmentUnequalLength()
 
-    def read_alignment(self):
+    def read_alignment(self, file_handle=None):
         """Main alignment parser method.
 
         This is the main alignment parsing method that is called when the
@@ -2677,6 +3160,15 @@ class Alignment(Base):
         it calls the specific method that parses that alignment format.
         After the execution of this method, all attributes of the class will
         be set and the full range of methods can be applied.
+
+        Parameters
+        ----------
+        file_handle : file, optional
+            File handle of the alignment file, positioned at the beginning
+            of the file. This is the handle that was used to detect the
+            alignment format in `__init__`. If not provided, the file in
+            `path` is opened. In either case, the file handle is closed
+            at the end of the parsing.
         """
 
         parsing_methods = {
@@ -2687,7 +3179,16 @@ class Alignment(Base):
             "stockholm": self._read_stockholm
         }
 
-        parsing_methods[self.input_format]()
+        if file_handle is None:
+            file_handle = open(self.path)
+
+        try:
+            parsing_methods[self.input_format](file_handle)
+        finally:
+            file_handle.close()
+
+        if self.compact_storage:
+            self._pack_data()
 
         # If the missing data symbol could not be evaluated during alignment
         # parsing, set the defaults
@@ -2701,6 +3202,27 @@ class Alignment(Base):
                                    " the alignment: {}".format(
                 "; ".join(duplicate_taxa)))
 
+    def _pack_data(self):
+        """Encodes the plain text sequences of the alignment.
+
+        Applies the compact encoding (see `pack_sequence`) to the sequences
+        of the alignment that were stored as plain text during parsing.
+        This is required by parsers that build the sequences in the
+        database (loci).
+        """
+
+        # The rows are updated while they are read, so that a single
+        # sequence is kept in memory at any given time. Only the seq
+        # column is changed, which does not affect the rows selected by
+        # the query
+        pack_cur = self.cur.connection.cursor()
+
+        pack_cur.executemany(
+            "UPDATE alignment_data SET seq=? WHERE rowid=?",
+            ((pack_sequence(seq), rowid) for rowid, seq in self.cur.execute(
+                "SELECT rowid, seq FROM alignment_data "
+                "WHERE aln_idx=? AND typeof(seq)='text'", (self.db_idx,))))
+
     def remove_alignment(self):
         """Removes data from current alignment from the database"""
 
@@ -2734,25 +3256,15 @@ class Alignment(Base):
         tx_idx = self.taxa_idx
 
         def remove(list_taxa):
-            for tx in list_taxa:
-                self.cur.execute(
-                    "DELETE FROM alignment_data "
-                    "WHERE txId=? AND aln_idx=?",
-                    (tx_idx[tx], self.db_idx))
-                del tx_idx[tx]
+            self.cur.executemany(
+                "DELETE FROM alignment_data WHERE txId=? AND aln_idx=?",
+                [(tx_idx.pop(tx), self.db_idx) for tx in list_taxa])
 
             self.taxa_idx = tx_idx
 
         def inverse(list_taxa):
-            for tx in list(tx_idx.keys()):
-                if tx not in list_taxa:
-                    self.cur.execute(
-                        "DELETE FROM alignment_data "
-                        "WHERE txId=? AND aln_idx=?",
-                        (tx_idx[tx], self.db_idx))
-                    del tx_idx[tx]
-
-            self.taxa_idx = tx_idx
+            list_taxa = set(list_taxa)
+            remove([tx for tx in tx_idx if tx not in list_taxa])
 
         # Checking if taxa_list is an input csv file:
         try:
@@ -2765,7 +3277,7 @@ class Alignment(Base):
 
         # Filter taxa_list for the taxa that are actually present in this
         # Alignment object
-        taxa_list = [x for x in taxa_list if x in tx_idx]
+        taxa_list = set(x for x in taxa_list if x in tx_idx)
 
         if mode == "remove":
             remove(taxa_list)
@@ -2788,8 +3300,9 @@ class Alignment(Base):
         # Change in taxa_list
         if old_name in tx_idx:
             # Change in the database
-            self.cur.execute("UPDATE [{}] SET taxon=? WHERE txId=?".format(
-                self.db_idx), (new_name, tx_idx[old_name]))
+            self.cur.execute(
+                "UPDATE alignment_data SET taxon=? WHERE txId=? AND "
+                "aln_idx=?", (new_name, tx_idx[old_name], self.db_idx))
             # Change in taxa_index
             tx_idx[new_name] = tx_idx[old_name]
             del tx_idx[old_name]
@@ -2889,6 +3402,10 @@ class AlignmentList(Base):
         object (`db_cur`) to connect to an existing database.
     pbar : ProgressBar, optional
         A ProgressBar object used to log the progress of TriSeq execution.
+    compact_storage : bool, optional
+        If True, the sequences of the alignment files are stored in the
+        database with the compact encoding of `pack_sequence`, which
+        considerably reduces the size of the database.
 
     Attributes
     ----------
@@ -2946,7 +3463,13 @@ class AlignmentList(Base):
     """
 
     def __init__(self, alignment_list, sql_db=None, db_cur=None, db_con=None,
-                 pbar=None):
+                 pbar=None, compact_storage=False):
+
+        self.compact_storage = compact_storage
+        """
+        When True, the sequences of the alignment files are stored in the
+        database with the compact encoding (see `pack_sequence`)
+        """
 
         # Create connection and cursor for sqlite database
         # If `db_cur` and `db_con` are both provided, setup the database
@@ -2978,12 +3501,25 @@ class AlignmentList(Base):
         """Name of the table with the taxa_idx and partitions information
         for each Alignment object"""
 
+        self.plot_cache_dir = os.path.dirname(os.path.abspath(self.sql_path))
+        """Path to the directory of the `PlotCache` used by the plotting
+        methods. Defaults to the directory of the database file. Set to None
+        to disable the cache"""
+
+        self._file_stats = None
+        """Size and modification time of the alignment files, used by
+        `_plot_cache_key`, and the version of the master table (see
+        `_get_table_version`) when they were retrieved. They are only
+        retrieved again when the master table changes"""
+
         if not db_cur and not db_con:
             self.con = sqlite3.connect(self.sql_path, check_same_thread=False,
                                        timeout=0.0)
             self.cur = self.con.cursor()
             self.cur.execute("PRAGMA synchronous = OFF")
 
+        self._set_sql_functions()
+
         if not self._table_exists(self.master_table):
             # Add master table for sequence data
             self._create_table(self.master_table,
@@ -2993,6 +3529,10 @@ class AlignmentList(Base):
         if not self._table_exists("aux"):
             self._create_aux_table()
 
+        if not self.cur.execute("SELECT rowid FROM [{}] LIMIT 1".format(
+                self.master_table)).fetchone():
+            self._set_loaded_version()
+
         self.alignments = OrderedDict()
         """
         Stores the "active" `Alignment` objects for the current
@@ -3111,8 +3651,21 @@ class AlignmentList(Base):
         Integer with the size of the complete data set
         """
 
-        # Set _partitions object
-        self.partitions = Partitions()
+        self._column_blocks = set()
+        """
+        Set with the names of the column blocks tables (see
+        `_get_column_blocks`)
+        """
+
+        self._selection_sets = {}
+        """
+        Maps the name of each temporary table kept by
+        `_sync_selection_table` to the `id` of the object that loaded it
+        and the set of values it holds
+        """
+
+        # Set _partitions object
+        self.partitions = Partitions()
 
         # if type(alignment_list[0]) is str:
         if alignment_list:
@@ -3148,25 +3701,256 @@ class AlignmentList(Base):
 
             lock.acquire(True)
 
+            self._sync_active_sets()
+
             for txId, taxon, seq, aln_idx in self.cur.execute(
                     "SELECT txId, taxon, seq, aln_idx "
                     "FROM [{}] "
-                    "WHERE aln_idx NOT IN ({}) AND "
-                    "aln_idx IN ({})".format(
-                        table_name,
-                        ", ".join([str(x) for x in self.shelved_idx]),
-                        ", ".join([str(x) for x in self.alignment_idx]))):
-                if taxon not in self.shelved_taxa:
-                    if include_txid:
-                        yield txId, taxon, seq, aln_idx
-                    else:
-                        yield taxon, seq, aln_idx
+                    "WHERE aln_idx IN (SELECT val FROM temp.alignment_idx) "
+                    "AND aln_idx NOT IN (SELECT val FROM temp.shelved_idx) "
+                    "AND taxon NOT IN (SELECT val FROM temp.shelved_taxa)"
+                    .format(table_name)):
+                seq = unpack_sequence(seq)
+                if include_txid:
+                    yield txId, taxon, seq, aln_idx
+                else:
+                    yield taxon, seq, aln_idx
 
         finally:
             lock.release()
 
+    def _get_table_version(self, table_name):
+        """Returns the version of a database table.
+
+        The rows inserted, updated or deleted in each table are counted
+        by temporary triggers, in the `table_versions` temporary table.
+        The triggers are created on the first call for a table, and again
+        when they are lost (the table was dropped or the database
+        connection changed). Each time, the table receives a new random
+        stamp, so that changes made while the triggers did not exist are
+        never mistaken for the previous version.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the table.
+
+        Returns
+        -------
+        _ : tuple
+            Random stamp of the triggers and number of changed rows since
+            they were created.
+        """
+
+        self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS table_versions"
+                         "(name PRIMARY KEY, stamp TEXT, version INT, "
+                         "loaded INT)")
+
+        if self.cur.execute(
+                "SELECT COUNT(*) FROM sqlite_temp_master WHERE "
+                "type='trigger' AND tbl_name=? AND name LIKE '%_version_%'",
+                (table_name,)).fetchone()[0] < 3:
+
+            for event in ["insert", "update", "delete"]:
+                self.cur.execute(
+                    "CREATE TEMP TRIGGER IF NOT EXISTS [{0}_version_{1}] "
+                    "AFTER {1} ON main.[{0}] BEGIN "
+                    "UPDATE table_versions SET version = version + 1 "
+                    "WHERE name='{2}'; END".format(
+                        table_name, event, table_name.replace("'", "''")))
+
+            self.cur.execute("INSERT OR REPLACE INTO temp.table_versions "
+                             "(name, stamp, version) VALUES (?, ?, 0)",
+                             (table_name, uuid.uuid4().hex))
+
+        return tuple(self.cur.execute(
+            "SELECT stamp, version FROM temp.table_versions WHERE name=?",
+            (table_name,)).fetchone())
+
+    def _set_loaded_version(self):
+        """Marks the current version of the master table as loaded.
+
+        The loaded version is the version of the master table (see
+        `_get_table_version`) after the alignment files were added, as
+        long as the table was not changed by other operations. While the
+        master table remains in this version, its contents are fully
+        determined by the alignment files (see `_plot_cache_key`).
+        """
+
+        self._get_table_version(self.master_table)
+        self.cur.execute("UPDATE temp.table_versions SET loaded=version "
+                         "WHERE name=?", (self.master_table,))
+
+    def _is_loaded_version(self):
+        """Checks whether the master table is in its loaded version.
+
+        Returns
+        -------
+        _ : bool
+            True when the master table was only changed by adding
+            alignment files (see `_set_loaded_version`).
+        """
+
+        version = self._get_table_version(self.master_table)[1]
+
+        return self.cur.execute(
+            "SELECT loaded FROM temp.table_versions WHERE name=?",
+            (self.master_table,)).fetchone()[0] == version
+
+    def _get_column_blocks(self, table_name, group_idx):
+        """Creates the table with the column blocks of a table.
+
+        The column blocks table has the same columns as `table_name`, with
+        an additional `block` column, and is indexed by `group_idx` and
+        block (see `_iter_column_blocks`). It is created empty, and only
+        once, since creating a table commits the active transaction, which
+        would reset the queries running in `iter_columns`.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the table with the sequence data.
+        group_idx : str
+            Name of the column that is used to group the sequences in
+            `iter_columns`.
+
+        Returns
+        -------
+        block_table : str
+            Name of the column blocks table.
+        """
+
+        block_table = ".colblocks_{}_{}".format(table_name, group_idx)
+
+        if not self._table_exists(block_table):
+
+            add_cols = ["block INT"]
+            if group_idx != "aln_idx":
+                add_cols.append(group_idx)
+            self._create_table(block_table, add_cols=add_cols,
+                               index=["[{}index]".format(block_table),
+                                      "{}, block".format(group_idx)])
+
+            self._column_blocks.add(block_table)
+
+        return block_table
+
+    def _iter_column_blocks(self, block_table, table_name, group_idx,
+                            long_idx, query):
+        """Generator over the column blocks of the long alignments.
+
+        The sequences of each alignment in `long_idx` are split into blocks
+        of `column_block_size` characters and stored in the column blocks
+        table (see `_get_column_blocks`), so that they can be retrieved
+        one block at a time, in order, with a single query. The blocks of
+        an alignment are removed once they are yielded, so that the table
+        never holds more than one alignment. When the sequences are grouped
+        by a column other than aln_idx, the groups may span several
+        alignments, and all alignments are split at once.
+
+        Parameters
+        ----------
+        block_table : str
+            Name of the column blocks table, as returned by
+            `_get_column_blocks`.
+        table_name : str
+            Name of the table with the sequence data.
+        group_idx : str
+            Name of the column that is used to group the sequences.
+        long_idx : list
+            Sorted `aln_idx` of the alignments longer than
+            `column_block_size`.
+        query : function
+            Formats the `iter_columns` query for a table, block column and
+            condition.
+
+        Yields
+        ------
+        row : tuple
+            Row of the `iter_columns` query, ordered by group and block.
+        """
+
+        extra_cols = ", {}".format(group_idx) if group_idx != "aln_idx" \
+            else ""
+        pack = pack_sequence if self.compact_storage else lambda x: x
+
+        if group_idx == "aln_idx":
+            batches = [[x] for x in long_idx]
+        else:
+            batches = [long_idx]
+
+        block_cur = self.con.cursor()
+
+        try:
+            for batch in batches:
+
+                for row in self.con.cursor().execute(
+                        "SELECT txId, taxon, seq, aln_idx{} FROM [{}] "
+                        "WHERE aln_idx IN ({})".format(
+                            extra_cols, table_name,
+                            ", ".join(str(x) for x in batch))):
+
+                    seq = unpack_sequence(row[2])
+
+                    block_cur.executemany(
+                        "INSERT INTO [{}] VALUES ({})".format(
+                            block_table, ", ".join(["?"] * len(row + (0,)))),
+                        ((row[0], row[1], pack(seq[i:i + column_block_size]),
+                          row[3], i // column_block_size) + row[4:]
+                         for i in xrange(0, len(seq), column_block_size)))
+
+                for row in block_cur.execute(query(tb=block_table,
+                                                   block=", block")):
+                    yield row
+
+                block_cur.execute("DELETE FROM [{}]".format(block_table))
+
+        finally:
+            self.con.cursor().execute("DELETE FROM [{}]".format(block_table))
+
     def iter_columns(self, table_name=None, aln_idx=None, include_taxa=False,
                      group_by=None):
+        """Generator over the alignment columns of a database table.
+
+        Parameters
+        ----------
+        table_name : str, optional
+            Name of the table from where the sequence data is fetched.
+            Falls back to the master table when it does not exist or is
+            empty.
+        aln_idx : int, optional
+            If provided, only the columns from this alignment are
+            retrieved.
+        include_taxa : bool, optional
+            If True, also yields the list of taxa for each column.
+        group_by : str, optional
+            Name of the column used to group the sequences (default is
+            "aln_idx").
+
+        Yields
+        ------
+        taxa : list
+            List of taxa for the column (only when `include_taxa` is True).
+        column : tuple
+            Characters of the alignment column.
+        idx : int
+            Value of the `group_by` column for the alignment column.
+
+        Notes
+        -----
+        The columns of alignments longer than `column_block_size` are
+        retrieved from the column blocks table (see `_iter_column_blocks`),
+        grouped by `group_by` and block. Only the sequences of a single
+        block are kept in memory at any given time, and the full sequences
+        are not read again for each block, so that retrieving all columns
+        scales linearly with the alignment length. The other alignments
+        are retrieved directly from the table. The groups are yielded in
+        order and the columns of each group are always yielded
+        contiguously.
+
+        Sequences in the compact encoding are decoded by the query itself,
+        with the `unpack_seq` SQL function.
+        """
 
         table_name = table_name if table_name else self.master_table
 
@@ -3185,51 +3969,69 @@ class AlignmentList(Base):
 
             query = "SELECT " \
                     "{tx} " \
-                    "GROUP_CONCAT(substr(seq, {pos}, 100000)), " \
-                    "{idx} " \
+                    "GROUP_CONCAT({seq}), " \
+                    "{idx}{block} " \
                     "FROM [{tb}] " \
                     "WHERE {cond} " \
                     "AND {cond_tx} " \
-                    "GROUP BY {idx}"
+                    "GROUP BY {idx}{block} " \
+                    "ORDER BY {idx}{block}"
 
             group_idx = group_by if group_by else "aln_idx"
 
+            if self.compact_storage:
+                query = query.replace("{seq}", "unpack_seq(seq)")
+            else:
+                query = query.replace("{seq}", "seq")
+
+            self._sync_active_sets()
+
             if aln_idx:
                 cond = "aln_idx={} ".format(aln_idx)
             else:
-                shelved = ", ".join([str(x) for x in self.shelved_idx])
-                cond = "aln_idx NOT in ({})".format(shelved)
+                cond = "aln_idx NOT IN (SELECT val FROM temp.shelved_idx)"
 
-            cond_tx = "taxon NOT IN ({})".format(", ".join(
-                ["'{}'".format(x) for x in self.shelved_taxa]))
+            cond_tx = "taxon NOT IN (SELECT val FROM temp.shelved_taxa)"
 
             if include_taxa:
                 tx_query = "GROUP_CONCAT(taxon),"
             else:
                 tx_query = ""
 
-            for p in xrange(0, self.size, 100000):
-                if include_taxa:
-                    for res in ((z, x.split(","), y) for z, x, y in
-                                self.cur.execute(
-                                    query.format(pos=p,
-                                                 tb=table_name,
-                                                 cond=cond,
-                                                 cond_tx=cond_tx,
-                                                 tx=tx_query,
-                                                 idx=group_idx))):
-                        for col in itertools.izip(*res[1]):
-                            yield res[0].split(","), col, res[2]
-                else:
-                    for res in ((x.split(","), y) for x, y in self.cur.execute(
-                            query.format(pos=p,
-                                         tb=table_name,
-                                         cond=cond,
-                                         cond_tx=cond_tx,
-                                         tx=tx_query,
-                                         idx=group_idx))):
-                        for col in itertools.izip(*res[0]):
-                            yield col, res[1]
+            query = functools.partial(query.format, cond_tx=cond_tx,
+                                      tx=tx_query, idx=group_idx)
+
+            # Alignments that fit in a single block are retrieved directly
+            # from the table. The others are grouped by block, in order,
+            # using the index of the column blocks table
+            long_idx = sorted(idx for idx, aln in self.alignment_idx.items()
+                              if aln.locus_length > column_block_size and
+                              (not aln_idx or idx == aln_idx))
+
+            if long_idx:
+                # The table must exist before the queries start
+                block_table = self._get_column_blocks(table_name, group_idx)
+                rows = heapq.merge(
+                    ((x[-1], 0, x) for x in self.cur.execute(query(
+                        tb=table_name, block="",
+                        cond="{} AND aln_idx NOT IN ({})".format(
+                            cond, ", ".join(str(x) for x in long_idx))))),
+                    ((x[-2], x[-1], x[:-1]) for x in self._iter_column_blocks(
+                        block_table, table_name, group_idx, long_idx,
+                        functools.partial(query, cond=cond))))
+                rows = (x[2] for x in rows)
+            else:
+                rows = self.cur.execute(query(tb=table_name, block="",
+                                              cond=cond))
+
+            if include_taxa:
+                for res in ((z, x.split(","), y) for z, x, y in rows):
+                    for col in itertools.izip(*res[1]):
+                        yield res[0].split(","), col, res[2]
+            else:
+                for res in ((x.split(","), y) for x, y in rows):
+                    for col in itertools.izip(*res[0]):
+                        yield col, res[1]
 
         finally:
             lock.release()
@@ -3253,6 +4055,26 @@ class AlignmentList(Base):
 
         cur.execute("CREATE INDEX aux_idx ON aux(aln_idx)")
 
+    def _pack_seq(self, seq):
+        """Encodes a sequence for storage in a derived table.
+
+        The tables created by the `AlignmentList` operations store their
+        sequences in the compact encoding (see `pack_sequence`) when
+        `compact_storage` is set, like the master table.
+
+        Parameters
+        ----------
+        seq : str
+            Sequence string.
+
+        Returns
+        -------
+        _ : str or buffer
+            Sequence to be stored in the `seq` column.
+        """
+
+        return pack_sequence(seq) if self.compact_storage else seq
+
     def _create_table(self, table_name, index=None, cur=None, add_cols=None):
         """Creates a new table in the database.
 
@@ -3327,6 +4149,143 @@ class AlignmentList(Base):
             "SELECT name FROM sqlite_master WHERE type='table' AND"
             " name='{}'".format(table_name)).fetchall()
 
+    def _load_selection_table(self, table_name, values):
+        """Loads a set of values into a temporary table.
+
+        The temporary table has a single `val` column and is created in
+        the `temp` schema of the database connection if it does not exist
+        yet. Any previous content is replaced by `values`. These tables are
+        used to perform set-based operations on the `alignment_data` table
+        with a single statement, using sub queries such as
+        ``taxon IN (SELECT val FROM temp.taxa_selection)``.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the temporary table.
+        values : iterable
+            Values (e.g. taxon names or `aln_idx`) that will be stored in
+            the table.
+        """
+
+        self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS [{}]"
+                         "(val PRIMARY KEY)".format(table_name))
+        self.cur.execute("DELETE FROM temp.[{}]".format(table_name))
+        self.cur.executemany("INSERT OR IGNORE INTO temp.[{}] VALUES (?)"
+                             .format(table_name), ((x,) for x in values))
+
+    def _get_selection_owner(self, table_name):
+        """Returns the `id` of the object that last wrote a temporary table.
+
+        Temporary tables belong to the database connection, which may be
+        shared by several `AlignmentList` objects (e.g., copies of the
+        same object). The `id` of the object that last wrote each table
+        kept by `_sync_selection_table` is stored in the
+        `selection_owner` temporary table.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the temporary table.
+
+        Returns
+        -------
+        _ : int
+            The `id` of the object, or None if the table was not written
+            yet.
+        """
+
+        try:
+            res = self.cur.execute(
+                "SELECT owner FROM temp.selection_owner WHERE name=?",
+                (table_name,)).fetchone()
+        except sqlite3.OperationalError:
+            return
+
+        return res[0] if res else None
+
+    def _sync_selection_table(self, table_name, values):
+        """Synchronizes a temporary table with a set of values.
+
+        Works like `_load_selection_table`, but the values currently in the
+        table are tracked in the `_selection_sets` attribute, so that only
+        the values added or removed since the last call are inserted or
+        deleted. The table is fully reloaded when it was last written by
+        another object sharing the database connection, or by the object
+        this one was copied from.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the temporary table.
+        values : iterable
+            Values that the table should hold.
+        """
+
+        values = set(values)
+        owner = id(self)
+
+        try:
+            current_owner, current = self._selection_sets[table_name]
+            if current_owner != owner or \
+                    self._get_selection_owner(table_name) != owner:
+                raise KeyError
+        except KeyError:
+            self._load_selection_table(table_name, values)
+
+            self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS selection_owner"
+                             "(name PRIMARY KEY, owner)")
+            self.cur.execute("INSERT OR REPLACE INTO temp.selection_owner "
+                             "VALUES (?, ?)", (table_name, owner))
+        else:
+            self.cur.executemany("DELETE FROM temp.[{}] WHERE val=?".format(
+                table_name), ((x,) for x in current - values))
+            self.cur.executemany("INSERT INTO temp.[{}] VALUES (?)".format(
+                table_name), ((x,) for x in values - current))
+
+        self._selection_sets[table_name] = (owner, values)
+
+    def _sync_active_sets(self):
+        """Updates the temporary tables with the 'active' data sets.
+
+        The `alignment_idx` keys, and the 'inactive' alignments and taxa
+        (`shelved_idx` and `shelved_taxa` attributes) are kept in temporary
+        tables with the same names, which are used by the queries of
+        `iter_alignments` and `iter_columns`.
+        """
+
+        self._sync_selection_table("alignment_idx", self.alignment_idx)
+        self._sync_selection_table("shelved_idx", self.shelved_idx)
+        self._sync_selection_table("shelved_taxa", self.shelved_taxa)
+
+    def _update_taxa_idx(self, func):
+        """Updates the `taxa_idx` of the selected alignments.
+
+        Applies `func` to the `taxa_idx` of each alignment in the
+        `aln_selection` temporary table (see `_load_selection_table`). The
+        `taxa_idx` are read from the `aux` table and written back with a
+        single query each.
+
+        Parameters
+        ----------
+        func : function
+            Function that receives a `taxa_idx` dictionary and modifies it
+            in place.
+        """
+
+        updates = []
+
+        for aln_idx, tx_idx in self.cur.execute(
+                "SELECT aln_idx, taxa_idx FROM aux WHERE aln_idx IN "
+                "(SELECT val FROM temp.aln_selection)").fetchall():
+
+            tx_idx = eval(tx_idx)
+            func(tx_idx)
+            updates.append((str(tx_idx), aln_idx))
+
+        self.cur.executemany("UPDATE aux SET taxa_idx=? WHERE aln_idx=?",
+                             updates)
+
     def _get_idx(self, aln_path):
         """Returns the `align_idx` for a given `aln_path`.
 
@@ -3489,11 +4448,141 @@ class AlignmentList(Base):
                 raise KillByUser("")
             ns.counter = ns.total = ns.msg = ns.sa = None
 
+    @staticmethod
+    def _stream_partial(ns, value, partial):
+        """Publishes intermediate results of long running statistics methods.
+
+        Statistics methods call this at each alignment so that partial
+        plot data can be shown while they are still running. Streaming is
+        only active when the Namespace object has the `stream_every`
+        attribute set to a positive integer, in which case the partial
+        results are published every `stream_every` alignments as a tuple
+        with the number of processed alignments, the expected total and the
+        plot data dictionary. This tuple is sent to the `stream_queue`
+        attribute of `ns`, if it is set to an object with a `put` method
+        (e.g. a `Queue.Queue`), or stored in the `partial_data` attribute
+        otherwise.
+
+        Parameters
+        ----------
+        ns : multiprocesssing.Manager.Namespace
+            A Namespace object used to communicate with the main thread
+            in TriFusion.
+        value : int
+            Number of alignments processed so far.
+        partial : function
+            Callable without arguments that returns the plot data
+            dictionary for the current partial results. It is only called
+            when the results are actually published.
+        """
+
+        if not ns or not value:
+            return
+
+        every = getattr(ns, "stream_every", None)
+        if not every or value % every:
+            return
+
+        res = (value, getattr(ns, "total", None), copy.deepcopy(partial()))
+
+        queue = getattr(ns, "stream_queue", None)
+        if queue is not None:
+            queue.put(res)
+        else:
+            ns.partial_data = res
+
     def aln_names(self):
         """Returns list of basenames of `alignments` file paths."""
 
         return sorted([basename(x) for x in self.alignments])
 
+    def get_plot_cache(self):
+        """Returns the `PlotCache` object used by the plotting methods.
+
+        Returns
+        -------
+        _ : PlotCache or None
+            The cache object associated with `plot_cache_dir`, or None if
+            the cache is disabled.
+        """
+
+        cache_dir = getattr(self, "plot_cache_dir", None)
+
+        if cache_dir:
+            return PlotCache.get_cache(cache_dir)
+
+    def _plot_cache_key(self, func, args, kwargs):
+        """Generates the `PlotCache` key of a plotting method call.
+
+        The key is a digest of the method name, its arguments (except the
+        `ns` Namespace object), and fingerprints of the active alignments,
+        active taxa and source table. The alignment fingerprint uses the
+        path, size and modification time of each active alignment file,
+        so that the key remains valid across different `AlignmentList`
+        instances (and TriStats runs) built from the same input files.
+        When the master table was changed by other operations after the
+        files were loaded, its version (see `_get_table_version`) is
+        added to the key.
+
+        Parameters
+        ----------
+        func : function
+            Plotting method.
+        args : tuple
+            Positional arguments of the method call, excluding `self`.
+        kwargs : dict
+            Keyword arguments of the method call.
+
+        Returns
+        -------
+        _ : str
+            Hexadecimal digest of the method call.
+        """
+
+        # Map positional arguments to their names so that the `ns`
+        # argument can be excluded whether or not it is provided as keyword
+        arg_names = inspect.getargspec(func).args[1:]
+        call_args = dict(zip(arg_names, args))
+        call_args.update(kwargs)
+        call_args.pop("ns", None)
+
+        try:
+            lock.acquire(True)
+            version = self._get_table_version(self.master_table)
+            if self._is_loaded_version():
+                table_fingerprint = None
+            else:
+                table_fingerprint = version
+        finally:
+            lock.release()
+
+        if not getattr(self, "_file_stats", None) or \
+                self._file_stats[0] != version:
+            self._file_stats = (version, {})
+        file_stats = self._file_stats[1]
+
+        aln_fingerprint = []
+        for aln in self.alignments.values():
+            if aln.path not in file_stats:
+                try:
+                    file_stat = os.stat(aln.path)
+                    file_stats[aln.path] = (file_stat.st_size,
+                                            int(file_stat.st_mtime))
+                except (OSError, TypeError):
+                    file_stats[aln.path] = None
+            aln_fingerprint.append((os.path.abspath(aln.path),
+                                    file_stats[aln.path], aln.locus_length))
+
+        key_data = (func.__name__,
+                    sorted(call_args.items()),
+                    aln_fingerprint,
+                    sorted(self.taxa_names),
+                    (self.master_table, table_fingerprint),
+                    self.sequence_code,
+                    self.gap_symbol)
+
+        return hashlib.sha1(repr(key_data)).hexdigest()
+
     def save_state(self, filepath):
 
         self.close_database()
@@ -3515,6 +4604,8 @@ class AlignmentList(Base):
         self.con.commit()
         self.con.close()
         self.con = self.cur = None
+        # Temporary tables are lost with the connection
+        self._selection_sets = {}
 
         for aln in self.all_alignments.values():
             aln.cur = None
@@ -3532,6 +4623,7 @@ class AlignmentList(Base):
         self.con = sqlite3.connect(self.sql_path, check_same_thread=False,
                                    timeout=0.0)
         self.cur = self.con.cursor()
+        self._set_sql_functions()
 
         for aln in self.all_alignments.values():
             aln.cur = self.cur
@@ -3553,11 +4645,29 @@ class AlignmentList(Base):
 
         self.cur = cur
         self.con = con
+        self._selection_sets = {}
+        self._set_sql_functions()
 
         for aln in self.all_alignments.values():
             aln.cur = cur
             aln.con = con
 
+    def _set_sql_functions(self):
+        """Registers the SQL functions used by the queries of the class.
+
+        The ``unpack_seq`` function decodes sequences stored in the compact
+        encoding (see `unpack_sequence`), so that they can be used directly
+        in queries such as those of `iter_columns`.
+        """
+
+        try:
+            self.con.create_function("unpack_seq", 1, unpack_sequence)
+        # Functions cannot be registered while the connection has pending
+        # statements. This only happens when the connection is shared with
+        # another object, which has already registered them
+        except sqlite3.OperationalError:
+            pass
+
     def get_tables(self):
         """Return list with `db_idx` of *all* `Alignment` objects.
 
@@ -3614,7 +4724,13 @@ class AlignmentList(Base):
         for table in self.temporary_tables:
             self.cur.execute("DROP TABLE [{}]".format(table))
 
+        for table in self._column_blocks:
+            if self._table_exists(table):
+                self.cur.execute("DROP TABLE [{}]".format(table))
+        self._column_blocks = set()
+
         self.cur.execute("DELETE FROM [{}]".format(self.master_table))
+        self._set_loaded_version()
         self.cur.execute("DELETE FROM aux")
 
         # Remove temporary json auxiliary files from Alignment objects
@@ -3700,6 +4816,8 @@ class AlignmentList(Base):
             self.shelved_idx = [idx for idx, aln in self.alignment_idx.items()
                                 if aln.path not in self.alignments]
 
+        self._sync_active_sets()
+
         # Update taxa names
         if not no_taxa_update:
             self.taxa_names = self._get_taxa_list()
@@ -3734,6 +4852,8 @@ class AlignmentList(Base):
             self.alignments[aln_name] = self.all_alignments[aln_name]
             self.shelved_idx.remove(self._get_idx(self.alignments[aln_name]))
 
+        self._sync_active_sets()
+
         # Update taxa names
         self.taxa_names = self._get_taxa_list()
 
@@ -3783,6 +4903,8 @@ class AlignmentList(Base):
                     except ValueError:
                         pass
 
+        self._sync_active_sets()
+
         # Update individual Alignment objects
         for aln_obj in self.alignments.values():
             aln_obj.shelve_taxa(self.shelved_taxa)
@@ -3986,6 +5108,10 @@ class AlignmentList(Base):
         if pbar:
             pbar.max_value = len(file_name_list)
 
+        # Whether the master table was only changed by adding alignment
+        # files so far
+        loaded = self._is_loaded_version()
+
         for p, aln_path in enumerate(file_name_list):
 
             # Progress bar update for command line version
@@ -4002,7 +5128,8 @@ class AlignmentList(Base):
 
             aln_obj = Alignment(aln_path, sql_cursor=self.cur,
                                 db_idx=self._idx, sql_con=self.con,
-                                temp_dir=os.path.dirname(self.sql_path))
+                                temp_dir=os.path.dirname(self.sql_path),
+                                compact_storage=self.compact_storage)
 
             if aln_obj.e:
                 aln_obj.remove_alignment()
@@ -4039,6 +5166,9 @@ class AlignmentList(Base):
                 self.alignment_idx[self._idx] = aln_obj
                 self._idx += 1
 
+        if loaded:
+            self._set_loaded_version()
+
     def retrieve_alignment(self, name):
         """Return `Alignment` object with a given `name`.
 
@@ -4235,7 +5365,7 @@ class AlignmentList(Base):
                                msg="Concatenating taxon {}".format(tx))
 
             self.cur.execute("INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                table_out), (idx, tx, seq, aln_idx))
+                table_out), (idx, tx, self._pack_seq(seq), aln_idx))
 
         # Variable that will store the length of the concatenated alignment
         # and provided it when initializing the Alignment object
@@ -4514,7 +5644,7 @@ class AlignmentList(Base):
             # Add data to
             temp_cur.execute(
                 "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(temp_table),
-                (txId, taxon, final_seq, aln_idx))
+                (txId, taxon, self._pack_seq(final_seq), aln_idx))
 
         # Perform partition correction on the last loop element
         if aln_obj:
@@ -4577,7 +5707,8 @@ class AlignmentList(Base):
                 seq = aln.sequence_code[1] * len(seq)
                 temp_cur.execute(
                     "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                        temp_table), (txId, taxon, seq, aln_idx))
+                        temp_table),
+                    (txId, taxon, self._pack_seq(seq), aln_idx))
 
                 continue
 
@@ -4594,7 +5725,7 @@ class AlignmentList(Base):
 
             temp_cur.execute(
                 "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(temp_table),
-                (txId, taxon, "".join(seq), aln_idx))
+                (txId, taxon, self._pack_seq("".join(seq)), aln_idx))
 
         # Check if input and output tables are the same. If they are,
         # drop the old table and replace with this new one
@@ -4696,7 +5827,7 @@ class AlignmentList(Base):
 
             temp_cur.execute(
                 "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(temp_table),
-                (txId, taxon, final_seq, aln_idx))
+                (txId, taxon, self._pack_seq(final_seq), aln_idx))
 
         if aln_obj:
             aln_obj.locus_length = len(final_seq)
@@ -4885,8 +6016,9 @@ class AlignmentList(Base):
             len(self.alignments) - len(active_alns)
 
         # Update _partitions
+        active_set = set(active_alns)
         filtered_alns = [x.path for x in self.alignments.values()
-                         if x.path not in active_alns]
+                         if x.path not in active_set]
         self.partitions.remove_partition(file_list=filtered_alns)
         # Update active files
         self.update_active_alignments(active_alns)
@@ -5037,8 +6169,9 @@ class AlignmentList(Base):
             len(self.alignments) - len(active_alns)
 
         # Update _partitions
+        active_set = set(active_alns)
         filtered_alns = [x.path for x in self.alignments.values()
-                         if x.path not in active_alns]
+                         if x.path not in active_set]
         self.partitions.remove_partition(file_list=filtered_alns)
         # Update active files
         self.update_active_alignments(active_alns)
@@ -5082,25 +6215,65 @@ class AlignmentList(Base):
         except (IOError, IndexError):
             pass
 
-        for alignment_obj in list(self.alignments.values()):
-            alignment_obj.remove_taxa(taxa_list, mode=mode)
+        taxa_set = set(taxa_list)
+
+        # Remove the taxa from all active alignments with a single statement
+        self._load_selection_table("taxa_selection", taxa_set)
+        self._load_selection_table(
+            "aln_selection", (x.db_idx for x in self.alignments.values()))
+
+        self.cur.execute(
+            "DELETE FROM alignment_data WHERE "
+            "aln_idx IN (SELECT val FROM temp.aln_selection) AND "
+            "taxon {} (SELECT val FROM temp.taxa_selection)".format(
+                "IN" if mode == "remove" else "NOT IN"))
+
+        def remove(tx_idx):
+            for tx in [x for x in tx_idx if
+                       (x in taxa_set) == (mode == "remove")]:
+                del tx_idx[tx]
+
+        self._update_taxa_idx(remove)
 
         # Updates taxa names
         if mode == "remove":
-            for tx in taxa_list:
-                try:
-                    self.taxa_names.remove(tx)
-                except ValueError:
-                    # TODO: log a warning
-                    pass
+            self.taxa_names = [tx for tx in self.taxa_names
+                               if tx not in taxa_set]
         elif mode == "inverse":
-            self.taxa_names = [tx for tx in taxa_list if tx in self.taxa_names]
+            current_taxa = set(self.taxa_names)
+            self.taxa_names = [tx for tx in taxa_list if tx in current_taxa]
 
     def change_taxon_name(self, old_name, new_name):
-        """Changes the name of a taxon. """
+        """Changes the name of a taxon.
+
+        The taxon is renamed in all active alignments with a single
+        statement.
+
+        Parameters
+        ----------
+        old_name : str
+            Original taxon name.
+        new_name : str
+            New taxon name.
+
+        See Also
+        --------
+        Alignment.change_taxon_name
+        """
+
+        self._load_selection_table(
+            "aln_selection", (x.db_idx for x in self.alignments.values()))
+
+        self.cur.execute(
+            "UPDATE alignment_data SET taxon=? WHERE taxon=? AND "
+            "aln_idx IN (SELECT val FROM temp.aln_selection)",
+            (new_name, old_name))
 
-        for alignment_obj in list(self.alignments.values()):
-            alignment_obj.change_taxon_name(old_name, new_name)
+        def rename(tx_idx):
+            if old_name in tx_idx:
+                tx_idx[new_name] = tx_idx.pop(old_name)
+
+        self._update_taxa_idx(rename)
 
         # update taxa names
         self.taxa_names = [new_name if x == old_name else x
@@ -5181,25 +6354,39 @@ class AlignmentList(Base):
         except EnvironmentError:
             pass
 
+        taxa_set = set(taxa_list)
+
+        # Count, for each alignment, the total number of taxa and the number
+        # of taxa in taxa_list with a single query
+        self._load_selection_table("taxa_selection", taxa_set)
+        self._load_selection_table(
+            "aln_selection", (x.db_idx for x in self.alignments.values()))
+
+        counts = dict((aln_idx, (total, found)) for aln_idx, total, found in
+                      self.cur.execute(
+            "SELECT aln_idx, COUNT(*), "
+            "SUM(taxon IN (SELECT val FROM temp.taxa_selection)) "
+            "FROM alignment_data WHERE "
+            "aln_idx IN (SELECT val FROM temp.aln_selection) "
+            "GROUP BY aln_idx"))
+
         for alignment_obj in self.alignments.values():
 
-            alignment_taxa = alignment_obj.taxa_idx.keys()
+            total, found = counts.get(alignment_obj.db_idx, (0, 0))
 
             # Selected only the alignments with the exact same taxa
             if mode == "strict":
-                if set(taxa_list) == set(alignment_taxa):
+                if found == total == len(taxa_set):
                     selected_alignments.append(alignment_obj)
 
             # Selected alignments that include the specified taxa
             if mode == "inclusive":
-                if set(taxa_list) - set(alignment_taxa) == set():
+                if found == len(taxa_set):
                     selected_alignments.append(alignment_obj)
 
             if mode == "relaxed":
-                for taxon in taxa_list:
-                    if taxon in alignment_taxa:
-                        selected_alignments.append(alignment_obj)
-                        continue
+                if found:
+                    selected_alignments.append(alignment_obj)
 
         return selected_alignments
 
@@ -5233,133 +6420,46 @@ class AlignmentList(Base):
         Alignment.code_gaps
         """
 
-        def gap_listing(sequence):
-            """ Function that parses a sequence string and returns the
-            position of indel events. The returned list is composed of
-            tuples with the span of each indel """
-
-            gap = "-+"
-            gap_list = []
-
-            for gobj in re.finditer(gap, sequence):
-                
-                gap_list.append((gobj.start(), gobj.end()))
-            
-            return gap_list
-
-        def gap_binary_generator(sequence, gap_list, ns):
-            """ This function contains the algorithm to construct the binary
-             state block for the indel events """
-
-            binary_states = []
-
-            for span in gap_list:
-
-                self._check_killswitch(ns)
-
-                substr = sequence[span[0]:span[1]]
-
-                # Check if the entire span is only gaps
-                if set(substr) == {"-"}:
-
-                    if span[0] < 0:
-                        prev = "n"
-                    else:
-                        prev = sequence[span[0] - 1]
-
-                    try:
-                        aft = sequence[span[1]]
-                    except IndexError:
-                        aft = "n"
-
-                    # Check if the boundary positions of the span are gaps
-                    # or not. The score 1 will only be given to spans that
-                    # contain only gaps and are surrounded by non gaps.
-                    # If there are gaps surrounding, then the score is "-"
-                    if prev != "-" and aft != "-":
-                        binary_states.append("1")
-                    else:
-                        binary_states.append("-")
-
-                else:
-                    binary_states.append("0")
-
-            sequence = "".join([sequence, "".join(binary_states)])
-
-            return sequence
-
         if use_main_table:
             table_in = table_out = self.master_table
 
         # Set progress pipes
         self._set_pipes(ns, pbar, total=len(self.alignments))
 
-        # Storage of gaps positions for each alignment
-        master_gaps = {}
-
-        # Get the complete gap positions for each alignment and store it in
-        # the master_gaps dict
-        prev_idx = ""
-        for taxon, seq, aln_idx in self.iter_alignments(table_in):
-
-            if prev_idx != aln_idx:
-
-                if prev_idx:
-                    master_gaps[prev_idx] = complete_gap_list
-
-                complete_gap_list = []
-
-                prev_idx = aln_idx
-
-            current_list = gap_listing(seq)
-            complete_gap_list += [gap for gap in current_list if gap not in
-                                  complete_gap_list]
-
-        if aln_idx:
-            master_gaps[aln_idx] = complete_gap_list
-
         # Create temporary table
         temp_table = ".codegaps"
+        if self._table_exists(temp_table):
+            self.cur.execute("DROP TABLE [{}]".format(temp_table))
         self._create_table(temp_table)
-        c = 1
 
         # Create temporary cursor for database
         temp_cur = self.con.cursor()
 
-        prev_idx = ""
-        for txId, taxon, seq, aln_idx in self.iter_alignments(
-                table_in, include_txid=True):
-
-            if prev_idx != aln_idx:
+        # The sequences of each alignment are coded at once, so that the
+        # alignment data is only read a single time
+        for c, (aln_idx, rows) in enumerate(itertools.groupby(
+                self.iter_alignments(table_in, include_txid=True),
+                key=lambda x: x[3]), 1):
 
-                if prev_idx:
-                    if len(master_gaps[prev_idx]):
-                        aln_obj.restriction_range = "{}-{}".format(
-                            int(aln_obj.locus_length) + 1,
-                            len(master_gaps[prev_idx]) +
-                            int(aln_obj.locus_length))
-                        aln_obj.locus_length += len(master_gaps[prev_idx])
-
-                aln_obj = self.alignment_idx[aln_idx]
+            self._check_killswitch(ns)
 
-                self._update_pipes(ns, pbar, value=c)
-                c += 1
+            rows = list(rows)
+            aln_obj = self.alignment_idx[aln_idx]
 
-                prev_idx = aln_idx
+            self._update_pipes(ns, pbar, value=c)
 
-            final_seq = gap_binary_generator(seq, master_gaps[aln_idx], ns)
+            gap_number, states = self._get_gap_states([x[2] for x in rows])
 
-            temp_cur.execute(
-                "INSERT INTO [.codegaps] VALUES (?, ?, ?, ?)",
-                (txId, taxon, final_seq, aln_idx))
+            temp_cur.executemany(
+                "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(temp_table),
+                [(txId, taxon, self._pack_seq(seq + st), aln_idx) for
+                 (txId, taxon, seq, _), st in itertools.izip(rows, states)])
 
-        if prev_idx:
-            if len(master_gaps[aln_idx]):
+            if gap_number:
                 aln_obj.restriction_range = "{}-{}".format(
                     int(aln_obj.locus_length) + 1,
-                    len(master_gaps[aln_idx]) +
-                    int(aln_obj.locus_length))
-                aln_obj.locus_length += len(master_gaps[prev_idx])
+                    gap_number + int(aln_obj.locus_length))
+                aln_obj.locus_length += gap_number
 
         if self._table_exists(table_out):
             self.cur.execute("DROP TABLE [{}];".format(table_out))
@@ -5370,6 +6470,89 @@ class AlignmentList(Base):
 
         self._reset_pipes(ns)
 
+    @staticmethod
+    def _get_gap_states(sequences, gap_symbol="-"):
+        """Codes the indel events of a set of aligned sequences.
+
+        Implements the simple indel coding used by `code_gaps`. Each
+        unique gap span (indel event) found in the sequences becomes a
+        binary character, in order of first occurrence. For each sequence,
+        the character is coded as "1" if the sequence has a gap with that
+        exact span, "-" if the span is part of a larger gap, and "0"
+        otherwise.
+
+        The gap runs of all sequences are detected at once from the
+        boundaries of the gap mask. Unique spans are found with
+        `numpy.unique` over an integer encoding of (start, end), and the
+        state of every sequence and span is obtained by a sorted search
+        for the gap run of the sequence that starts at or before the span.
+
+        Parameters
+        ----------
+        sequences : list
+            List with the sequence strings.
+        gap_symbol : str
+            Gap symbol.
+
+        Returns
+        -------
+        gap_number : int
+            Number of unique gap spans.
+        states : list
+            List with the string of binary states for each sequence.
+        """
+
+        mtx = np.array(sequences, dtype="S").view(np.uint8).reshape(
+            len(sequences), -1)
+        nseq, length = mtx.shape
+
+        # Gap runs start where the padded gap mask goes from 0 to 1 and end
+        # where it goes from 1 to 0. Both are listed in the same order, by
+        # sequence and position.
+        mask = np.zeros((nseq, length + 2), dtype=np.int8)
+        mask[:, 1:-1] = mtx == ord(gap_symbol)
+        edges = np.diff(mask, axis=1)
+        run_seq, run_start = np.nonzero(edges == 1)
+        run_end = np.nonzero(edges == -1)[1]
+
+        if not len(run_start):
+            return 0, [""] * nseq
+
+        # Unique spans, sorted by order of occurrence
+        width = length + 1
+        spans, first = np.unique(run_start * width + run_end,
+                                 return_index=True)
+        spans = spans[np.argsort(first)]
+        span_start, span_end = spans // width, spans % width
+
+        run_keys = run_seq * width + run_start
+
+        # Sequences are processed in blocks to limit the size of the
+        # sequence by span matrices
+        states = np.empty((nseq, len(spans)), dtype=np.uint8)
+        block = max(1, 1000000 // len(spans))
+
+        for i in xrange(0, nseq, block):
+
+            seq_idx = np.arange(i, min(i + block, nseq))[:, np.newaxis]
+
+            # Last gap run of each sequence that starts at, or before, the
+            # start of each span
+            run = np.searchsorted(run_keys, seq_idx * width + span_start,
+                                  side="right") - 1
+            found = run >= 0
+            run = np.maximum(run, 0)
+
+            covered = found & (run_seq[run] == seq_idx) & \
+                (run_end[run] >= span_end)
+            exact = covered & (run_start[run] == span_start) & \
+                (run_end[run] == span_end)
+
+            states[i:i + block] = np.where(
+                exact, ord("1"), np.where(covered, ord("-"), ord("0")))
+
+        return len(spans), [x.tostring() for x in states]
+
     @staticmethod
     def write_loci_correspondence(hap_dict, output_file, dest="./"):
         """Writes the file mapping taxa to unique haplotypes for `collapse`.
@@ -5385,17 +6568,101 @@ class AlignmentList(Base):
             Path to directory where the `output_file` will be written.
         """
 
-        output_handle = open(join(dest, output_file + ".haplotypes"), "w")
+        with open(join(dest, output_file + ".haplotypes"), "w") as fh:
+            fh.write("".join("%s: %s\n" % (haplotype, "; ".join(taxa_list))
+                             for haplotype, taxa_list in
+                             sorted(hap_dict.items())))
+
+    @staticmethod
+    def _get_haplotypes(sequences, ignore_missing=False, missing_symbol="n",
+                        gap_symbol="-"):
+        """Finds the unique haplotypes of a set of aligned sequences.
+
+        The sequences are converted into a matrix of character codes and
+        identical rows are detected at once with `numpy.unique`, which
+        compares the complete rows (not their hashes) and is therefore
+        free of collisions and independent of the Python session.
+        Haplotypes are sorted by the first sequence in which they occur.
+
+        When `ignore_missing` is True, missing data and gaps are treated
+        as wildcards, so that two sequences belong to the same haplotype
+        if they are equal in all positions where both have data. Since
+        this relation is not transitive, each sequence is assigned to the
+        first compatible haplotype (in order of occurrence) and the
+        sequence of that haplotype is completed with the data of its new
+        member.
 
-        for haplotype, taxa_list in sorted(hap_dict.items()):
-            output_handle.write("%s: %s\n" % (haplotype, "; ".join(taxa_list)))
+        Parameters
+        ----------
+        sequences : list
+            List with the sequence strings.
+        ignore_missing : bool
+            If True, missing data and gap characters are wildcards.
+        missing_symbol : str
+            Missing data symbol.
+        gap_symbol : str
+            Gap symbol.
 
-        output_handle.close()
+        Returns
+        -------
+        haplotypes : list
+            List of tuples, one for each haplotype, with the haplotype
+            sequence and the list of indexes of its sequences in
+            `sequences`.
+        """
+
+        mtx = np.array(sequences, dtype="S").view(np.uint8).reshape(
+            len(sequences), -1)
+
+        if not ignore_missing:
+            rows = np.ascontiguousarray(mtx).view(
+                np.dtype((np.void, mtx.shape[1])))
+            _, first, inverse = np.unique(rows, return_index=True,
+                                          return_inverse=True)
+            # Sort haplotypes by order of occurrence
+            hap_order = np.argsort(first)
+            members = [[] for _ in hap_order]
+            rank = np.empty(len(hap_order), dtype=int)
+            rank[hap_order] = np.arange(len(hap_order))
+            for i, h in enumerate(inverse.ravel()):
+                members[rank[h]].append(i)
+
+            return [(sequences[first[h]], members[p])
+                    for p, h in enumerate(hap_order)]
+
+        wildcard = (mtx == ord(missing_symbol)) | (mtx == ord(gap_symbol))
+
+        # There are at most as many haplotypes as sequences, so the
+        # haplotype matrices are allocated once and only their first
+        # len(members) rows are used
+        hap_seqs = np.empty_like(mtx)
+        hap_wild = np.empty_like(wildcard)
+        members = []
+
+        for i in xrange(mtx.shape[0]):
+
+            n = len(members)
+            compatible = ((hap_seqs[:n] == mtx[i]) | hap_wild[:n] |
+                          wildcard[i]).all(axis=1)
+
+            if compatible.any():
+                h = np.argmax(compatible)
+                # Complete the haplotype sequence with the new data
+                fill = hap_wild[h] & ~wildcard[i]
+                hap_seqs[h][fill] = mtx[i][fill]
+                hap_wild[h] &= wildcard[i]
+                members[h].append(i)
+            else:
+                hap_seqs[n] = mtx[i]
+                hap_wild[n] = wildcard[i]
+                members.append([i])
+
+        return [(x.tostring(), m) for x, m in zip(hap_seqs, members)]
 
     def collapse(self,  write_haplotypes=True, haplotypes_file=None,
                  dest=".", conversion_suffix="", haplotype_name="Hap",
                  table_in=None, table_out="collapsed", use_main_table=False,
-                 ns=None, pbar=None):
+                 ignore_missing=False, ns=None, pbar=None):
         """Collapses equal sequences for each `Alignment` object.
 
         This wraps the execution of `collapse` method for
@@ -5430,6 +6697,11 @@ class AlignmentList(Base):
             If True, both `table_in` and `table_out` are ignore and the main
             table `Alignment.db_idx` is used as the input and output
             table (default is False).
+        ignore_missing : bool
+            If True, missing data and gaps are ignored when comparing
+            sequences, that is, sequences that only differ in positions
+            with missing data or gaps are collapsed into the same haplotype
+            (default is False). See `_get_haplotypes`.
         ns : multiprocesssing.Manager.Namespace
             A Namespace object used to communicate with the main thread
             in TriFusion.
@@ -5441,6 +6713,36 @@ class AlignmentList(Base):
         Alignment.collapse
         """
 
+        def add_haplotypes():
+
+            # The missing data symbol may be unavailable for the
+            # alignments resulting from other operations (e.g. concatenation)
+            code = aln_obj.sequence_code
+            missing = code[1] if len(code) > 1 and code[1] else \
+                ("n" if code[0] == "DNA" else "x")
+
+            haplotypes = self._get_haplotypes(
+                sequences, ignore_missing, missing, self.gap_symbol)
+
+            hap_dic = {}
+            rows = []
+            for p, (seq, members) in enumerate(haplotypes):
+                haplotype = u"{}_{}".format(haplotype_name, p + 1)
+                hap_dic[haplotype] = [taxa[x] for x in members]
+                rows.append((p, haplotype, self._pack_seq(seq), prev_idx))
+
+            temp_cur.executemany(
+                "INSERT INTO [.collapsed] VALUES (?, ?, ?, ?)", rows)
+
+            # Write the haplotypes file for the alignment
+            if write_haplotypes:
+                if not haplotypes_file:
+                    hf = aln_obj.sname + conversion_suffix
+                else:
+                    hf = haplotypes_file
+
+                self.write_loci_correspondence(hap_dic, hf, dest)
+
         if use_main_table:
             table_out = table_in = self.master_table
 
@@ -5455,7 +6757,9 @@ class AlignmentList(Base):
         # Set temporary cursor to perform database changes while querying
         temp_cur = self.con.cursor()
 
+        # The sequences of each alignment are gathered and collapsed at once
         prev_idx = ""
+        taxa, sequences = [], []
         for taxon, seq, aln_idx in self.iter_alignments(table_in):
 
             # This happens when the alignment changes during the iteration.
@@ -5465,58 +6769,19 @@ class AlignmentList(Base):
                 c += 1
 
                 if prev_idx:
-                    # Write the haplotypes file for the previous alignment
-                    if write_haplotypes:
-                        if not haplotypes_file:
-                            hf = aln_obj.sname + conversion_suffix
-                        else:
-                            hf = haplotypes_file
-
-                        self.write_loci_correspondence(hap_dic, hf, dest)
+                    add_haplotypes()
 
                 aln_obj = self.alignment_idx[aln_idx]
-
-                # Dict that will store the hashes of each sequence. It will
-                # be used to check if the current sequence has already been
-                # processed. The value will be the haplotype
-                hash_list = {}
-
-                # hap_dic will store the haplotype name as key and a list of
-                # the taxa with the same sequence as a list value
-                hap_dic = {}
-                hap_counter = 0
+                taxa, sequences = [], []
 
                 prev_idx = aln_idx
 
-            cur_hash = hash(seq)
-            
-            if cur_hash not in hash_list:
-
-                # Create name for new haplotype and update other haplotype
-                # related variables
-                haplotype = "{}_{}".format(haplotype_name, hap_counter + 1)
-                hash_list[cur_hash] = haplotype
-                hap_dic[haplotype] = [taxon]
+            taxa.append(taxon)
+            sequences.append(seq)
 
-                # Add data to table
-                temp_cur.execute(
-                    "INSERT INTO [.collapsed] VALUES (?, ?, ?, ?)",
-                    (hap_counter, unicode(haplotype), seq, aln_idx))
-
-                hap_counter += 1
-
-            else:
-
-                hap_dic[hash_list[cur_hash]].append(taxon)
-
-        # Write haplotypes for the last alignment
-        if aln_obj:
-            if write_haplotypes:
-                if not haplotypes_file:
-                    hf = aln_obj.sname + conversion_suffix
-                else:
-                    hf = haplotypes_file
-                self.write_loci_correspondence(hap_dic, hf, dest)
+        # Collapse the last alignment
+        if prev_idx:
+            add_haplotypes()
 
         # The collapse operation is special in the sense that the former taxon
         # names are no longer valid. Therefore, we drop the previous table and
@@ -5530,6 +6795,95 @@ class AlignmentList(Base):
 
         self._reset_pipes(ns)
 
+    @staticmethod
+    def _get_consensus(sequences, consensus_type, sequence_code,
+                       gap_symbol="-"):
+        """Gets the consensus sequence of a set of aligned sequences.
+
+        The sequences are converted into a matrix of character codes, so
+        that the variation of all columns is resolved at once with
+        vectorized masks. Columns that are invariable (including those
+        with only missing data or gaps) keep their character, columns with
+        a single character besides missing data and gaps get that
+        character and columns with only missing data and gaps get the
+        missing data symbol. The remaining variable columns are resolved
+        according to `consensus_type`:
+
+          - "IUPAC": For DNA sequences, each character is converted into
+            its 4-bit mask (see `process.base.iupac_bits`) and the IUPAC
+            code of the column is obtained from the bitwise OR of all
+            masks. For protein sequences, the most common residue of the
+            column is used.
+          - "Soft mask": The column is replaced by missing data.
+          - "Remove": The column is removed.
+
+        Parameters
+        ----------
+        sequences : list
+            List with the sequence strings.
+        consensus_type : {"IUPAC", "Soft mask", "Remove"}
+            Type of variation handling.
+        sequence_code : list
+            Sequence type and missing data symbol of the sequences.
+        gap_symbol : str
+            Gap symbol of the sequences.
+
+        Returns
+        -------
+        _ : str
+            Consensus sequence.
+        """
+
+        missing_symbol = sequence_code[1] if len(sequence_code) > 1 and \
+            sequence_code[1] else ("n" if sequence_code[0] == "DNA" else "x")
+
+        # Matrix of character codes with sequences as rows. Sequences
+        # shorter than the longest are padded with null characters, which
+        # are treated as missing data
+        mtx = np.array(sequences, dtype="S").view(np.uint8).reshape(
+            len(sequences), -1)
+        cols = np.arange(mtx.shape[1])
+
+        missing = (mtx == ord(missing_symbol)) | (mtx == ord(gap_symbol)) | \
+            (mtx == 0)
+
+        # Invariable columns, including those with only missing data
+        invariable = (mtx == mtx[0]).all(axis=0)
+        # Columns with at least one character that is not missing data
+        has_data = ~missing.all(axis=0)
+        # First character of each column that is not missing data
+        ref = mtx[np.argmax(~missing, axis=0), cols]
+        # Columns with a single character besides missing data
+        single = ((mtx == ref) | missing).all(axis=0)
+
+        consensus = np.where(has_data, ref, ord(missing_symbol)).astype(
+            np.uint8)
+        consensus[invariable] = mtx[0][invariable]
+
+        variable = ~invariable & has_data & ~single
+
+        if variable.any():
+
+            if consensus_type == "IUPAC":
+                if sequence_code[0] == "DNA":
+                    bits = np.where(missing[:, variable], 0,
+                                    nt_to_bits[mtx[:, variable]])
+                    consensus[variable] = bits_to_nt[
+                        np.bitwise_or.reduce(bits, axis=0)]
+                else:
+                    for i in cols[variable]:
+                        chars, counts = np.unique(
+                            mtx[:, i][~missing[:, i]], return_counts=True)
+                        consensus[i] = chars[np.argmax(counts)]
+
+            elif consensus_type == "Soft mask":
+                consensus[variable] = ord(missing_symbol)
+
+            elif consensus_type == "Remove":
+                consensus = consensus[~variable]
+
+        return consensus.tostring()
+
     def consensus(self, consensus_type, single_file=False, table_in=None,
                   table_out=None, use_main_table=False, ns=None,
                   pbar=None):
@@ -5579,7 +6933,7 @@ class AlignmentList(Base):
             # Get first sequence and set the skip flag to True
             temp_cur.execute(
                 "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                    temp_table), (txid, tx, s, fidx))
+                    temp_table), (txid, tx, self._pack_seq(s), fidx))
 
             seq_len = len(s)
 
@@ -5680,18 +7034,18 @@ class AlignmentList(Base):
             self._set_pipes(ns, pbar, total=len(self.alignments))
             c = 1
 
+            # The sequences of each alignment are gathered and the
+            # consensus is obtained for all columns at once
             prev_idx = ""
-            for column, aln_idx in self.iter_columns(table_in):
+            sequences = []
+            for taxon, seq, aln_idx in self.iter_alignments(table_in):
 
                 if aln_idx != prev_idx:
 
-                    aln = self.alignment_idx[aln_idx]
-
-                    missing_symbols = [aln.sequence_code[1], "-"]
-
                     if prev_idx:
-
-                        final_seq = "".join(consensus_seq)
+                        final_seq = self._get_consensus(
+                            sequences, consensus_type, aln.sequence_code,
+                            self.gap_symbol)
 
                         if single_file:
                             add_to_database(c - 1, aln_name, final_seq,
@@ -5700,14 +7054,15 @@ class AlignmentList(Base):
                             add_to_database(0, "consensus", final_seq,
                                             final_idx, aln_name)
 
-                    # Empty consensus sequence
-                    consensus_seq = []
+                    sequences = []
+
+                    aln = self.alignment_idx[aln_idx]
 
                     # Set final aln_idx. When single_file is set to True, all
                     # final aln_idx are 1. Else, the original aln_idx is used.
                     final_idx = 1 if single_file else aln_idx
 
-                    aln_name = self.alignment_idx[aln_idx].name
+                    aln_name = aln.name
 
                     self._update_pipes(
                         ns, pbar, value=c,
@@ -5716,49 +7071,12 @@ class AlignmentList(Base):
 
                     prev_idx = aln_idx
 
-                column = set(column)
-
-                # If invariable, include in consensus and skip. Increases speed
-                # when there are no missing or gap characters
-                if len(column) == 1:
-                    consensus_seq.append(column.pop())
-                    continue
-
-                # Remove missing data and gaps
-                column = [x for x in column if x not in missing_symbols]
-
-                # In case there is only missing/gap characters
-                if not column:
-                    consensus_seq.append(aln.sequence_code[1])
-                    continue
-
-                # Check for invariable without missing data
-                if len(column) == 1:
-                    consensus_seq.append(column[0])
-                    continue
-
-                if consensus_type == "IUPAC":
-                    # Convert variation into IUPAC code
-                    try:
-                        consensus_seq.append(iupac["".join(column)])
-                    except KeyError:
-                        iupac_code = sorted(set(list(
-                            itertools.chain.from_iterable(
-                                [x if x in dna_chars else iupac_rev[x]
-                                 for x in column]))))
-                        consensus_seq.append(iupac["".join(iupac_code)])
-                    continue
-
-                elif consensus_type == "Soft mask":
-                    consensus_seq.append(aln.sequence_code[1])
-                    continue
-
-                elif consensus_type == "Remove":
-                    continue
+                sequences.append(seq)
 
             if prev_idx:
-                aln_name = self.alignment_idx[aln_idx].name
-                final_seq = "".join(consensus_seq)
+                final_seq = self._get_consensus(
+                    sequences, consensus_type, aln.sequence_code,
+                    self.gap_symbol)
                 if single_file:
                     add_to_database(c - 1, aln_name, final_seq,
                                     final_idx, aln_name)
@@ -5850,129 +7168,243 @@ class AlignmentList(Base):
 
         taxa_idx_master = defaultdict(dict)
 
-        rev_aln_idx = OrderedDict()
-        alns = OrderedDict()
+        rev_aln_idx = OrderedDict()
+        alns = OrderedDict()
+
+        # Create temporary table
+        temp_table = ".reversedata"
+        if self._table_exists(temp_table):
+            self.cur.execute("DROP TABLE [{}]".format(temp_table))
+        self._create_table(temp_table, index=("revindex", "aln_idx"))
+
+        temp_cur = self.con.cursor()
+
+        slices = self._get_reverse_slices()
+
+        for p, taxon, parts in self._iter_reverse_slices(slices, table_in):
+
+            self._update_pipes(ns, pbar, value=p + 1, ignore_sa=True,
+                               msg="Processing taxon {}".format(taxon))
+
+            for part_idx, part_seq in parts:
+                taxa_idx_master[slices[part_idx][0]][taxon] = p
+
+            # The index of the partition in slices is 0-based, but the
+            # aln_idx of the reversed alignments is 1-based
+            temp_cur.executemany(
+                "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(temp_table),
+                [(p, taxon, self._pack_seq(part_seq), part_idx + 1)
+                 for part_idx, part_seq in parts])
+
+        if self._table_exists(table_out):
+            self.cur.execute("DROP TABLE [{}];".format(table_out))
+
+        # Copy the data ordered by aln_idx, so that the sequences of each
+        # reversed alignment are retrieved contiguously
+        self._create_table(table_out, index=("finalrevindex", "aln_idx"))
+        self.cur.execute(
+            "INSERT INTO [{}] (txId, taxon, seq, aln_idx) "
+            "SELECT txId, taxon, seq, aln_idx "
+            "FROM [{}] "
+            "ORDER BY aln_idx".format(table_out, temp_table))
+
+        self.cur.execute("DROP TABLE [{}]".format(temp_table))
+
+        for part_idx, (name, part_len, _, _, _) in enumerate(slices, 1):
+
+            p = Partitions()
+            p.add_partition(name, length=part_len)
+
+            saln = add_alignment(name, part_len,
+                                 taxa_idx=taxa_idx_master[name], part=p)
+
+            alns[name] = saln
+            rev_aln_idx[part_idx] = saln
+
+        self.alignments = alns
+        self.all_alignments = alns
+        self.alignment_idx = rev_aln_idx
+
+    def _get_reverse_slices(self):
+        """Returns the slices of each reverse concatenated alignment.
 
-        # Create temporary table
-        temp_table = ".reversedata"
-        self._create_table(temp_table, index=("revindex", "aln_idx"))
+        The slices are computed once from the `partitions` attribute, so
+        that the reverse concatenation only has to apply them to each
+        sequence. Partitions with codon positions result in three slices,
+        one per codon position, named `<partition>_codon_<position>`.
 
-        temp_cur = self.con.cursor()
+        Returns
+        -------
+        slices : list
+            List of tuples with the name of the reversed alignment, its
+            length, and the start, stop and step of the slice.
+        """
 
         # Get corrected partition names for sqlite database
         part_map = self._get_part_names()
 
-        prev_idx = ""
-        for p, (taxon, seq, aln_idx) in enumerate(
-                self.iter_alignments(table_in)):
-
-            if prev_idx != aln_idx:
-
-                aln = self.alignment_idx[aln_idx]
+        slices = []
 
-            self._update_pipes(ns, pbar, value=p + 1, ignore_sa=True,
-                               msg="Processing taxon {}".format(taxon))
+        for name, part_range in self.partitions:
 
-            # Index for _partitions
-            part_idx = 1
+            name = part_map[name]
+            start, stop = part_range[0][0], part_range[0][1] + 1
 
-            for name, part_range in self.partitions:
+            if part_range[1]:
+                for i in range(3):
+                    slices.append(("{}_codon_{}".format(name, i),
+                                   len(xrange(start + i, stop, 3)),
+                                   start + i, stop, 3))
+            else:
+                slices.append((name, stop - start, start, stop, 1))
 
-                name = part_map[name]
+        return slices
 
-                if part_range[1]:
+    def _iter_reverse_slices(self, slices, table_in=None):
+        """Iterates over the partition slices of each sequence.
 
-                    for i in range(3):
+        Parameters
+        ----------
+        slices : list
+            Slices of each reversed alignment, as returned by
+            `_get_reverse_slices`.
+        table_in : str, optional
+            Name of database table containing the alignment data.
 
-                        part_seq = seq[part_range[0][0]:
-                                       part_range[0][1] + 1][i::3]
+        Yields
+        ------
+        p : int
+            Index of the sequence.
+        taxon : str
+            Taxon name.
+        parts : list
+            List of tuples with the index of the slice in `slices` and the
+            sequence slice. Slices that only contain missing data are
+            excluded.
+        """
 
-                        if part_seq.replace(aln.sequence_code[1], "") == "":
-                            part_idx += 1
-                            continue
+        prev_idx = None
 
-                        # Adapt name of partition for codon variant
-                        cname = name + str(i)
+        for p, (taxon, seq, aln_idx) in enumerate(
+                self.iter_alignments(table_in)):
 
-                        taxa_idx_master[cname][taxon] = p
+            if prev_idx != aln_idx:
+                missing = self.alignment_idx[aln_idx].sequence_code[1]
+                prev_idx = aln_idx
 
-                        temp_cur.execute(
-                            "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                                temp_table), (p, taxon, part_seq, part_idx))
+            parts = [seq[start:stop:step] for _, _, start, stop, step in
+                     slices]
 
-                        part_idx += 1
+            yield p, taxon, [(i, x) for i, x in enumerate(parts)
+                             if x.strip(missing)]
 
-                else:
+    def write_reverse_concatenation(self, output_format, output_suffix="",
+                                    output_dir=None, table_in=None,
+                                    pbar=None, ns=None):
+        """Writes the reverse concatenated alignments directly into files.
 
-                    part_seq = seq[part_range[0][0]:part_range[0][1] + 1]
+        Alternative to `reverse_concatenate` followed by `write_to_file`
+        when the only goal is to write the reverse concatenated alignments.
+        The partition slices of each sequence are written to one file per
+        partition, without storing them in the database or creating
+        `Alignment` objects. The slices are kept in buffers that are
+        appended to the output files once they exceed
+        `interleave_buffer_size` characters, so that the number of open
+        files does not depend on the number of partitions.
 
-                    if part_seq.replace(aln.sequence_code[1], "") == "":
-                        part_idx += 1
-                        continue
+        Parameters
+        ----------
+        output_format : list
+            List with the output formats to generate. Only {"fasta",
+            "phylip"} are supported, in sequential (leave) format.
+        output_suffix : str
+            Suffix appended to the name of the output files.
+        output_dir : str
+            If provided, the output files will be written on the specified
+            directory.
+        table_in : string
+            Name of database table containing the alignment data.
+        ns : multiprocesssing.Manager.Namespace
+            A Namespace object used to communicate with the main thread
+            in TriFusion.
+        pbar : ProgressBar
+            A ProgressBar object used to log the progress of TriSeq execution.
 
-                    taxa_idx_master[name][taxon] = p
+        See Also
+        --------
+        reverse_concatenate
+        """
 
-                    temp_cur.execute(
-                        "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
-                            temp_table), (p, taxon, part_seq, part_idx))
+        line_formats = {
+            "fasta": lambda tx, seq: ">{}\n{}\n".format(tx, seq),
+            "phylip": lambda tx, seq: "{} {}\n".format(tx[:39].ljust(40),
+                                                       seq)
+        }
+        writers = [(fmt, line_formats[fmt]) for fmt in output_format]
 
-                    part_idx += 1
+        if output_dir and not exists(output_dir):
+            os.makedirs(output_dir)
 
-        if self._table_exists(table_out):
-            self.cur.execute("DROP TABLE [{}];".format(table_out))
+        slices = self._get_reverse_slices()
 
-        self._create_table(table_out, index=("finalrevindex", "aln_idx"))
-        self.cur.execute(
-            "INSERT INTO [{}] (txId, taxon, seq, aln_idx) "
-            "SELECT txId, taxon, seq, aln_idx "
-            "FROM [{}] "
-            "ORDER BY aln_idx".format(table_out, temp_table))
+        # The phylip header requires the number of taxa of each alignment,
+        # which is only known after slicing all sequences
+        ntaxa = [0] * len(slices)
+        if "phylip" in output_format:
+            for _, _, parts in self._iter_reverse_slices(slices, table_in):
+                for i, _ in parts:
+                    ntaxa[i] += 1
 
-        part_idx = 1
-        for name, part_range in self.partitions:
+        buffers = dict((fmt, [[] for _ in slices]) for fmt in output_format)
+        started = set()
 
-            name = part_map[name]
-            
-            if part_range[1]:
+        def flush():
 
-                for i in range(3):
+            for fmt, fmt_buffers in buffers.items():
+                for i, buf in enumerate(fmt_buffers):
 
-                    cname = "{}_codon_{}".format(name, str(i))
+                    if not buf:
+                        continue
 
-                    part_len = (part_range[0][1] - part_range[0][0] + 1) / 3
+                    path = slices[i][0] + output_suffix + self.format_ext[fmt]
+                    if output_dir:
+                        path = join(output_dir, path)
 
-                    taxa_idx = taxa_idx_master[cname]
+                    if (fmt, i) in started:
+                        fh = open(path, "a")
+                    else:
+                        fh = open(path, "w")
+                        started.add((fmt, i))
+                        if fmt == "phylip":
+                            fh.write("{} {}\n".format(ntaxa[i],
+                                                      slices[i][1]))
 
-                    p = Partitions()
-                    p.add_partition(cname, length=part_len)
+                    fh.writelines(buf)
+                    fh.close()
 
-                    saln = add_alignment(cname, part_len,
-                                         taxa_idx=taxa_idx, part=p)
+                    del buf[:]
 
-                    alns[cname] = saln
-                    rev_aln_idx[part_idx] = saln
-                    
-                    part_idx += 1
+        self._set_pipes(ns, pbar, total=len(self.taxa_names), ignore_sa=True)
 
-            else:
+        size = 0
+        for p, taxon, parts in self._iter_reverse_slices(slices, table_in):
 
-                part_len = part_range[0][1] - part_range[0][0] + 1
+            self._update_pipes(ns, pbar, value=p + 1, ignore_sa=True,
+                               msg="Processing taxon {}".format(taxon))
 
-                taxa_idx = taxa_idx_master[name]
+            for fmt, line in writers:
+                fmt_buffers = buffers[fmt]
+                for i, part_seq in parts:
+                    fmt_buffers[i].append(line(taxon, part_seq))
+                    size += len(part_seq)
 
-                p = Partitions()
-                p.add_partition(name, length=part_len)
-                saln = add_alignment(name, part_len,
-                                     taxa_idx=taxa_idx, part=p)
+            if size > interleave_buffer_size:
+                flush()
+                size = 0
 
-                alns[name] = saln
-                rev_aln_idx[part_idx] = saln
-                
-                part_idx += 1
+        flush()
 
-        self.alignments = alns
-        self.all_alignments = alns
-        self.alignment_idx = rev_aln_idx
+        self._reset_pipes(ns)
 
     def _get_part_names(self, get_type=False):
         """Returns partition name strings compliant with sqlite database
@@ -6036,8 +7468,9 @@ class AlignmentList(Base):
             for i in xrange(90, aln_obj.locus_length, 90):
 
                 temp_cur.execute("INSERT INTO [.interleavedata] VALUES "
-                                 " (?, ?, ?, ?)", (taxon, seq[counter:i], i,
-                                                   aln_idx))
+                                 " (?, ?, ?, ?)",
+                                 (taxon, self._pack_seq(seq[counter:i]), i,
+                                  aln_idx))
                 counter = i
 
             try:
@@ -6045,10 +7478,12 @@ class AlignmentList(Base):
                     i += 1
                     temp_cur.execute("INSERT INTO [.interleavedata] VALUES "
                                      " (?, ?, ?, ?)",
-                                     (taxon, seq[counter:], i, aln_idx))
+                                     (taxon, self._pack_seq(seq[counter:]),
+                                      i, aln_idx))
             except UnboundLocalError:
                 temp_cur.execute("INSERT INTO [.interleavedata] VALUES "
-                                 " (?, ?, ?, ?)", (taxon, seq, 0, aln_idx))
+                                 " (?, ?, ?, ?)",
+                                 (taxon, self._pack_seq(seq), 0, aln_idx))
 
         self._reset_pipes(ns)
 
@@ -6175,7 +7610,8 @@ class AlignmentList(Base):
                 temp_cur.execute(
                     "INSERT INTO [{}] "
                     "VALUES (?, ?, ?, ?, ?, ?, ?)".format(partition_table),
-                    (txId, taxon, part_seq, nm, part_idx, aln_idx, seq_type))
+                    (txId, taxon, self._pack_seq(part_seq), nm, part_idx,
+                     aln_idx, seq_type))
                 part_idx += 1
                 self.partition_count[nm][0].append(taxon)
                 self.partition_count[nm][1] = len(part_seq)
@@ -6186,20 +7622,26 @@ class AlignmentList(Base):
                 temp_cur.execute(
                     "INSERT INTO [{}] "
                     "VALUES (?, ?, ?, ?, ?, ?, ?)".format(partition_table),
-                    (txId, taxon, seq[self.size:], nm, part_idx,
-                     aln_idx, seq_type))
+                    (txId, taxon, self._pack_seq(seq[self.size:]), nm,
+                     part_idx, aln_idx, seq_type))
 
         if overide_table:
 
             temp_cur.execute("DELETE FROM [{}]".format(table_name))
 
-            temp_cur.execute(
-                "INSERT INTO [{}] "
-                "(txId, taxon, seq, aln_idx) "
-                "SELECT txId, taxon, GROUP_CONCAT(seq, ''), aln_idx "
-                "FROM (SELECT txId, taxon, seq, part, aln_idx FROM [{}] "
-                "ORDER BY part_type, part)"
-                "GROUP BY txId".format(table_name, partition_table))
+            # The partitions of each taxon are joined in order, which
+            # also decodes them when `compact_storage` is set
+            insert_cur = self.con.cursor()
+            for txId, rows in itertools.groupby(temp_cur.execute(
+                    "SELECT txId, taxon, seq, aln_idx FROM [{}] "
+                    "ORDER BY txId, part_type, part".format(
+                        partition_table)), key=lambda x: x[0]):
+                rows = list(rows)
+                insert_cur.execute(
+                    "INSERT INTO [{}] VALUES (?, ?, ?, ?)".format(
+                        table_name),
+                    (txId, rows[0][1], self._pack_seq("".join(
+                        unpack_sequence(x[2]) for x in rows)), rows[0][3]))
 
             # If sequence types has been provided, and has more than 1 element
             # it means that the active partitions have mixed sequence types.
@@ -6442,6 +7884,8 @@ class AlignmentList(Base):
                 "SELECT taxon, seq, slice, aln_idx from [.interleavedata] "
                 "ORDER BY aln_idx, slice"):
 
+                seq = unpack_sequence(seq)
+
                 if prev_file != aln_idx:
                     fh, of = self._setup_newfile(
                         fh, aln_idx, output_dir, suffix, output_file, ns)
@@ -6719,6 +8163,8 @@ class AlignmentList(Base):
                     "FROM [.interleavedata] "
                     "ORDER BY aln_idx, slice"):
 
+                seq = unpack_sequence(seq)
+
                 if aln_idx != prev_file:
 
                     if fh:
@@ -6980,6 +8426,8 @@ class AlignmentList(Base):
                 "FROM [.partitiondata] "
                 "ORDER BY aln_idx, part"):
 
+            seq = unpack_sequence(seq)
+
             if prev_idx != aln_idx:
                 fh, of = self._setup_newfile(fh, aln_idx, output_dir,
                                              suffix, output_file, ns)
@@ -7059,6 +8507,8 @@ class AlignmentList(Base):
                 "FROM [.partitiondata] "
                 "ORDER BY aln_idx, part"):
 
+            seq = unpack_sequence(seq)
+
             if prev_idx != aln_idx:
                 fh, of = self._setup_newfile(fh, aln_idx, output_dir,
                                              suffix, output_file, ns)
@@ -7133,6 +8583,8 @@ class AlignmentList(Base):
                 "FROM [.partitiondata] "
                 "ORDER BY aln_idx, part"):
 
+            seq = unpack_sequence(seq)
+
             if prev_idx != aln_idx:
                 fh, of = self._setup_newfile(fh, aln_idx, output_dir,
                                              suffix, output_file, ns)
@@ -7334,6 +8786,288 @@ class AlignmentList(Base):
 
         return summary_gene_table, table
 
+    def _set_sample(self, aln_idx_list):
+        """Temporarily restricts the active alignments to a sample.
+
+        The active alignments that are not in `aln_idx_list` are added to
+        the `shelved_idx` attribute, so that they are ignored by the
+        `iter_alignments` and `iter_columns` iterators, and removed from
+        the `alignments` attribute. The original state is stored and can be
+        restored with `_unset_sample`.
+
+        Parameters
+        ----------
+        aln_idx_list : list
+            List with the `Alignment.db_idx` of the sampled alignments.
+        """
+
+        self._sample_backup = (self.alignments, self.shelved_idx)
+
+        sample = set(aln_idx_list)
+
+        self.alignments = OrderedDict(
+            (k, aln) for k, aln in self.alignments.items()
+            if aln.db_idx in sample)
+        self.shelved_idx = self.shelved_idx + [
+            aln.db_idx for aln in self._sample_backup[0].values()
+            if aln.db_idx not in sample]
+
+    def _unset_sample(self):
+        """Restores the active alignments changed by `_set_sample`."""
+
+        self.alignments, self.shelved_idx = self._sample_backup
+        del self._sample_backup
+
+    @staticmethod
+    def _mean_ci(values, population_size=None, z=1.96):
+        """Calculates the confidence interval of the mean of a sample.
+
+        Uses the normal approximation and, when the `population_size` is
+        provided, the finite population correction.
+
+        Parameters
+        ----------
+        values : list
+            Sample values.
+        population_size : int
+            Size of the population from which `values` were sampled.
+        z : float
+            Quantile of the normal distribution for the desired confidence
+            level (default is 1.96, i.e., 95%).
+
+        Returns
+        -------
+        _ : tuple
+            Lower and upper bounds of the confidence interval.
+        """
+
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        mean = float(np.mean(values)) if n else 0.
+
+        if n < 2:
+            return mean, mean
+
+        se = np.std(values, ddof=1) / np.sqrt(n)
+
+        if population_size and population_size > 1:
+            se *= np.sqrt(max(population_size - n, 0) /
+                          float(population_size - 1))
+
+        return mean - z * se, mean + z * se
+
+    @staticmethod
+    def _ratio_estimate(y, x, total_x, population_size, z=1.96):
+        """Estimates a population total from a sample with a ratio estimator.
+
+        Parameters
+        ----------
+        y : list
+            Sampled values (e.g., variable sites per alignment).
+        x : list
+            Auxiliary values for the same sample (e.g., alignment length).
+        total_x : int
+            Population total of the auxiliary variable.
+        population_size : int
+            Number of units in the population.
+        z : float
+            Quantile of the normal distribution for the desired confidence
+            level (default is 1.96, i.e., 95%).
+
+        Returns
+        -------
+        estimate : int
+            Estimated population total of `y`.
+        ci : tuple
+            Lower and upper bounds of the confidence interval.
+        """
+
+        y = np.asarray(y, dtype=float)
+        x = np.asarray(x, dtype=float)
+        n = len(y)
+
+        ratio = y.sum() / x.sum() if x.sum() else 0.
+        estimate = ratio * total_x
+
+        if n < 2:
+            return int(round(estimate)), (estimate, estimate)
+
+        # Variance of the ratio using the residuals of the sampled units
+        residuals = y - ratio * x
+        se = (np.std(residuals, ddof=1) / np.sqrt(n)) / x.mean()
+        se *= np.sqrt(max(population_size - n, 0) /
+                      float(population_size - 1))
+
+        return int(round(estimate)), (max(estimate - z * se * total_x, 0),
+                                      estimate + z * se * total_x)
+
+    def _preview_summary_stats(self, ns=None, population=None):
+        """Estimates the summary statistics from the active sample.
+
+        Calculates the summary statistics for the sampled alignments (which
+        also populates their `summary_gene_table` rows) and extrapolates the
+        number of gaps, missing data, variable and informative sites to the
+        complete data set.
+
+        Parameters
+        ----------
+        ns : multiprocesssing.Manager.Namespace
+            A Namespace object used to communicate with the main thread
+            in TriFusion.
+        population : list
+            List with the `Alignment` objects of the complete data set.
+
+        Returns
+        -------
+        summary_stats : dict
+            Dictionary with the estimated summary statistics. The "ci" key
+            contains the confidence intervals of the estimated counts.
+        table : list
+            List with overall summary statistics for creating .csv tables.
+        """
+
+        self.get_summary_stats(ns=ns)
+
+        names = [aln.name for aln in self.alignments.values()]
+        gene_table = self.summary_gene_table[
+            self.summary_gene_table["genes"].isin(names)]
+
+        total_len = sum(aln.locus_length for aln in population)
+
+        self._reset_summary_stats()
+        self.summary_stats["genes"] = len(population)
+        self.summary_stats["taxa"] = len(self.taxa_names)
+        self.summary_stats["seq_len"] = total_len
+
+        ci = {}
+        for k, col, avg in [("gaps", "gap", "avg_gaps"),
+                            ("missing", "missing", "avg_missing"),
+                            ("variable", "var", "avg_var"),
+                            ("informative", "inf", "avg_inf")]:
+            self.summary_stats[k], ci[k] = self._ratio_estimate(
+                gene_table[col], gene_table["nsites"], total_len,
+                len(population))
+            self.summary_stats[avg] = list(gene_table[col])
+
+        summary_stats, table = self._format_summary_stats()
+        summary_stats["ci"] = ci
+
+        return summary_stats, table
+
+    def iter_preview(self, method, ns=None, sample_size=100, growth=2,
+                     seed=None, max_pairs=500, **kwargs):
+        """Generator of progressively refined statistics estimates.
+
+        Executes a statistics method on random samples of the active
+        alignments with increasing size, yielding the result of each
+        round, until the complete data set is used. Samples are nested,
+        that is, each sample contains all alignments of the previous ones.
+        The yielded results are the same as those of `method`, with the
+        additional keys:
+
+          - "sampled": True if the result is an estimate from a sample.
+          - "sample_size": Tuple with the number of sampled alignments and
+            the total number of active alignments.
+          - "ci": Confidence interval of the estimate (see Notes).
+
+        The "sampled" and "sample_size" keys are also set when `method`
+        returns an exception, since a sample may lack data that the
+        complete data set has.
+
+        Since the last round always uses the complete data set, the
+        consumer can stop the iteration at any point (or set `ns.stop`)
+        when the current estimate is good enough.
+
+        Parameters
+        ----------
+        method : str
+            Name of the statistics method. Supported methods are
+            "sequence_similarity", "sequence_segregation",
+            "missing_data_distribution", "allele_frequency_spectrum" and
+            "get_summary_stats".
+        ns : multiprocesssing.Manager.Namespace
+            A Namespace object used to communicate with the main thread
+            in TriFusion.
+        sample_size : int
+            Number of alignments in the first sample.
+        growth : int
+            Multiplication factor of the sample size in each round.
+        seed : int
+            Seed of the random number generator.
+        max_pairs : int
+            Maximum number of taxon pairs sampled for each alignment by
+            `sequence_similarity` in the rounds that use a sample of the
+            alignments. The last round always uses every pair.
+        kwargs : dict
+            Additional keyword arguments provided to `method`.
+
+        Yields
+        ------
+        res : dict or tuple
+            Result of `method` for the current sample.
+
+        Notes
+        -----
+        For the plot methods, "ci" contains the 95% confidence interval of
+        the mean of the plotted data (a list of intervals for each data
+        series in `missing_data_distribution`). For `get_summary_stats`,
+        "ci" is a dictionary with the confidence intervals of the estimated
+        number of gaps, missing data, variable and informative sites.
+        The intervals of `allele_frequency_spectrum` treat each column as
+        an independent observation and are, therefore, approximate.
+        """
+
+        population = list(self.alignments.values())
+        total = len(population)
+
+        order = np.random.RandomState(seed).permutation(total)
+        # At least two alignments are required by several plot methods
+        n = min(max(sample_size, 2), total)
+
+        while True:
+
+            sampled = n < total
+
+            if sampled:
+                self._set_sample([population[x].db_idx for x in order[:n]])
+
+            try:
+                if method == "get_summary_stats":
+                    if sampled:
+                        res = self._preview_summary_stats(ns, population)
+                    else:
+                        res = self.get_summary_stats(ns=ns)
+                    res[0]["sampled"] = sampled
+                    res[0]["sample_size"] = (n, total)
+                else:
+                    method_kwargs = dict(kwargs)
+                    if sampled and max_pairs and \
+                            method == "sequence_similarity":
+                        method_kwargs.update(max_pairs=max_pairs, seed=seed)
+                    res = getattr(self, method)(ns=ns, **method_kwargs)
+                    # Also set for exceptions, which may only occur in
+                    # some of the samples
+                    res["sampled"] = sampled
+                    res["sample_size"] = (n, total)
+                    if "data" in res:
+                        pop_size = total if method != \
+                            "allele_frequency_spectrum" else None
+                        if method == "missing_data_distribution":
+                            res["ci"] = [self._mean_ci(x, pop_size)
+                                         for x in res["data"]]
+                        else:
+                            res["ci"] = self._mean_ci(res["data"], pop_size)
+            finally:
+                if sampled:
+                    self._unset_sample()
+
+            yield res
+
+            if not sampled:
+                break
+
+            n = min(n * growth, total)
+
     # Stats methods
     def get_summary_stats(self, active_alignments=None, ns=None):
         """Calculates summary statistics for the 'active' alignments.
@@ -7390,15 +9124,6 @@ class AlignmentList(Base):
         self._set_pipes(ns, None, total=len(self.alignments))
         c = -1
 
-        # Set table header for summary_stats
-        table = [["Genes", "Taxa", "Alignment length", "Gaps",
-                  "Gaps per gene", "Missing data", "Missing data per gene",
-                  "Variable sites", "Variable sites per gene",
-                  "Informative sites", "Informative sites per gene"]]
-        # Table line keys matching summary_stats for table completion
-        tl = ["genes", "taxa", "seq_len", "gaps", "avg_gaps", "missing",
-              "avg_missing", "variable", "avg_var", "informative", "avg_inf"]
-
         # Reset summary_stats
         self._reset_summary_stats()
 
@@ -7465,6 +9190,32 @@ class AlignmentList(Base):
         if aln_idx:
             add_data()
 
+        return self._format_summary_stats()
+
+    def _format_summary_stats(self):
+        """Formats the `summary_stats` attribute for display.
+
+        Converts the per gene lists of `summary_stats` into average values
+        and the absolute counts of gaps, missing data, variable and
+        informative sites into strings that include their percentage.
+
+        Returns
+        -------
+        summary_stats : dict
+            Dictionary with the overall summary statistics
+        table : list
+            List with overall summary statistics for creating .csv tables.
+        """
+
+        # Set table header for summary_stats
+        table = [["Genes", "Taxa", "Alignment length", "Gaps",
+                  "Gaps per gene", "Missing data", "Missing data per gene",
+                  "Variable sites", "Variable sites per gene",
+                  "Informative sites", "Informative sites per gene"]]
+        # Table line keys matching summary_stats for table completion
+        tl = ["genes", "taxa", "seq_len", "gaps", "avg_gaps", "missing",
+              "avg_missing", "variable", "avg_var", "informative", "avg_inf"]
+
         # Get average values
         for k in ["avg_gaps", "avg_missing", "avg_var", "avg_inf"]:
             self.summary_stats[k] = round(np.mean(self.summary_stats[k]))
@@ -7555,6 +9306,13 @@ class AlignmentList(Base):
             data_storage["Missing data"].append(np.mean(missing_g))
             data_storage["Data"].append(np.mean(data_g))
 
+        def get_result():
+            return {"data": [x for x in data_storage.values()],
+                    "title": "Distribution of missing data",
+                    "legend": legend,
+                    "ax_names": ["Proportion", "Number of genes"],
+                    "table_header": ["Bin"] + legend}
+
         self._set_pipes(ns, None, total=len(self.alignments))
         c = 1
 
@@ -7578,6 +9336,7 @@ class AlignmentList(Base):
 
                     add_data()
 
+                self._stream_partial(ns, c - 1, get_result)
                 self._update_pipes(ns, None, value=c)
                 c += 1
 
@@ -7602,13 +9361,7 @@ class AlignmentList(Base):
         if aln_idx:
             add_data()
 
-        data = [x for x in data_storage.values()]
-
-        return {"data": data,
-                "title": "Distribution of missing data",
-                "legend": legend,
-                "ax_names": ["Proportion", "Number of genes"],
-                "table_header": ["Bin"] + legend}
+        return get_result()
 
     @check_data
     def missing_data_per_species(self, ns=None):
@@ -8085,8 +9838,42 @@ class AlignmentList(Base):
 
         return float(sim), float(ef_len)
 
+    @staticmethod
+    def _sample_pairs(n, size, rng):
+        """Samples pairs of indexes without replacement.
+
+        The pairs are drawn individually and repeated pairs are rejected,
+        so that the complete list of pairs is never built. Since this is
+        only efficient when `size` is small relative to the number of
+        pairs, it should only be used when sampling is actually required.
+
+        Parameters
+        ----------
+        n : int
+            Number of elements.
+        size : int
+            Number of pairs to sample. Must be lower than the number of
+            pairs of `n` elements.
+        rng : numpy.random.RandomState
+            Random number generator.
+
+        Returns
+        -------
+        pairs : list
+            Sorted list with the (i, j) index pairs, with i < j.
+        """
+
+        pairs = set()
+
+        while len(pairs) < size:
+            i, j = rng.randint(n, size=2)
+            if i != j:
+                pairs.add((min(i, j), max(i, j)))
+
+        return sorted(pairs)
+
     @check_data
-    def sequence_similarity(self, ns=None):
+    def sequence_similarity(self, ns=None, max_pairs=None, seed=None):
         """Creates data for average sequence similarity plot.
 
         Parameters
@@ -8094,6 +9881,13 @@ class AlignmentList(Base):
         ns : multiprocesssing.Manager.Namespace
             A Namespace object used to communicate with the main thread
             in TriFusion.
+        max_pairs : int
+            If provided, the average similarity of each alignment is
+            estimated from a random sample of, at most, `max_pairs`
+            taxon pairs (see `iter_preview`).
+        seed : int
+            Seed of the random number generator used to sample the taxon
+            pairs.
 
         Returns
         -------
@@ -8103,21 +9897,37 @@ class AlignmentList(Base):
             "ax_names": 2 element list with axis labels [x, y]
         """
 
+        def get_result():
+            return {"data": data,
+                    "ax_names": ["Similarity (%)", "Frequency"]}
+
         self._get_similarity("connect")
 
         data = []
 
+        rng = np.random.RandomState(seed)
+
         self._set_pipes(ns, None, total=len(self.alignments))
         c = 1
 
         for aln in self.alignments.values():
 
+            self._stream_partial(ns, c - 1, get_result)
             self._update_pipes(ns, None, value=c)
             c += 1
 
             aln_similarities = []
 
-            for seq1, seq2 in itertools.combinations(aln.iter_sequences(), 2):
+            seqs = list(aln.iter_sequences())
+
+            if max_pairs and \
+                    len(seqs) * (len(seqs) - 1) / 2 > max_pairs:
+                pairs = ((seqs[i], seqs[j]) for i, j in
+                         self._sample_pairs(len(seqs), max_pairs, rng))
+            else:
+                pairs = itertools.combinations(seqs, 2)
+
+            for seq1, seq2 in pairs:
 
                 self._check_killswitch(ns)
 
@@ -8133,8 +9943,7 @@ class AlignmentList(Base):
 
         self._get_similarity("disconnect")
 
-        return {"data": data,
-                "ax_names": ["Similarity (%)", "Frequency"]}
+        return get_result()
 
     @check_data
     def sequence_similarity_per_species(self, ns=None):
@@ -8156,6 +9965,14 @@ class AlignmentList(Base):
             "color_label": str, label for colorbar
         """
 
+        def get_result():
+            matrix = np.array([[np.mean(y) if y else 0. for y in x]
+                               for x in data])
+            mask = np.tri(matrix.shape[0], k=0)
+            return {"data": np.ma.array(matrix, mask=mask),
+                    "color_label": "Pairwise sequence similarity",
+                    "labels": list(taxa_pos)}
+
         self._set_pipes(ns, None, total=len(self.alignments))
         c = 1
 
@@ -8169,6 +9986,7 @@ class AlignmentList(Base):
 
         for aln in self.alignments.values():
 
+            self._stream_partial(ns, c - 1, get_result)
             self._update_pipes(ns, None, value=c)
             c += 1
 
@@ -8186,15 +10004,9 @@ class AlignmentList(Base):
                 if l:
                     data[taxa_pos[tx1]][taxa_pos[tx2]].append(sim / l)
 
-        data = np.array([[np.mean(y) if y else 0. for y in x] for x in data])
-        mask = np.tri(data.shape[0], k=0)
-        data = np.ma.array(data, mask=mask)
-
         self._get_similarity("disconnect")
 
-        return {"data": data,
-                "color_label": "Pairwise sequence similarity",
-                "labels": list(taxa_pos)}
+        return get_result()
 
     @check_data
     def sequence_similarity_gene(self, gene_name, window_size, ns=None):
@@ -8304,6 +10116,20 @@ class AlignmentList(Base):
             else:
                 data.append(segregating_sites)
 
+        def get_result():
+            if proportions:
+                ax_names = ["Segregating sites", "Percentage"]
+                real_bin = False
+            else:
+                ax_names = ["Segregating sites", "Frequency"]
+                real_bin = True
+
+            return {"data": data,
+                    "ax_names": ax_names,
+                    "title": "Distribution of segregating sites",
+                    "table_header": ax_names,
+                    "real_bin_num": real_bin}
+
         self._set_pipes(ns, None, total=len(self.alignments))
         c = 1
 
@@ -8317,6 +10143,7 @@ class AlignmentList(Base):
                 if prev_idx:
                     add_data()
 
+                self._stream_partial(ns, c - 1, get_result)
                 self._update_pipes(ns, None, value=c)
                 c += 1
 
@@ -8333,18 +10160,7 @@ class AlignmentList(Base):
             if len(column) > 1:
                 segregating_sites += 1
 
-        if proportions:
-            ax_names = ["Segregating sites", "Percentage"]
-            real_bin = False
-        else:
-            ax_names = ["Segregating sites", "Frequency"]
-            real_bin = True
-
-        return {"data": data,
-                "ax_names": ax_names,
-                "title": "Distribution of segregating sites",
-                "table_header": ax_names,
-                "real_bin_num": real_bin}
+        return get_result()
 
     @check_data
     def sequence_segregation_per_species(self, ns=None):
@@ -8367,6 +10183,14 @@ class AlignmentList(Base):
             "color_label": str, label for colorbar
         """
 
+        def get_result():
+            matrix = np.array([[np.mean(y) if y else 0. for y in x]
+                               for x in data])
+            mask = np.tri(matrix.shape[0], k=0)
+            return {"data": np.ma.array(matrix, mask=mask),
+                    "labels": list(taxa_pos),
+                    "color_label": "Segregating sites"}
+
         self._set_pipes(ns, None, total=len(self.alignments))
         c = 1
 
@@ -8380,6 +10204,7 @@ class AlignmentList(Base):
 
         for aln in self.alignments.values():
 
+            self._stream_partial(ns, c - 1, get_result)
             self._update_pipes(ns, None, value=c)
             c += 1
 
@@ -8401,15 +10226,9 @@ class AlignmentList(Base):
 
                 data[taxa_pos[tx1]][taxa_pos[tx2]].append(aln_diff)
 
-        data = np.array([[np.mean(y) if y else 0. for y in x] for x in data])
-        mask = np.tri(data.shape[0], k=0)
-        data = np.ma.array(data, mask=mask)
-
         self._get_similarity("disconnect")
 
-        return {"data": data,
-                "labels": list(taxa_pos),
-                "color_label": "Segregating sites"}
+        return get_result()
 
     @check_data
     def sequence_segregation_gene(self, gene_name, window_size, ns=None):
@@ -8584,6 +10403,14 @@ class AlignmentList(Base):
         if len(self.sequence_code) > 1 and self.sequence_code[0] != "DNA":
             return {"exception": InvalidSequenceType}
 
+        def get_result():
+            return {"data": data,
+                    "title": "Allele frequency spectrum",
+                    "ax_names": ["Derived allele frequency", "Frequency"],
+                    "table_header": ["Derived allele frequency",
+                                     "Frequency"],
+                    "real_bin_num": True}
+
         data = []
         missing_symbols = [self.sequence_code[0], self.gap_symbol]
 
@@ -8595,6 +10422,7 @@ class AlignmentList(Base):
 
             if prev_idx != aln_idx:
 
+                self._stream_partial(ns, c, get_result)
                 self._update_pipes(ns, None, value=c)
                 c += 1
 
@@ -8618,11 +10446,7 @@ class AlignmentList(Base):
                 else:
                     data.append(sum(column.values()))
 
-        return {"data": data,
-                "title": "Allele frequency spectrum",
-                "ax_names": ["Derived allele frequency", "Frequency"],
-                "table_header": ["Derived allele frequency", "Frequency"],
-                "real_bin_num": True}
+        return get_result()
 
     @check_data
     def allele_frequency_spectrum_gene(self, gene_name, ns):
@@ -0,0 +1,189 @@
+#!/usr/bin/python2
+
+import os
+import shutil
+import sqlite3
+import unittest
+from os.path import join
+
+from trifusion.ortho import orthomclInstallSchema as install_schema
+from trifusion.ortho import orthomclBlastParser as blast_parser
+
+temp_dir = ".temp"
+
+proteomes = {
+    "SpB": ["SpB|1", "SpB|2"],
+    "SpC": ["SpC|1"],
+    "SpA": ["SpA|1", "SpA|2"],
+}
+
+hits = [
+    ("SpB|1", "SpB|1", "1e-100"),
+    ("SpB|1", "SpC|1", "1e-50"),
+    ("SpC|1", "SpB|1", "2e-40"),
+    ("SpB|2", "SpC|1", "0.0"),
+    ("SpA|1", "SpB|1", "3e-20"),
+    ("SpB|1", "SpA|2", "1e-10"),
+    ("SpA|2", "SpA|1", "5e-5"),
+]
+
+
+class BlastParserTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fasta_dir = join(temp_dir, "compliantFasta")
+        os.makedirs(self.fasta_dir)
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def write_proteomes(self, taxa):
+
+        for taxon in taxa:
+            with open(join(self.fasta_dir, taxon + ".fasta"), "w") as fh:
+                for seq in proteomes[taxon]:
+                    fh.write(">{}\n{}\n".format(seq, "MKV" * 20))
+
+    def parse(self, db_dir, rows, append=False):
+
+        blast_file = join(temp_dir, "blast.out")
+
+        with open(blast_file, "w") as fh:
+            for q, s, evalue in rows:
+                fh.write("\t".join([q, s, "90.0", "50", "0", "0", "1", "50",
+                                    "1", "50", evalue, "100"]) + "\n")
+
+        blast_parser.orthomcl_blast_parser(blast_file, self.fasta_dir, db_dir,
+                                           None, append=append)
+
+    @staticmethod
+    def similar_sequences(db_dir):
+
+        con = sqlite3.connect(join(db_dir, "orthoDB.db"))
+        res = con.execute(
+            "SELECT q.sequence_name, s.sequence_name, qt.taxon_name, "
+            "st.taxon_name, ss.evalue_mant, ss.evalue_exp, ss.query_id < "
+            "ss.subject_id FROM SimilarSequences ss "
+            "JOIN SequenceDictionary q ON q.sequence_id = ss.query_id "
+            "JOIN SequenceDictionary s ON s.sequence_id = ss.subject_id "
+            "JOIN TaxonDictionary qt ON qt.taxon_id = ss.query_taxon_id "
+            "JOIN TaxonDictionary st ON st.taxon_id = ss.subject_taxon_id "
+            "ORDER BY ss.rowid").fetchall()
+        con.close()
+
+        return res
+
+    def test_append(self):
+
+        full_dir = join(temp_dir, "full")
+        inc_dir = join(temp_dir, "inc")
+
+        for d in [full_dir, inc_dir]:
+            os.makedirs(d)
+            install_schema.execute(d)
+
+        old = [x for x in hits if "SpA" not in x[0] + x[1]]
+        new = [x for x in hits if "SpA" in x[0] + x[1]]
+
+        self.write_proteomes(["SpB", "SpC"])
+        self.parse(inc_dir, old)
+
+        self.write_proteomes(["SpA"])
+        self.parse(inc_dir, new, append=True)
+        self.parse(full_dir, old + new)
+
+        self.assertEqual(self.similar_sequences(inc_dir),
+                         self.similar_sequences(full_dir))
+        self.assertEqual(len(self.similar_sequences(inc_dir)), len(hits))
+
+    def test_read_chunks_follow(self):
+
+        blast_file = join(temp_dir, "blast.out")
+        # Pieces written while the file is read, some ending mid line
+        pieces = ["|1\tSpC|1\t90.0\n", "SpC|1\tSp", "B|1\t80.0\n",
+                  "SpB|2\tSpC|1", "\t70.0"]
+
+        with open(blast_file, "w") as fh:
+            fh.write("SpB|1\tSpB|1\t100.0\nSpB")
+
+        def follow():
+            if not pieces:
+                return False
+            with open(blast_file, "a") as fh:
+                fh.write(pieces.pop(0))
+            return True
+
+        poll_interval = blast_parser.POLL_INTERVAL
+        blast_parser.POLL_INTERVAL = 0
+
+        try:
+            with open(blast_file) as fh:
+                chunks = list(blast_parser.read_chunks(fh, follow))
+        finally:
+            blast_parser.POLL_INTERVAL = poll_interval
+
+        lines = [x for chunk in chunks for x in chunk]
+
+        self.assertEqual(lines, ["SpB|1\tSpB|1\t100.0\n",
+                                 "SpB|1\tSpC|1\t90.0\n",
+                                 "SpC|1\tSpB|1\t80.0\n",
+                                 "SpB|2\tSpC|1\t70.0"])
+
+    def test_multi_hsp_chunks(self):
+
+        db_dir = join(temp_dir, "db")
+        os.makedirs(db_dir)
+        install_schema.execute(db_dir)
+        self.write_proteomes(["SpA", "SpB", "SpC"])
+
+        # identity, length, start and end of each HSP. The first pair has
+        # overlapping HSPs and the second has a gap between them
+        pairs = [
+            (("SpA|1", "SpB|1", "1e-50"), [(100.0, 40, 1, 40),
+                                           (50.0, 30, 21, 50)]),
+            (("SpB|1", "SpC|1", "2e-30"), [(90.0, 30, 1, 30),
+                                           (80.0, 20, 41, 60)]),
+            (("SpC|1", "SpA|2", "0"), [(70.0, 60, 1, 60)]),
+        ]
+
+        blast_file = join(temp_dir, "blast.out")
+        with open(blast_file, "w") as fh:
+            for (q, s, evalue), hsps in pairs:
+                for ident, length, start, end in hsps:
+                    fh.write("\t".join(map(str, [
+                        q, s, ident, length, 0, 0, start, end, start, end,
+                        evalue, 100])) + "\n")
+
+        # Each line is read in its own chunk, so the HSPs of a pair are
+        # split across chunks
+        chunk_size = blast_parser.CHUNK_SIZE
+        batch_size = blast_parser.BATCH_SIZE
+        blast_parser.CHUNK_SIZE = 1
+        blast_parser.BATCH_SIZE = 1
+        try:
+            blast_parser.orthomcl_blast_parser(blast_file, self.fasta_dir,
+                                               db_dir, None)
+        finally:
+            blast_parser.CHUNK_SIZE = chunk_size
+            blast_parser.BATCH_SIZE = batch_size
+
+        con = sqlite3.connect(join(db_dir, "orthoDB.db"))
+        res = con.execute(
+            "SELECT q.sequence_name, s.sequence_name, ss.evalue_mant, "
+            "ss.evalue_exp, ss.percent_identity, ss.percent_match "
+            "FROM SimilarSequences ss "
+            "JOIN SequenceDictionary q ON q.sequence_id = ss.query_id "
+            "JOIN SequenceDictionary s ON s.sequence_id = ss.subject_id "
+            "ORDER BY ss.rowid").fetchall()
+        con.close()
+
+        self.assertEqual(res, [
+            ("SpA|1", "SpB|1", 1.0, -50, 78.0, 83.4),
+            ("SpB|1", "SpC|1", 2.0, -30, 86.0, 83.4),
+            ("SpC|1", "SpA|2", 0.0, 0, 70.0, 100.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import shutil
 import unittest
 from os.path import join
 from collections import OrderedDict
+from copy import deepcopy
 from data_files import *
 
 try:
@@ -112,6 +114,100 @@ class LoadAlignmentsTest(unittest.TestCase):
         single_aln = Alignment(concatenated_interleave_nexus[0],
                                sql_cursor=self.aln_obj.cur)
 
+    def test_interleave_buffer_spill(self):
+
+        seq_module = sys.modules[Alignment.__module__]
+        buffer_size = seq_module.interleave_buffer_size
+
+        for aln_file in phylip_interleave + concatenated_interleave_nexus:
+
+            aln = Alignment(aln_file, sql_cursor=self.aln_obj.cur,
+                            db_idx=1)
+            expected = self.aln_obj.cur.execute(
+                "SELECT txId, taxon, seq FROM alignment_data WHERE "
+                "aln_idx=1").fetchall()
+
+            # Force the buffer to be flushed after every block line
+            seq_module.interleave_buffer_size = 10
+            try:
+                spill_aln = Alignment(aln_file, sql_cursor=self.aln_obj.cur,
+                                      db_idx=2)
+            finally:
+                seq_module.interleave_buffer_size = buffer_size
+
+            self.assertEqual(self.aln_obj.cur.execute(
+                "SELECT txId, taxon, seq FROM alignment_data WHERE "
+                "aln_idx=2").fetchall(), expected)
+            self.assertEqual(len(expected), len(aln._taxa_idx))
+            # The chunks are removed once the sequences are built
+            self.assertEqual(self.aln_obj.cur.execute(
+                "SELECT count(*) FROM interleave_chunks").fetchone()[0], 0)
+
+            self.aln_obj.cur.execute("DELETE FROM alignment_data")
+
+    def test_pack_sequence_roundtrip(self):
+
+        seq_module = sys.modules[Alignment.__module__]
+
+        for seq in ["acgtnnnn--rykm", "acg", "", "MKV-XXL*", "acgt?" * 10]:
+            packed = seq_module.pack_sequence(seq)
+            self.assertEqual(seq_module.unpack_sequence(packed), seq)
+
+        self.assertEqual(seq_module.unpack_sequence("acgt"), "acgt")
+
+    def test_load_compact_storage(self):
+
+        data_files = dna_data_fas + phylip_interleave + dna_data_loci + \
+            mixed_seq_type
+        compact_obj = AlignmentList(data_files, sql_db=join(temp_dir,
+                                                            "compactdb"),
+                                    compact_storage=True)
+
+        try:
+            self.assertEqual(compact_obj.cur.execute(
+                "SELECT DISTINCT typeof(seq) FROM alignment_data").fetchall(),
+                [("blob",)])
+
+            plain_obj = AlignmentList(data_files, sql_db=join(temp_dir,
+                                                              "plaindb"))
+            try:
+                self.assertEqual(sorted(compact_obj.iter_alignments()),
+                                 sorted(plain_obj.iter_alignments()))
+                expected = list(plain_obj.iter_columns())
+                self.assertEqual(list(compact_obj.iter_columns()), expected)
+
+                # The packed sequences are decoded by the query, without
+                # a plain text copy of the table
+                blocks_query = "SELECT name FROM sqlite_master WHERE " \
+                               "type='table' AND name LIKE '.colblocks%'"
+                self.assertEqual(
+                    compact_obj.cur.execute(blocks_query).fetchall(), [])
+
+                seq_module = sys.modules[Alignment.__module__]
+                block_size = seq_module.column_block_size
+                seq_module.column_block_size = 7
+                try:
+                    columns = compact_obj.iter_columns()
+                    first = next(columns)
+
+                    # The blocks are packed while they are iterated
+                    tables = compact_obj.con.execute(blocks_query).fetchall()
+                    self.assertTrue(tables)
+                    for table, in tables:
+                        self.assertEqual(compact_obj.con.execute(
+                            "SELECT DISTINCT typeof(seq) FROM [{}]".format(
+                                table)).fetchall(), [("blob",)])
+
+                    self.assertEqual([first] + list(columns), expected)
+                finally:
+                    seq_module.column_block_size = block_size
+            finally:
+                plain_obj.clear_alignments()
+                plain_obj.con.close()
+        finally:
+            compact_obj.clear_alignments()
+            compact_obj.con.close()
+
     def test_load_stc(self):
 
         self.aln_obj = AlignmentList(dna_data_stc, sql_db=sql_db)
@@ -125,6 +221,32 @@ class LoadAlignmentsTest(unittest.TestCase):
 
         self.aln_obj = AlignmentList(dna_data_loci, sql_db=sql_db)
 
+    def test_load_loci_late_taxa(self):
+
+        loci_file = join(temp_dir, "late_taxa.loci")
+        with open(loci_file, "w") as fh:
+            fh.write(">taxonA     ACGT\n"
+                     ">taxonB     ACGA\n"
+                     "//              |1|\n"
+                     ">taxonB     TTAA\n"
+                     ">taxonC     TTAC\n"
+                     "//              |2|\n"
+                     ">taxonA     GG\n"
+                     ">taxonD     GC\n")
+
+        self.aln_obj = AlignmentList([loci_file], sql_db=sql_db)
+
+        self.assertEqual(
+            sorted(x[:2] for x in self.aln_obj.iter_alignments()),
+            [("taxonA", "acgtnnnn"), ("taxonB", "acgattaa"),
+             ("taxonC", "nnnnttac"), ("taxonD", "nnnnnnnn")])
+
+    def test_autofinder_file_handle(self):
+
+        with open(dna_data_loci[0]) as fh:
+            self.assertEqual(self.aln_obj.autofinder(fh)[0], "loci")
+            self.assertEqual(fh.tell(), 0)
+
     def test_load_single_loci(self):
 
         single_aln = Alignment(dna_data_loci[0], sql_cursor=self.aln_obj.cur,
@@ -327,6 +449,25 @@ class AlignmentManipulationTest(unittest.TestCase):
         self.assertEqual(list(self.aln_obj.alignments.keys()),
                          [join(data_path, "BaseConc1.fas")])
 
+    def test_update_act_alns_shared_connection(self):
+
+        # Copies made with deepcopy share the database connection, and
+        # its temporary tables, with the original object
+        aln = deepcopy(self.aln_obj)
+        aln.set_database_connections(self.aln_obj.cur, self.aln_obj.con)
+
+        n_seqs = len(list(self.aln_obj.iter_alignments()))
+
+        aln.update_active_alignments([join(data_path, "BaseConc1.fas"),
+                                      join(data_path, "BaseConc2.fas")])
+
+        self.assertEqual(
+            set(x[2] for x in aln.iter_alignments()),
+            set(x.db_idx for x in aln.alignments.values()))
+        self.assertEqual(len(list(self.aln_obj.iter_alignments())), n_seqs)
+        self.assertEqual(len(set(x[2] for x in
+                                 self.aln_obj.iter_alignments())), 7)
+
     def test_add_aln_obj(self):
 
         fl = self.aln_obj.alignments.keys()
@@ -391,6 +532,44 @@ class AlignmentManipulationTest(unittest.TestCase):
 
         self.assertEqual(self.aln_obj.taxa_names, taxa_list)
 
+    def test_change_taxon_name(self):
+
+        old_name = self.aln_obj.taxa_names[0]
+
+        self.aln_obj.change_taxon_name(old_name, "new_taxon")
+
+        self.assertEqual(self.aln_obj.taxa_names[0], "new_taxon")
+
+        renamed = 0
+        for aln in self.aln_obj.alignments.values():
+            tx_idx = aln.taxa_idx
+            self.assertNotIn(old_name, tx_idx)
+            if "new_taxon" in tx_idx:
+                renamed += 1
+                self.assertEqual(self.aln_obj.cur.execute(
+                    "SELECT taxon FROM alignment_data WHERE txId=? AND "
+                    "aln_idx=?", (tx_idx["new_taxon"],
+                                  aln.db_idx)).fetchone(), ("new_taxon",))
+
+        self.assertTrue(renamed)
+
+    def test_select_by_taxa(self):
+
+        alns = list(self.aln_obj.alignments.values())
+        taxa = alns[0].taxa_idx.keys()
+
+        def expected(test):
+            return [x for x in alns if test(set(x.taxa_idx))]
+
+        self.assertEqual(self.aln_obj.select_by_taxa(taxa),
+                         expected(lambda x: x == set(taxa)))
+        self.assertEqual(
+            self.aln_obj.select_by_taxa(taxa[:2], mode="inclusive"),
+            expected(lambda x: set(taxa[:2]) <= x))
+        self.assertEqual(self.aln_obj.select_by_taxa(
+            taxa[-1:] + ["missing_taxon"], mode="relaxed"),
+            expected(lambda x: taxa[-1] in x))
+
     #
     # def test_retrieve_alignment(self):
     #
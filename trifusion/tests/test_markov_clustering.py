@@ -0,0 +1,71 @@
+#!/usr/bin/python2
+
+import os
+import shutil
+import unittest
+from os.path import join
+
+from trifusion.ortho.markov_clustering import MarkovClustering
+
+temp_dir = ".temp"
+
+abc_data = [
+    ("SpA|1", "SpB|1", 5.2),
+    ("SpA|1", "SpC|1", 4.8),
+    ("SpB|1", "SpC|1", 5.0),
+    ("SpA|2", "SpB|2", 3.1),
+    ("SpB|2", "SpC|2", 2.9),
+    ("SpA|2", "SpC|2", 3.3),
+    ("SpC|2", "SpD|2", 3.0),
+    ("SpC|1", "SpC|2", 0.1),
+    ("SpA|3", "SpB|3", 1.2),
+]
+
+
+class MarkovClusteringTest(unittest.TestCase):
+
+    def setUp(self):
+
+        if not os.path.exists(temp_dir):
+            os.makedirs(temp_dir)
+
+        self.abc_file = join(temp_dir, "mclInput")
+
+        with open(self.abc_file, "w") as fh:
+            for a, b, w in abc_data:
+                fh.write("{}\t{}\t{}\n".format(a, b, w))
+
+        self.mcl = MarkovClustering(self.abc_file)
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def test_graph(self):
+
+        self.assertEqual(self.mcl.graph.shape, (9, 9))
+        self.assertTrue((self.mcl.graph != self.mcl.graph.T).nnz == 0)
+
+    def test_cluster(self):
+
+        res = self.mcl.cluster(2)
+
+        self.assertEqual(res, [["SpA|2", "SpB|2", "SpC|2", "SpD|2"],
+                               ["SpA|1", "SpB|1", "SpC|1"],
+                               ["SpA|3", "SpB|3"]])
+
+    def test_write_clusters(self):
+
+        out = join(temp_dir, "mclOutput_2")
+        self.mcl.write_clusters(2, out)
+
+        with open(out) as fh:
+            res = fh.read()
+
+        self.assertEqual(res, "SpA|2\tSpB|2\tSpC|2\tSpD|2\n"
+                              "SpA|1\tSpB|1\tSpC|1\n"
+                              "SpA|3\tSpB|3\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
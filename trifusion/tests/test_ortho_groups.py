@@ -0,0 +1,99 @@
+#!/usr/bin/python2
+
+import os
+import shutil
+import unittest
+from os.path import join
+
+from trifusion.ortho.OrthomclToolbox import GroupLight
+
+temp_dir = ".temp"
+
+groups = [
+    "g1: SpA|1 SpA|2 SpB|1 SpC|1",
+    "g2: SpA|3 SpB|2 SpC|2 SpD|1",
+    "g3: SpB|3 SpC|3",
+    "g4: SpD|2 SpD|3 SpD|4",
+]
+
+
+class GroupLightTest(unittest.TestCase):
+
+    def setUp(self):
+
+        if not os.path.exists(temp_dir):
+            os.makedirs(temp_dir)
+
+        self.groups_file = join(temp_dir, "groups.txt")
+
+        with open(self.groups_file, "w") as fh:
+            fh.write("\n".join(groups) + "\n")
+
+        self.group = GroupLight(self.groups_file, 1, 3)
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def test_parse(self):
+
+        self.assertEqual(self.group.species_frequency.shape, (4, 4))
+        self.assertEqual(sorted(self.group.species_list),
+                         ["SpA", "SpB", "SpC", "SpD"])
+        self.assertEqual(self.group.max_extra_copy, 3)
+
+    def test_statistics(self):
+
+        stats = self.group.basic_group_statistics()
+
+        self.assertEqual(stats[0], 4)
+        self.assertEqual(stats[2:], (2, 2, 1))
+        self.assertEqual(list(self.group.compliant_clusters()),
+                         [False, True, False, False])
+
+    def test_exclude_taxa(self):
+
+        self.group.exclude_taxa(["SpD"], True)
+
+        self.assertEqual(self.group.all_clusters, 3)
+        self.assertEqual(sorted(self.group.species_list),
+                         ["SpA", "SpB", "SpC"])
+
+        self.group.update_filters(2, 2, True)
+
+        self.assertEqual(self.group.basic_group_statistics()[2:], (3, 3, 3))
+        self.assertEqual(list(self.group.compliant_clusters()),
+                         [True, True, True, False])
+
+        self.group.export_filtered_group(dest=temp_dir)
+
+        with open(join(temp_dir, "filtered_groups")) as fh:
+            res = fh.read()
+
+        self.assertEqual(res, "g1:SpA|1\tSpA|2\tSpB|1\tSpC|1\n"
+                              "g2:SpA|3\tSpB|2\tSpC|2\n"
+                              "g3:SpB|3\tSpC|3\n")
+
+    def test_bar_plots(self):
+
+        self.group.exclude_taxa(["SpD"], True)
+        self.group.update_filters(2, 2, True)
+
+        res = self.group.bar_genecopy_distribution()
+        self.assertEqual((res["labels"], res["data"]),
+                         (["1", "2", "3"], [[2, 1, 1]]))
+
+        res = self.group.bar_species_distribution(filt=True)
+        self.assertEqual((res["labels"], res["data"]), (["2", "3"], [[1, 2]]))
+
+        res = self.group.bar_species_coverage(filt=True)
+        self.assertEqual(dict(zip(res["labels"], zip(*res["data"]))),
+                         {"SpA": (2, 1), "SpB": (3, 0), "SpC": (3, 0)})
+        self.assertEqual(res["data"][0], [3, 3, 2])
+
+        res = self.group.bar_genecopy_per_species()
+        self.assertEqual((res["labels"], res["data"]), (["SpA"], [[2]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
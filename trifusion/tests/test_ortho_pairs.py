@@ -0,0 +1,155 @@
+#!/usr/bin/python2
+
+import os
+import shutil
+import sqlite3
+import unittest
+from os.path import join
+
+from trifusion.ortho import orthomclInstallSchema as install_schema
+from trifusion.ortho import orthomclBlastParser as blast_parser
+from trifusion.ortho import orthomclPairs as pairs
+from trifusion.ortho import orthomclDumpPairsFiles as dump_pairs
+from trifusion.ortho import orthomclLoadBlast as load_blast
+
+temp_dir = ".temp"
+
+proteomes = {
+    "SpA": ["SpA|1", "SpA|2"],
+    "SpB": ["SpB|1", "SpB|2"],
+    "SpC": ["SpC|1"],
+}
+
+# SpA|1, SpB|1 and SpC|1 are orthologs, SpA|2 and SpB|2 are in-paralogs
+# of SpA|1 and SpB|1, which makes them co-orthologs of the other taxa
+hits = [
+    ("SpA|1", "SpB|1", "1e-50"),
+    ("SpA|1", "SpA|2", "1e-80"),
+    ("SpB|1", "SpB|2", "2e-80"),
+    ("SpA|2", "SpB|1", "1e-45"),
+    ("SpA|1", "SpB|2", "3e-45"),
+    ("SpA|2", "SpB|2", "1e-30"),
+    ("SpA|1", "SpC|1", "1e-60"),
+    ("SpB|1", "SpC|1", "4e-55"),
+    ("SpA|2", "SpC|1", "2e-20"),
+    ("SpB|2", "SpC|1", "0.0"),
+]
+
+outputs = ["orthologs.txt", "inparalogs.txt", "coorthologs.txt", "mclInput"]
+
+
+class PairsTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.fasta_dir = join(temp_dir, "compliantFasta")
+        os.makedirs(self.fasta_dir)
+
+        for taxon, seqs in proteomes.items():
+            with open(join(self.fasta_dir, taxon + ".fasta"), "w") as fh:
+                for seq in seqs:
+                    fh.write(">{}\n{}\n".format(seq, "MKV" * 20))
+
+        self.blast_file = join(temp_dir, "blast.out")
+
+        # Hits are written in both directions
+        with open(self.blast_file, "w") as fh:
+            for q, s, evalue in hits + [(s, q, e) for q, s, e in hits]:
+                fh.write("\t".join([q, s, "90.0", "50", "0", "0", "1", "50",
+                                    "1", "50", evalue, "100"]) + "\n")
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def run_pairs(self, engine, dest=None, load=None):
+
+        dest = dest or join(temp_dir, engine)
+        os.makedirs(join(dest, "backstage_files"))
+
+        install_schema.execute(dest)
+        if load:
+            load(dest)
+        else:
+            blast_parser.orthomcl_blast_parser(self.blast_file,
+                                               self.fasta_dir, dest, None)
+        pairs.execute(dest, engine=engine)
+        dump_pairs.execute(dest, dest)
+
+        res = {}
+        for f in outputs:
+            with open(join(dest, "backstage_files", f)) as fh:
+                res[f] = fh.read()
+
+        return res
+
+    def test_engines(self):
+
+        sql = self.run_pairs("sql")
+        memory = self.run_pairs("memory")
+
+        for f in outputs:
+            self.assertTrue(sql[f], f)
+            self.assertEqual(memory[f], sql[f], f)
+
+        self.assertEqual(len(sql["orthologs.txt"].splitlines()), 3)
+        self.assertEqual(len(sql["inparalogs.txt"].splitlines()), 2)
+        self.assertEqual(len(sql["coorthologs.txt"].splitlines()), 4)
+
+    def test_memory_budget(self):
+
+        sql = self.run_pairs("sql")
+
+        def load(cur):
+            raise AssertionError("SimilarSequences was loaded")
+
+        # The hits exceed the budget, so they are never loaded
+        budget, load_func = pairs.MEMORY_BUDGET, pairs.loadSimilarSequences
+        pairs.MEMORY_BUDGET, pairs.loadSimilarSequences = 1, load
+        try:
+            memory = self.run_pairs("memory")
+        finally:
+            pairs.MEMORY_BUDGET, pairs.loadSimilarSequences = budget, \
+                load_func
+
+        self.assertEqual(memory, sql)
+
+    def test_load_blast(self):
+
+        parsed = self.run_pairs("sql")
+
+        # Similar sequences file with the names of the parsed hits, in
+        # reverse order so that the ids differ from the order of the file,
+        # and with blank lines that are skipped
+        con = sqlite3.connect(join(temp_dir, "sql", "orthoDB.db"))
+        rows = con.execute(
+            "SELECT q.sequence_name, s.sequence_name, qt.taxon_name, "
+            "st.taxon_name, ss.evalue_mant, ss.evalue_exp, "
+            "ss.percent_identity, ss.percent_match "
+            "FROM SimilarSequences ss "
+            "JOIN SequenceDictionary q ON q.sequence_id = ss.query_id "
+            "JOIN SequenceDictionary s ON s.sequence_id = ss.subject_id "
+            "JOIN TaxonDictionary qt ON qt.taxon_id = ss.query_taxon_id "
+            "JOIN TaxonDictionary st ON st.taxon_id = ss.subject_taxon_id "
+            "ORDER BY ss.rowid DESC").fetchall()
+        con.close()
+
+        sss_file = join(temp_dir, "similarSequences.txt")
+        with open(sss_file, "w") as fh:
+            for row in rows:
+                fh.write("\t".join(map(str, row)) + "\n\n")
+
+        # The dumps join the integer ids back to the sequence names
+        loaded = self.run_pairs(
+            "sql", join(temp_dir, "load"),
+            lambda dest: load_blast.execute(dest, sss_file))
+
+        self.assertEqual(loaded, parsed)
+        self.assertEqual(loaded["orthologs.txt"],
+                         "SpA|1\tSpB|1\t1.0005\n"
+                         "SpA|1\tSpC|1\t1.0005\n"
+                         "SpB|1\tSpC|1\t1.0005\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
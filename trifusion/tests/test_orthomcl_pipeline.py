@@ -0,0 +1,306 @@
+#!/usr/bin/python2
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import unittest
+from os.path import join, abspath
+
+from trifusion.orthomcl_pipeline import incremental_usearch, InflationJobs, \
+    INFLATION_JOBS, prep_fasta, adjust_fasta, stream_usearch
+from trifusion.ortho import orthomclInstallSchema as install_schema
+from trifusion.ortho.error_handling import UsearchError, NoUniqueField
+
+temp_dir = ".temp"
+
+# Writes a hit for each pair of query and database sequences and logs the
+# arguments of each call. Fails when the query is listed in the fail file,
+# before writing the hits or, with the ":after" suffix, after writing them
+fake_usearch = """#!{}
+import sys, json
+from os.path import dirname, join, basename, exists
+
+args = sys.argv[1:]
+opts = dict(zip(args[::2], args[1::2]))
+bs_dir = dirname(opts["-ublast"])
+
+with open(join(bs_dir, "calls.log"), "a") as fh:
+    fh.write(json.dumps(args) + "\\n")
+
+fail = join(bs_dir, "fail")
+mode = None
+if exists(fail):
+    name, _, mode = open(fail).read().partition(":")
+    if name != basename(opts["-ublast"]):
+        mode = None
+    elif mode != "after":
+        sys.exit(1)
+
+def headers(f):
+    return [x[1:].strip() for x in open(f) if x.startswith(">")]
+
+with open(opts["-blast6out"], "w") as fh:
+    for q in headers(opts["-ublast"]):
+        for s in headers(opts["-db"]):
+            fh.write("\\t".join([q, s, "90.0", "50", "0", "0", "1", "50",
+                                "1", "50", "1e-10", "100"]) + "\\n")
+
+if mode == "after":
+    sys.exit(1)
+"""
+
+
+class PrepFastaTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.cf_dir = join(temp_dir, "backstage_files", "compliantFasta")
+        os.makedirs(self.cf_dir)
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def prep(self, content, code="Sp"):
+
+        proteome = join(temp_dir, code + ".fas")
+        with open(proteome, "w") as fh:
+            fh.write(content)
+
+        return prep_fasta(proteome, code, self.cf_dir)
+
+    def read(self, code="Sp"):
+
+        with open(join(self.cf_dir, code + ".fasta")) as fh:
+            return fh.read()
+
+    def test_duplicate_headers(self):
+
+        # The duplicate is skipped with its sequence, and the last header
+        # has no line ending and fewer fields than the others
+        unique_id, mapping = self.prep(
+            ">sp|P1|geneA desc\nMKV\nLL\n>sp|P2|geneB\nMKA\n"
+            ">sp|P1|geneA desc\nMKK\n>sp|P3\nMVV\n>sp|P1|geneA desc")
+
+        self.assertEqual(unique_id, 1)
+        self.assertEqual(self.read(),
+                         ">Sp|P1\nMKV\nLL\n>Sp|P2\nMKA\n>Sp|P3\nMVV\n")
+        self.assertEqual(mapping, {"Sp|P1": ">sp|P1|geneA desc",
+                                   "Sp|P2": ">sp|P2|geneB",
+                                   "Sp|P3": ">sp|P3"})
+
+    def test_first_and_last_fields(self):
+
+        # Neither the ">" nor the line ending are part of the fields
+        self.assertEqual(self.prep(">a|x\nMK\n>b|x\nMV\n")[0], 0)
+        self.assertEqual(self.read(), ">Sp|a\nMK\n>Sp|b\nMV\n")
+
+        self.assertEqual(self.prep(">x|a\r\nMK\r\n>x|b\nMV")[0], 1)
+        self.assertEqual(self.read(), ">Sp|a\nMK\r\n>Sp|b\nMV")
+
+    def test_fields_not_in_all_headers(self):
+
+        # The only unique field is missing in the second header
+        self.assertRaises(NoUniqueField, self.prep,
+                          ">sp|x|a\nMK\n>sp|x\nMV\n")
+
+    def test_adjust_fasta(self):
+
+        files = []
+        for code, content in [("SpA", ">a|1\nMK\n>a|2\nMV\n"),
+                              ("SpB", ">b|1\nMK\n"),
+                              ("SpC", ">c|1\nMK\n")]:
+            files.append(join(temp_dir, code + ".fas"))
+            with open(files[-1], "w") as fh:
+                fh.write(content)
+
+        adjust_fasta(files[:2], temp_dir, cpus=2)
+        adjust_fasta(files[2:], temp_dir, append=True)
+
+        self.assertEqual(sorted(os.listdir(self.cf_dir)),
+                         ["SpA.fasta", "SpB.fasta", "SpC.fasta"])
+
+        with open(join(temp_dir, "backstage_files",
+                       "header_mapping.json")) as fh:
+            self.assertEqual(json.load(fh),
+                             {"SpA|1": ">a|1", "SpA|2": ">a|2",
+                              "SpB|b": ">b|1", "SpC|c": ">c|1"})
+
+
+class UsearchTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bs_dir = join(temp_dir, "backstage_files")
+        os.makedirs(self.bs_dir)
+
+        self.usearch = abspath(join(temp_dir, "usearch"))
+        with open(self.usearch, "w") as fh:
+            fh.write(fake_usearch.format(sys.executable))
+        os.chmod(self.usearch, 0o755)
+
+        self.write("goodProteins_db", ">A|1\nMKV\nLL\n>A|2\nMKKV\n")
+        self.write("new_db", ">B|1\nMKVLA\n")
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    def write(self, name, content):
+
+        with open(join(self.bs_dir, name), "w") as fh:
+            fh.write(content)
+
+    def read(self, name):
+
+        with open(join(self.bs_dir, name)) as fh:
+            return fh.read()
+
+    def search(self):
+
+        incremental_usearch("goodProteins_db", "new_db", 1E-5, temp_dir, 1,
+                            "hits", usearch_bin=self.usearch)
+
+    def calls(self):
+
+        with open(join(self.bs_dir, "calls.log")) as fh:
+            return [json.loads(x) for x in fh]
+
+    def test_search(self):
+
+        self.search()
+
+        # Both searches use the size of the merged database
+        calls = self.calls()
+        self.assertEqual(len(calls), 2)
+        for args in calls:
+            self.assertEqual(args[args.index("-ka_dbsize") + 1], "14")
+
+        self.assertEqual(self.read("goodProteins_db"),
+                         ">A|1\nMKV\nLL\n>A|2\nMKKV\n>B|1\nMKVLA\n")
+        self.assertEqual(sorted("\t".join(x.split("\t")[:2]) for x in
+                                self.read("hits").splitlines()),
+                         ["A|1\tB|1", "A|2\tB|1", "B|1\tA|1", "B|1\tA|2",
+                          "B|1\tB|1"])
+        self.assertEqual(sorted(os.listdir(self.bs_dir)),
+                         ["calls.log", "goodProteins_db", "hits", "new_db"])
+
+    def test_failed_search(self):
+
+        # The second search fails after the first one succeeded
+        self.write("fail", "new_db")
+
+        self.assertRaises(UsearchError, self.search)
+
+        self.assertEqual(len(self.calls()), 2)
+        self.assertEqual(self.read("goodProteins_db"),
+                         ">A|1\nMKV\nLL\n>A|2\nMKKV\n")
+        self.assertEqual(sorted(os.listdir(self.bs_dir)),
+                         ["calls.log", "fail", "goodProteins_db", "new_db"])
+
+    def stream(self):
+
+        os.makedirs(join(self.bs_dir, "compliantFasta"))
+        self.write(join("compliantFasta", "A.fasta"), self.read(
+            "goodProteins_db"))
+        install_schema.execute(temp_dir)
+
+        stream_usearch("goodProteins_db", 1E-5, temp_dir, 1, "hits",
+                       temp_dir, usearch_bin=self.usearch)
+
+        con = sqlite3.connect(join(temp_dir, "orthoDB.db"))
+        res = con.execute("SELECT count(*) FROM SimilarSequences").fetchone()
+        con.close()
+
+        return res[0]
+
+    def test_stream(self):
+
+        self.assertEqual(self.stream(), 4)
+
+    def test_stream_failed(self):
+
+        # USEARCH fails before writing its output, and after writing it
+        for mode in ["", ":after"]:
+            self.write("fail", "goodProteins_db" + mode)
+            self.assertRaises(UsearchError, self.stream)
+            shutil.rmtree(join(self.bs_dir, "compliantFasta"))
+
+
+class Namespace(object):
+
+    def __init__(self):
+
+        self.stop = False
+        self.finished_tasks = []
+        self.task = None
+        self.subp = None
+
+
+class InflationJobsTest(unittest.TestCase):
+
+    def test_progress(self):
+
+        nm = Namespace()
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def step(name, val, job_nm):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(.05)
+            with lock:
+                running[0] -= 1
+            return name + val
+
+        steps = [lambda v, n, x=x: step(x, v, n) for x in ["a", "b"]]
+        res = InflationJobs(["1", "2", "3"], steps, nm=nm, jobs=2,
+                            tasks=["mcl", "dump"]).run()
+
+        self.assertEqual(res, {"1": ["a1", "b1"], "2": ["a2", "b2"],
+                               "3": ["a3", "b3"]})
+        self.assertEqual(running[1], 2)
+        self.assertEqual(nm.finished_tasks, ["mcl", "dump"])
+        self.assertEqual((nm.task, nm.counter, nm.total), ("dump", 6, 6))
+
+    def test_default_jobs(self):
+
+        self.assertEqual(InflationJobs(map(str, range(10)), []).jobs,
+                         INFLATION_JOBS)
+        self.assertEqual(InflationJobs(["1"], [], jobs=4).jobs, 1)
+
+    def test_failed_job(self):
+
+        nm = Namespace()
+        stopped = []
+        started = threading.Event()
+
+        def step(val, job_nm):
+            if val == "1":
+                # Fails once the other job is running
+                started.wait(5)
+                raise ValueError(val)
+            started.set()
+            # The remaining jobs are stopped once the first one fails
+            start = time.time()
+            while time.time() - start < 5:
+                if job_nm.stop:
+                    stopped.append(val)
+                    return
+                time.sleep(.01)
+
+        start = time.time()
+        self.assertRaises(ValueError,
+                          InflationJobs(["1", "2"], [step], nm=nm).run)
+
+        self.assertEqual(stopped, ["2"])
+        self.assertLess(time.time() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
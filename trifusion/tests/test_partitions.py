@@ -367,6 +367,29 @@ class PartitonsTest(ExpectingTestCase):
 
         self.expect_equal(cont, True)
 
+    def test_find_parent(self):
+
+        parts = self.aln_obj.partitions
+        parts.read_from_file(concatenated_small_parNex[0], no_aln_check=True)
+
+        self.assertEqual([parts._find_parent(x) for x in [84, 169, 85]],
+                         ["BaseConc1.fas", "BaseConc2.fas", None])
+
+        # The index must follow partitions that were removed, merged and
+        # replaced
+        parts.remove_partition("BaseConc1.fas")
+        self.assertEqual(parts._find_parent(84), "BaseConc2.fas")
+
+        parts.merge_partitions(["BaseConc2.fas", "BaseConc4.fas"], "merged")
+        self.assertEqual(parts._find_parent(84), None)
+        self.assertEqual(parts._find_parent(169), "BaseConc3.fas")
+
+        parts.partitions = OrderedDict([("other", [(0, 84), False])])
+        self.assertEqual(parts._find_parent(84), "other")
+
+        # The index is not stored with the partitions
+        self.assertNotIn("_index", parts.__getstate__())
+
     def test_merge_and_split(self):
 
         self.aln_obj.partitions.read_from_file(concatenated_small_parNex[0],
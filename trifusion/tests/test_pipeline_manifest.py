@@ -0,0 +1,103 @@
+#!/usr/bin/python2
+
+import os
+import shutil
+import unittest
+from os.path import join
+
+from trifusion.orthomcl_pipeline import PipelineManifest
+
+temp_dir = ".temp"
+
+
+class PipelineManifestTest(unittest.TestCase):
+
+    def setUp(self):
+
+        os.makedirs(join(temp_dir, "backstage_files"))
+
+        self.infile = join(temp_dir, "proteome.fas")
+        self.db = join(temp_dir, "orthoDB.db")
+        self.search = join(temp_dir, "search.out")
+        self.mcl = join(temp_dir, "mclOutput")
+
+        self.write(self.infile)
+
+        self.stages = [
+            {"name": "schema", "temp": [self.db]},
+            {"name": "usearch", "params": {"evalue": 1E-5},
+             "inputs": [self.infile], "outputs": [self.search]},
+            {"name": "pairs", "deps": ["schema", "usearch"],
+             "inputs": [self.search], "temp": [self.db]},
+            {"name": "mcl_3", "task": "mcl", "deps": ["pairs"],
+             "params": {"inflation": "3"}, "outputs": [self.mcl]}]
+
+    def tearDown(self):
+
+        shutil.rmtree(temp_dir)
+
+    @staticmethod
+    def write(path, content="A"):
+
+        with open(path, "w") as fh:
+            fh.write(content)
+
+    def complete(self, manifest):
+
+        for stage in self.stages:
+            if manifest.should_run(stage["name"]):
+                manifest.begin(stage)
+                for path in stage.get("outputs", []) + stage.get("temp", []):
+                    self.write(path, stage["name"])
+                manifest.done(stage)
+
+    def test_resume(self):
+
+        self.assertEqual(PipelineManifest(temp_dir).plan(self.stages),
+                         ["schema", "usearch", "pairs", "mcl_3"])
+
+        self.complete(PipelineManifest(temp_dir))
+
+        self.assertEqual(PipelineManifest(temp_dir).plan(self.stages),
+                         ["schema", "usearch", "pairs", "mcl_3"])
+        self.assertEqual(
+            PipelineManifest(temp_dir, resume=True).plan(self.stages), [])
+
+    def test_changed_stage(self):
+
+        self.complete(PipelineManifest(temp_dir))
+
+        self.stages[1]["params"]["evalue"] = 1E-10
+
+        self.assertEqual(
+            PipelineManifest(temp_dir, resume=True).plan(self.stages),
+            ["usearch", "pairs", "mcl_3"])
+
+    def test_temp_outputs(self):
+
+        self.complete(PipelineManifest(temp_dir))
+
+        # The database is only required when pairs is executed
+        os.remove(self.db)
+        os.remove(self.mcl)
+
+        self.assertEqual(
+            PipelineManifest(temp_dir, resume=True).plan(self.stages),
+            ["mcl_3"])
+        self.assertEqual(
+            PipelineManifest(temp_dir, force_from="pairs").plan(self.stages),
+            ["schema", "pairs", "mcl_3"])
+
+    def test_interrupted_stage(self):
+
+        manifest = PipelineManifest(temp_dir)
+        self.complete(manifest)
+        manifest.begin(self.stages[3])
+
+        self.assertEqual(
+            PipelineManifest(temp_dir, resume=True).plan(self.stages),
+            ["mcl_3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
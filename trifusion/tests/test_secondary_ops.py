@@ -1,8 +1,10 @@
 #!/usr/bin/python2
 
 import os
+import sys
 import shutil
 import unittest
+from os.path import join
 from data_files import *
 
 from trifusion.process.sequence import AlignmentList
@@ -109,6 +111,14 @@ class SeconaryOpsTest(unittest.TestCase):
 
         self.assertEqual(sorted(s), sorted(res))
 
+    def test_gap_states_edges(self):
+
+        n, states = self.aln_obj._get_gap_states(
+            ["--aa-a", "-aaa--", "aaaaaa", "----aa"])
+
+        self.assertEqual(n, 5)
+        self.assertEqual(states, ["11-00", "0-110", "00000", "-0-01"])
+
     def test_consensus_multi_file(self):
 
         self.aln_obj.add_alignment_files(dna_data_fas)
@@ -176,6 +186,77 @@ class SeconaryOpsTest(unittest.TestCase):
 
         self.assertEqual(s, 7)
 
+    def test_haplotypes_exact(self):
+
+        seqs = ["acgt", "acgn", "acgt", "tcgt", "acgn"]
+
+        self.assertEqual(AlignmentList._get_haplotypes(seqs),
+                         [("acgt", [0, 2]), ("acgn", [1, 4]),
+                          ("tcgt", [3])])
+
+    def test_haplotypes_ignore_missing(self):
+
+        seqs = ["acgn", "ac-t", "acgt", "tcgt", "nnnn"]
+
+        self.assertEqual(
+            AlignmentList._get_haplotypes(seqs, ignore_missing=True),
+            [("acgt", [0, 1, 2, 4]), ("tcgt", [3])])
+
+    def test_collapse_ignore_missing(self):
+
+        fasta_file = join(temp_dir, "missing.fas")
+        with open(fasta_file, "w") as fh:
+            fh.write(">spa\nacgnacgt\n>spb\nac-tacgt\n>spc\ntcgtacgt\n"
+                     ">spd\nnnnnacgt\n>spe\ntcgtacnn\n>spf\nacgtaggt\n")
+
+        self.aln_obj.add_alignment_files([fasta_file])
+
+        self.aln_obj.collapse(haplotypes_file="missing", dest=temp_dir,
+                              ignore_missing=True, use_main_table=True)
+
+        self.assertEqual(
+            [x[:2] for x in self.aln_obj.iter_alignments()],
+            [("Hap_1", "acgtacgt"), ("Hap_2", "tcgtacgt"),
+             ("Hap_3", "acgtaggt")])
+
+        with open(join(temp_dir, "missing.haplotypes")) as fh:
+            self.assertEqual(fh.read(),
+                             "Hap_1: spa; spb; spd\n"
+                             "Hap_2: spc; spe\n"
+                             "Hap_3: spf\n")
+
+    def test_consensus_iupac_columns(self):
+
+        seqs = ["aacgn-", "agcgn-", "atcn--", "arcg-n"]
+
+        self.assertEqual(
+            AlignmentList._get_consensus(seqs, "IUPAC", ["DNA", "n"]),
+            "adcgnn")
+
+    def test_consensus_soft_mask_columns(self):
+
+        seqs = ["aacgn-", "agcgn-", "atcn--"]
+
+        self.assertEqual(
+            AlignmentList._get_consensus(seqs, "Soft mask", ["DNA", "n"]),
+            "ancgn-")
+
+    def test_consensus_remove_columns(self):
+
+        seqs = ["aacgt", "agcgt", "atcga"]
+
+        self.assertEqual(
+            AlignmentList._get_consensus(seqs, "Remove", ["DNA", "n"]),
+            "acg")
+
+    def test_consensus_iupac_protein(self):
+
+        seqs = ["mkl", "mrl", "mrx", "xkl", "xrl"]
+
+        self.assertEqual(
+            AlignmentList._get_consensus(seqs, "IUPAC", ["Protein", "x"]),
+            "mrl")
+
     def test_reverse_concatenate(self):
 
         self.aln_obj.add_alignment_files(concatenated_small_phy)
@@ -186,6 +267,48 @@ class SeconaryOpsTest(unittest.TestCase):
 
         self.assertEqual(len(self.aln_obj.alignments), 7)
 
+    def test_reverse_concatenate_codon(self):
+
+        self.aln_obj.add_alignment_files(concatenated_small_phy)
+
+        self.aln_obj.partitions.read_from_file(
+            concatenated_smallCodon_parNex[0])
+
+        self.aln_obj.reverse_concatenate()
+
+        self.assertEqual(len(self.aln_obj.alignments), 9)
+        self.assertTrue(all(x.taxa_idx for x in
+                            self.aln_obj.alignments.values()))
+
+    def test_write_reverse_concatenation(self):
+
+        def read_files(path):
+            return dict((fl, sorted(open(join(path, fl)).readlines()))
+                        for fl in os.listdir(path))
+
+        self.aln_obj.add_alignment_files(concatenated_small_phy)
+        self.aln_obj.partitions.read_from_file(
+            concatenated_smallCodon_parNex[0])
+
+        seq_module = sys.modules[AlignmentList.__module__]
+        buffer_size = seq_module.interleave_buffer_size
+
+        # Force the buffers to be flushed after every sequence
+        seq_module.interleave_buffer_size = 10
+        try:
+            self.aln_obj.write_reverse_concatenation(
+                ["fasta", "phylip"], output_dir=join(temp_dir, "stream"))
+        finally:
+            seq_module.interleave_buffer_size = buffer_size
+
+        self.aln_obj.reverse_concatenate()
+        self.aln_obj.write_to_file(["fasta", "phylip"],
+                                   output_dir=join(temp_dir, "db"))
+
+        expected = read_files(join(temp_dir, "db"))
+        self.assertEqual(len(expected), 18)
+        self.assertEqual(read_files(join(temp_dir, "stream")), expected)
+
     def test_zorro(self):
 
         self.aln_obj.add_alignment_files(zorro_data_fas)
@@ -220,7 +343,7 @@ class SeconaryOpsTest(unittest.TestCase):
 
     def test_iter_columns(self):
 
-        self.aln_obj = AlignmentList([variable_data[1]])
+        self.aln_obj.add_alignment_files([variable_data[1]])
 
         s = 0
         for col, aln_idx in self.aln_obj.iter_columns():
@@ -232,7 +355,7 @@ class SeconaryOpsTest(unittest.TestCase):
 
     def test_iter_columns_with_active_tx(self):
 
-        self.aln_obj = AlignmentList([variable_data[1]])
+        self.aln_obj.add_alignment_files([variable_data[1]])
 
         self.aln_obj.update_taxa_names(
             self.aln_obj.taxa_names[1:])
@@ -245,6 +368,129 @@ class SeconaryOpsTest(unittest.TestCase):
 
         self.assertEqual(s, 2)
 
+    def test_iter_columns_blocks(self):
+
+        self.aln_obj = AlignmentList(dna_data_fas, sql_db=sql_db)
+
+        expected = list(self.aln_obj.iter_columns())
+
+        seq_module = sys.modules[AlignmentList.__module__]
+        block_size = seq_module.column_block_size
+
+        seq_module.column_block_size = 7
+        try:
+            self.assertEqual(list(self.aln_obj.iter_columns()), expected)
+
+            # Changes to the table must be reflected in the column blocks
+            self.aln_obj.remove_taxa(self.aln_obj.taxa_names[:1])
+            self.assertEqual(len(next(self.aln_obj.iter_columns())[0]),
+                             len(expected[0][0]) - 1)
+        finally:
+            seq_module.column_block_size = block_size
+
+    def test_iter_columns_long_alignments(self):
+
+        self.aln_obj = AlignmentList(
+            dna_data_fas + dna_data_loci + phylip_interleave, sql_db=sql_db)
+
+        expected = list(self.aln_obj.iter_columns())
+
+        seq_module = sys.modules[AlignmentList.__module__]
+        block_size = seq_module.column_block_size
+
+        long_idx = [idx for idx, aln in self.aln_obj.alignment_idx.items()
+                    if aln.locus_length > 100]
+        blocks_query = "SELECT DISTINCT aln_idx FROM " \
+                       "[.colblocks_alignment_data_aln_idx]"
+
+        # Only the alignments longer than a block are split in blocks, one
+        # alignment at a time
+        seq_module.column_block_size = 100
+        try:
+            columns = []
+            stored = set()
+            for col, idx in self.aln_obj.iter_columns():
+                columns.append((col, idx))
+                if idx in long_idx:
+                    stored.add((idx, tuple(self.aln_obj.con.execute(
+                        blocks_query).fetchall())))
+            self.assertEqual(columns, expected)
+        finally:
+            seq_module.column_block_size = block_size
+
+        self.assertEqual(sorted(stored), [(x, ((x,),)) for x in long_idx])
+        # The blocks are removed after the iteration
+        self.assertEqual(self.aln_obj.con.execute(
+            blocks_query).fetchall(), [])
+
+    def test_iter_shelved_data(self):
+
+        self.aln_obj = AlignmentList(dna_data_fas, sql_db=sql_db)
+
+        # Taxon names with quotes must not break the shelved taxa query
+        taxon = self.aln_obj.taxa_names[0]
+        self.aln_obj.change_taxon_name(taxon, "taxon's")
+        taxa = [x for x in self.aln_obj.taxa_names if x != "taxon's"]
+
+        self.aln_obj.update_taxa_names(taxa)
+        self.aln_obj.update_active_alignments(
+            list(self.aln_obj.alignments)[1:])
+        active_idx = [x.db_idx for x in self.aln_obj.alignments.values()]
+
+        data = list(self.aln_obj.iter_alignments())
+        self.assertTrue(data)
+        self.assertTrue(all(tx != "taxon's" and idx in active_idx
+                            for tx, _, idx in data))
+
+        for col, idx in self.aln_obj.iter_columns():
+            self.assertIn(idx, active_idx)
+            self.assertEqual(
+                len(col), len([x for x in data if x[2] == idx]))
+
+    def test_compact_derived_tables(self):
+
+        tables = ["filter", "concatenation", ".partitiondata",
+                  ".interleavedata"]
+        res = []
+
+        # The same filter and concatenation run with plain and compact
+        # storage
+        for compact in [False, True]:
+            db = join(temp_dir, "db_{}".format(compact))
+            aln_obj = AlignmentList(dna_data_fas, sql_db=db,
+                                    compact_storage=compact)
+            try:
+                aln_obj.filter_missing_data(25, 50, table_out="filter")
+                aln_obj.concatenate(table_in="filter",
+                                    table_out="concatenation")
+                aln_obj.write_to_file(
+                    ["mcmctree", "phylip"], table_name="concatenation",
+                    output_file=join(temp_dir, "out_{}".format(compact)),
+                    interleave=True)
+                aln_obj.con.commit()
+
+                types = [aln_obj.cur.execute(
+                    "SELECT DISTINCT typeof(seq) FROM [{}]".format(
+                        x)).fetchall() for x in tables]
+                res.append((types, sorted(aln_obj.iter_alignments(
+                    "concatenation")), os.path.getsize(db)))
+            finally:
+                aln_obj.clear_alignments()
+                aln_obj.con.close()
+
+            for ext in [".phy", "_mcmctree.phy"]:
+                with open(join(temp_dir, "out_{}{}".format(
+                        compact, ext))) as fh:
+                    res[-1] += (fh.read(),)
+
+        plain, compact = res
+
+        self.assertEqual(plain[0], [[("text",)]] * len(tables))
+        self.assertEqual(compact[0], [[("blob",)]] * len(tables))
+        self.assertEqual(compact[1], plain[1])
+        self.assertEqual(compact[3:], plain[3:])
+        self.assertLess(compact[2], plain[2])
+
 # class MultipleSeconaryOpsTest(unittest.TestCase):
 #
 #     def test_sequential_secondary_operations_concat(self):
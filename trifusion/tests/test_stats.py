@@ -5,6 +5,9 @@ import unittest
 from data_files import *
 from os.path import join
 import shutil
+import argparse
+import Queue
+import numpy as np
 
 try:
     from process.sequence import AlignmentList
@@ -301,6 +304,211 @@ class SeconaryOpsTest(unittest.TestCase):
 
         self.assertTrue(self.aln_obj.outlier_sequence_size_sp())
 
+    def test_plot_cache_memory(self):
+
+        cache = self.aln_obj.get_plot_cache()
+        cache.clear()
+
+        res = self.aln_obj.missing_genes_per_species()
+
+        self.assertEqual(len(cache.memory), 1)
+        self.assertEqual(self.aln_obj.missing_genes_per_species(), res)
+
+    def test_plot_cache_disk(self):
+
+        cache = self.aln_obj.get_plot_cache()
+        cache.clear()
+
+        res = self.aln_obj.missing_genes_per_species()
+        cache.memory.clear()
+
+        aln = AlignmentList(dna_data_fas, sql_db=join(temp_dir, "otherdb"))
+
+        self.assertEqual(aln.missing_genes_per_species(), res)
+        self.assertEqual(len(cache.memory), 1)
+        aln.con.close()
+
+    def test_plot_cache_key_taxa(self):
+
+        func = AlignmentList.missing_genes_per_species
+        key1 = self.aln_obj._plot_cache_key(func, (), {})
+
+        self.aln_obj.update_taxa_names(self.aln_obj.taxa_names[:-1])
+        key2 = self.aln_obj._plot_cache_key(func, (), {})
+
+        self.assertNotEqual(key1, key2)
+
+    def test_plot_cache_key_data(self):
+
+        func = AlignmentList.missing_genes_per_species
+        key1 = self.aln_obj._plot_cache_key(func, (), {})
+
+        self.assertEqual(self.aln_obj._plot_cache_key(func, (), {}), key1)
+
+        # Changes that keep the sequence lengths must also change the key
+        self.aln_obj.cur.execute(
+            "UPDATE alignment_data SET seq=upper(seq) WHERE aln_idx=1")
+        key2 = self.aln_obj._plot_cache_key(func, (), {})
+
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(self.aln_obj._plot_cache_key(func, (), {}), key2)
+
+    def test_plot_cache_key_file_stats(self):
+
+        func = AlignmentList.missing_genes_per_species
+        stat = os.stat
+        calls = []
+
+        def count_stat(path):
+            calls.append(path)
+            return stat(path)
+
+        os.stat = count_stat
+        try:
+            self.aln_obj._plot_cache_key(func, (), {})
+            self.aln_obj._plot_cache_key(func, (), {})
+            self.assertEqual(len(calls), len(self.aln_obj.alignments))
+
+            # The files are only checked again when the table changes
+            self.aln_obj.cur.execute(
+                "UPDATE alignment_data SET seq=upper(seq) WHERE aln_idx=1")
+            self.aln_obj._plot_cache_key(func, (), {})
+            self.assertEqual(len(calls), len(self.aln_obj.alignments) * 2)
+        finally:
+            os.stat = stat
+
+    def test_plot_cache_key_ns(self):
+
+        func = AlignmentList.sequence_segregation
+
+        self.assertEqual(
+            self.aln_obj._plot_cache_key(func, (None,), {}),
+            self.aln_obj._plot_cache_key(func, (), {"ns": None}))
+
+    def test_preview_rounds(self):
+
+        res = list(self.aln_obj.iter_preview("sequence_segregation",
+                                             sample_size=2, seed=1))
+
+        self.assertEqual([x["sample_size"] for x in res],
+                         [(2, 7), (4, 7), (7, 7)])
+        self.assertEqual([x["sampled"] for x in res], [True, True, False])
+
+    def test_preview_exception_rounds(self):
+
+        # Every round fails, but the iteration continues to the complete
+        # data set
+        self.aln_obj.sequence_code = ["Protein", "x"]
+        res = list(self.aln_obj.iter_preview("allele_frequency_spectrum",
+                                             sample_size=2, seed=1))
+
+        self.assertEqual([(x["exception"], x["sampled"]) for x in res],
+                         [(InvalidSequenceType, True),
+                          (InvalidSequenceType, True),
+                          (InvalidSequenceType, False)])
+
+    def test_preview_exact_result(self):
+
+        res = list(self.aln_obj.iter_preview("sequence_similarity",
+                                             sample_size=3, seed=1))[-1]
+        exact = self.aln_obj.sequence_similarity()
+
+        self.assertEqual(res["data"], exact["data"])
+
+    def test_preview_max_pairs(self):
+
+        calls = []
+        similarity = self.aln_obj.sequence_similarity
+
+        def spy(**kwargs):
+            calls.append(kwargs.get("max_pairs"))
+            return similarity(**kwargs)
+
+        # The taxon pairs are only sampled in the sampled rounds
+        self.aln_obj.sequence_similarity = spy
+        res = list(self.aln_obj.iter_preview("sequence_similarity",
+                                             sample_size=3, seed=1,
+                                             max_pairs=10))
+
+        self.assertEqual(calls, [10, 10, None])
+        self.assertEqual(len(res[0]["data"]), 3)
+
+    def test_sample_pairs(self):
+
+        pairs = AlignmentList._sample_pairs(24, 50, np.random.RandomState(1))
+
+        self.assertEqual(len(set(pairs)), 50)
+        self.assertTrue(all(0 <= i < j < 24 for i, j in pairs))
+
+    def test_preview_ci(self):
+
+        res = next(self.aln_obj.iter_preview("missing_data_distribution",
+                                             sample_size=3, seed=1))
+
+        self.assertEqual(len(res["ci"]), 3)
+        for (lo, hi), d in zip(res["ci"], res["data"]):
+            self.assertTrue(lo <= np.mean(d) <= hi)
+
+    def test_preview_restores_alignments(self):
+
+        alns = list(self.aln_obj.alignments)
+        list(self.aln_obj.iter_preview("allele_frequency_spectrum",
+                                       sample_size=2))
+
+        self.assertEqual([list(self.aln_obj.alignments),
+                          self.aln_obj.shelved_idx], [alns, []])
+
+    def test_preview_summary_stats(self):
+
+        res = next(self.aln_obj.iter_preview("get_summary_stats",
+                                             sample_size=3, seed=1))
+
+        self.assertEqual([res[0]["sampled"], res[0]["genes"],
+                          res[0]["seq_len"], sorted(res[0]["ci"])],
+                         [True, 7, 595,
+                          ["gaps", "informative", "missing", "variable"]])
+
+    def test_stream_partial_queue(self):
+
+        self.aln_obj.plot_cache_dir = None
+        queue = Queue.Queue()
+        ns = argparse.Namespace(stop=False, stream_every=2,
+                                stream_queue=queue)
+
+        res = self.aln_obj.sequence_segregation(ns=ns)
+
+        partial = []
+        while not queue.empty():
+            partial.append(queue.get())
+
+        self.assertEqual([x[:2] for x in partial], [(2, 7), (4, 7), (6, 7)])
+        self.assertEqual(partial[-1][2]["data"], res["data"][:6])
+
+    def test_stream_partial_ns(self):
+
+        self.aln_obj.plot_cache_dir = None
+        ns = argparse.Namespace(stop=False, stream_every=3)
+
+        self.aln_obj.sequence_similarity_per_species(ns=ns)
+
+        self.assertEqual(ns.partial_data[:2], (6, 7))
+
+    def test_stream_partial_disabled(self):
+
+        self.aln_obj.plot_cache_dir = None
+        ns = argparse.Namespace(stop=False)
+
+        self.aln_obj.missing_data_distribution(ns=ns)
+
+        self.assertFalse(hasattr(ns, "partial_data"))
+
+    def test_plot_cache_disabled(self):
+
+        self.aln_obj.plot_cache_dir = None
+
+        self.assertIsNone(self.aln_obj.get_plot_cache())
+        self.assertTrue(self.aln_obj.missing_genes_per_species())
+
 
 if __name__ == "__main__":
     unittest.main()